@@ -0,0 +1,212 @@
+import asyncio
+import os
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from sqlalchemy import insert, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import get_session
+from models import Question, User, UserAnswer
+
+# Answers are written to user_answers in batches: as soon as FLUSH_BATCH_SIZE are pending, and
+# otherwise every FLUSH_INTERVAL_SECONDS. Past MAX_PENDING_ANSWERS (e.g. while the
+# database is unreachable) new submissions are refused instead of growing memory without bound.
+FLUSH_BATCH_SIZE = int(os.getenv("ANSWER_FLUSH_BATCH_SIZE", "500"))
+FLUSH_INTERVAL_SECONDS = float(os.getenv("ANSWER_FLUSH_INTERVAL_SECONDS", "1.0"))
+MAX_PENDING_ANSWERS = int(os.getenv("ANSWER_MAX_PENDING", "100000"))
+FLUSH_RETRY_SECONDS = 1.0  # Wait before retrying a failed flush
+
+
+class BufferFullError(Exception):
+    pass
+
+
+class UserDirectory:
+    """username <-> user id, creating users on first sight; only unknown usernames touch the database."""
+
+    def __init__(self):
+        self._ids: Dict[str, int] = {}
+        self._usernames: Dict[int, str] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+    def _remember(self, username: str, user_id: int):
+        self._ids[username] = user_id
+        self._usernames[user_id] = username
+
+    async def find_user_id(self, session: AsyncSession, username: str) -> Optional[int]:
+        """Id of an existing user, without creating it"""
+        user_id = self._ids.get(username)
+        if user_id is None:
+            result = await session.execute(select(User.id).where(User.username == username))
+            user_id = result.scalar_one_or_none()
+            if user_id is not None:
+                self._remember(username, user_id)
+        return user_id
+
+    async def get_usernames(self, session: AsyncSession, user_ids: List[int]) -> Dict[int, str]:
+        missing = [user_id for user_id in user_ids if user_id not in self._usernames]
+        if missing:
+            result = await session.execute(select(User.id, User.username).where(User.id.in_(missing)))
+            for user_id, username in result:
+                self._remember(username, user_id)
+        return {user_id: self._usernames[user_id] for user_id in user_ids if user_id in self._usernames}
+
+    async def get_user_id(self, session: AsyncSession, username: str) -> int:
+        user_id = self._ids.get(username)
+        if user_id is not None:
+            return user_id
+        async with self._locks.setdefault(username, asyncio.Lock()):
+            user_id = self._ids.get(username)
+            if user_id is None:
+                user_id = await self._get_or_create(session, username)
+                self._remember(username, user_id)
+        self._locks.pop(username, None)
+        return user_id
+
+    async def _get_or_create(self, session: AsyncSession, username: str) -> int:
+        result = await session.execute(select(User.id).where(User.username == username))
+        user_id = result.scalar_one_or_none()
+        if user_id is not None:
+            return user_id
+        try:
+            result = await session.execute(
+                insert(User).values(username=username, created_at=datetime.utcnow()).returning(User.id)
+            )
+            user_id = result.scalar_one()
+            await session.commit()
+            return user_id
+        except IntegrityError:
+            # Created concurrently by another process
+            await session.rollback()
+            result = await session.execute(select(User.id).where(User.username == username))
+            return result.scalar_one()
+
+
+class AnswerWriteBuffer:
+    """In-process write-behind buffer for user_answers rows.
+
+    submit() only appends to memory; a background task inserts pending rows with one multi-row INSERT
+    per batch and one commit. A failed flush keeps its rows and is retried, and stop() flushes whatever
+    is left, so answers accepted before a graceful shutdown are not lost. Rows whose question was deleted
+    after the answer was accepted can never be written: they are dropped (counted in `dropped`) instead
+    of blocking the batch forever.
+
+    Aggregators (e.g. the leaderboard) see every batch: aggregator.stage(session, batch) runs inside the
+    flush transaction and aggregator.apply(staged) once it has committed.
+    """
+
+    def __init__(self, batch_size: int = FLUSH_BATCH_SIZE, flush_interval: float = FLUSH_INTERVAL_SECONDS,
+                 max_pending: int = MAX_PENDING_ANSWERS):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._pending: List[Dict] = []
+        self.aggregators: List = []
+        self._batch_ready = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        self.accepted = 0
+        self.written = 0
+        self.flushes = 0
+        self.failed_flushes = 0
+        self.dropped = 0
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def submit(self, row: Dict):
+        """Queue one user_answers row (a dict of UserAnswer columns). Raises BufferFullError when saturated."""
+        if len(self._pending) >= self.max_pending:
+            raise BufferFullError("Too many answers waiting to be written")
+        self._pending.append(row)
+        self.accepted += 1
+        if len(self._pending) >= self.batch_size:
+            self._batch_ready.set()
+
+    def start(self):
+        if self._task is None:
+            self._stopping = False
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the background task and write everything still pending."""
+        if self._task is not None:
+            self._stopping = True
+            self._batch_ready.set()
+            await self._task
+            self._task = None
+        while self._pending:
+            await self.flush()
+
+    async def _run(self):
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._batch_ready.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._batch_ready.clear()
+            while self._pending and not self._stopping:
+                try:
+                    await self.flush()
+                except Exception as e:
+                    self.failed_flushes += 1
+                    print(f"Error writing answers, retrying: {str(e)}")
+                    await asyncio.sleep(FLUSH_RETRY_SECONDS)
+                    break
+                if len(self._pending) < self.batch_size:
+                    break
+
+    async def flush(self):
+        """Write up to batch_size pending rows in one transaction; on failure they stay pending."""
+        batch = self._pending[:self.batch_size]
+        if not batch:
+            return
+        rows = batch
+        async for session in get_session():
+            try:
+                try:
+                    staged = await self._write(session, rows)
+                except IntegrityError:
+                    # Most likely a question deleted while its answers were pending: drop those and retry
+                    await session.rollback()
+                    rows = await self._without_deleted_questions(session, batch)
+                    if len(rows) == len(batch):
+                        raise
+                    staged = await self._write(session, rows) if rows else []
+            except Exception:
+                await session.rollback()
+                raise
+        for aggregator, aggregate in zip(self.aggregators, staged):
+            aggregator.apply(aggregate)
+        # Submissions that arrived during the write were appended after the batch
+        del self._pending[:len(batch)]
+        self.written += len(rows)
+        self.flushes += 1
+
+    async def _write(self, session: AsyncSession, rows: List[Dict]) -> List:
+        await session.execute(insert(UserAnswer), rows)
+        staged = [await aggregator.stage(session, rows) for aggregator in self.aggregators]
+        await session.commit()
+        return staged
+
+    async def _without_deleted_questions(self, session: AsyncSession, batch: List[Dict]) -> List[Dict]:
+        """The rows of a batch whose question still exists; the others are dropped and logged."""
+        question_ids = {row["question_id"] for row in batch}
+        result = await session.execute(select(Question.id).where(Question.id.in_(question_ids)))
+        existing = set(result.scalars())
+        rows = [row for row in batch if row["question_id"] in existing]
+        if len(rows) < len(batch):
+            self.dropped += len(batch) - len(rows)
+            print(f"Dropping {len(batch) - len(rows)} answers to deleted questions {sorted(question_ids - existing)}")
+        return rows
+
+    def stats(self) -> Dict:
+        return {"pending": self.pending, "accepted": self.accepted, "written": self.written,
+                "flushes": self.flushes, "failed_flushes": self.failed_flushes, "dropped": self.dropped}
+
+
+user_directory = UserDirectory()
+answer_buffer = AnswerWriteBuffer()
@@ -38,9 +38,16 @@ async_session = sessionmaker(
     expire_on_commit=False
 )
 
+def create_missing_indexes(sync_conn):
+    """create_all only builds indexes together with new tables; add the ones missing on existing tables."""
+    for table in SQLModel.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(sync_conn, checkfirst=True)
+
 async def init_db():
     async with engine.begin() as conn:
         await conn.run_sync(SQLModel.metadata.create_all)
+        await conn.run_sync(create_missing_indexes)
 
 async def get_session() -> AsyncSession:
     async with async_session() as session:
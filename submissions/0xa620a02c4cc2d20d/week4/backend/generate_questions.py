@@ -1,27 +1,76 @@
+import argparse
 import asyncio
+import itertools
 import os
+import random
+import time
 from openai import AsyncOpenAI
 from database import get_session, init_db
+from question_cache import question_cache
+from question_dedup import question_dedup
 from models import TVSerial, Question, Option, Difficulty, OptionKey
-from sqlalchemy import select
-from typing import List, Dict
+from sqlalchemy import insert, select
+from typing import List, Dict, Optional, Tuple
 import json
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
-# Get OpenAI API key from environment
-api_key = os.getenv("OPENAI_API_KEY")
-if not api_key:
-    raise ValueError("OPENAI_API_KEY not found in environment variables. Please check your .env file.")
+# Questions per INSERT ... RETURNING batch (their options go in the matching options batch)
+INSERT_BATCH_SIZE = 5000
 
-# Initialize OpenAI client
-client = AsyncOpenAI(api_key=api_key)
+# Generation pipeline defaults
+QUESTIONS_PER_REQUEST = 10  # Questions asked for in each completion
+MAX_CONCURRENT_REQUESTS = 8  # Completions in flight at once
+REQUESTS_PER_SECOND = 5.0  # Start rate of completions across all serials (0 = unlimited)
+MAX_RETRIES = 4  # Extra attempts per completion after the first failure
+BACKOFF_BASE_SECONDS = 1.0  # Retry n waits BACKOFF_BASE_SECONDS * 2**n plus jitter
+BACKOFF_MAX_SECONDS = 30.0
 
-async def generate_questions(tv_serial_id: int, num_questions: int = 10) -> List[Dict]:
-    """Generate questions using OpenAI API"""
-    prompt = """You are a trivia expert specializing in TV shows. Generate {num_questions} trivia questions about Breaking Bad TV series.
+def create_client() -> AsyncOpenAI:
+    """OpenAI client from OPENAI_API_KEY (only needed when generating against the real API)"""
+    api_key = os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        raise ValueError("OPENAI_API_KEY not found in environment variables. Please check your .env file.")
+    return AsyncOpenAI(api_key=api_key)
+
+def validate_questions(content: str) -> List[Dict]:
+    """Parse a completion and check every question has the structure the database expects"""
+    try:
+        data = json.loads(content)
+    except json.JSONDecodeError as e:
+        print(f"Error parsing JSON response: {e}")
+        print(f"Raw response: {content}")
+        raise
+    if not isinstance(data, dict):
+        raise ValueError("Response is not a JSON object")
+
+    if "questions" not in data:
+        raise ValueError("Response does not contain 'questions' array")
+
+    questions = data["questions"]
+    if not isinstance(questions, list):
+        raise ValueError("'questions' is not an array")
+
+    # Validate each question
+    for q in questions:
+        if not all(k in q for k in ["question", "difficulty", "score", "options", "correct_option"]):
+            raise ValueError("Question missing required fields")
+        if not all(k in q["options"] for k in ["A", "B", "C", "D"]):
+            raise ValueError("Question options missing required keys")
+        if q["correct_option"] not in ["A", "B", "C", "D"]:
+            raise ValueError("Invalid correct_option value")
+        if q["difficulty"] not in ["easy", "medium", "hard"]:
+            raise ValueError("Invalid difficulty value")
+        if not isinstance(q["score"], int) or not 1 <= q["score"] <= 5:
+            raise ValueError("Invalid score value")
+
+    return questions
+
+async def generate_questions(client, tv_serial_title: str, num_questions: int = 10) -> List[Dict]:
+    """Generate questions using OpenAI API (or any client with the same chat.completions.create interface)"""
+    prompt = """You are a trivia expert specializing in TV shows. Generate {num_questions} trivia questions about {tv_serial_title} TV series.
     
     Each question must have:
     1. A question text
@@ -52,107 +101,268 @@ async def generate_questions(tv_serial_id: int, num_questions: int = 10) -> List
             model="gpt-4-turbo-preview",
             messages=[
                 {"role": "system", "content": "You are a trivia expert specializing in TV shows. Always return valid JSON with a 'questions' array."},
-                {"role": "user", "content": prompt.format(num_questions=num_questions)}
+                {"role": "user", "content": prompt.format(num_questions=num_questions, tv_serial_title=tv_serial_title)}
             ],
             response_format={"type": "json_object"}
         )
 
         # Parse the response
-        content = response.choices[0].message.content
-        try:
-            data = json.loads(content)
-            if not isinstance(data, dict):
-                raise ValueError("Response is not a JSON object")
-            
-            if "questions" not in data:
-                raise ValueError("Response does not contain 'questions' array")
-            
-            questions = data["questions"]
-            if not isinstance(questions, list):
-                raise ValueError("'questions' is not an array")
-            
-            # Validate each question
-            for q in questions:
-                if not all(k in q for k in ["question", "difficulty", "score", "options", "correct_option"]):
-                    raise ValueError("Question missing required fields")
-                if not all(k in q["options"] for k in ["A", "B", "C", "D"]):
-                    raise ValueError("Question options missing required keys")
-                if q["correct_option"] not in ["A", "B", "C", "D"]:
-                    raise ValueError("Invalid correct_option value")
-                if q["difficulty"] not in ["easy", "medium", "hard"]:
-                    raise ValueError("Invalid difficulty value")
-                if not isinstance(q["score"], int) or not 1 <= q["score"] <= 5:
-                    raise ValueError("Invalid score value")
-            
-            return questions
-        except json.JSONDecodeError as e:
-            print(f"Error parsing JSON response: {e}")
-            print(f"Raw response: {content}")
-            raise
+        return validate_questions(response.choices[0].message.content)
     except Exception as e:
         print(f"Error generating questions: {str(e)}")
         raise
 
-async def insert_questions(tv_serial_id: int, questions_data: List[Dict]):
-    """Insert generated questions into the database"""
+def question_row(tv_serial_id: int, q_data: Dict) -> Dict:
+    return {
+        "question_text": q_data["question"],
+        "tv_serial_id": tv_serial_id,
+        "difficulty": Difficulty[q_data["difficulty"].upper()],
+        "score": q_data["score"],
+        "correct_option": OptionKey[q_data["correct_option"]]
+    }
+
+async def bulk_insert_questions(session, tv_serial_id: int, questions_data: List[Dict]) -> List[int]:
+    """Insert questions and their options with multi-row INSERTs, without committing.
+    Each batch is one INSERT ... RETURNING for the questions (ids in input order) and one for the options.
+    Returns the new question ids in input order."""
+    question_ids = []
+    for start in range(0, len(questions_data), INSERT_BATCH_SIZE):
+        batch = questions_data[start:start + INSERT_BATCH_SIZE]
+        result = await session.execute(
+            insert(Question).returning(Question.id, sort_by_parameter_order=True),
+            [question_row(tv_serial_id, q_data) for q_data in batch]
+        )
+        batch_ids = result.scalars().all()
+        await session.execute(
+            insert(Option),
+            [
+                {"question_id": question_id, "option_key": OptionKey[key], "option_text": text}
+                for question_id, q_data in zip(batch_ids, batch)
+                for key, text in q_data["options"].items()
+            ]
+        )
+        question_ids.extend(batch_ids)
+    return question_ids
+
+async def insert_unique_questions(session, tv_serial_id: int, questions_data: List[Dict]):
+    """Bulk-insert the questions that are not near-duplicates of the serial's bank (or of each other), without
+    committing. Returns (new ids, their fingerprints, number rejected); register the fingerprints with
+    question_dedup.add() once the transaction commits."""
+    unique, fingerprints, rejected = await question_dedup.filter_batch(session, tv_serial_id, questions_data)
+    question_ids = await bulk_insert_questions(session, tv_serial_id, unique)
+    return question_ids, fingerprints, len(rejected)
+
+async def insert_questions(tv_serial_id: int, questions_data: List[Dict]) -> List[int]:
+    """Insert generated questions into the database in a single transaction, skipping near-duplicates"""
     async for session in get_session():
         try:
-            for q_data in questions_data:
-                # Create question
-                question = Question(
-                    question_text=q_data["question"],
-                    tv_serial_id=tv_serial_id,
-                    difficulty=Difficulty[q_data["difficulty"].upper()],
-                    score=q_data["score"],
-                    correct_option=OptionKey[q_data["correct_option"]]
-                )
-                session.add(question)
-                await session.flush()  # Get the question ID
-
-                # Create options
-                for key, text in q_data["options"].items():
-                    option = Option(
-                        question_id=question.id,
-                        option_key=OptionKey[key],
-                        option_text=text
-                    )
-                    session.add(option)
-
+            question_ids, fingerprints, rejected = await insert_unique_questions(session, tv_serial_id, questions_data)
             await session.commit()
-            print("Questions inserted successfully!")
+            question_dedup.add(tv_serial_id, question_ids, fingerprints)
+            # Other processes pick the new questions up on their next version check
+            question_cache.invalidate(tv_serial_id)
+            print(f"Questions inserted successfully! ({rejected} near-duplicates skipped)")
+            return question_ids
         except Exception as e:
             await session.rollback()
             print(f"Error inserting questions: {str(e)}")
             raise
 
+async def get_or_create_tv_serials(titles: List[str]) -> Dict[str, int]:
+    """Ids of the given TV serials, creating the missing ones"""
+    async for session in get_session():
+        result = await session.execute(select(TVSerial).where(TVSerial.title.in_(titles)))
+        serial_ids = {tv_serial.title: tv_serial.id for tv_serial in result.scalars()}
+        missing = [TVSerial(title=title) for title in titles if title not in serial_ids]
+        if missing:
+            session.add_all(missing)
+            await session.commit()
+            for tv_serial in missing:
+                serial_ids[tv_serial.title] = tv_serial.id
+                print(f"Created {tv_serial.title} TV serial entry")
+        return serial_ids
+
+class RateLimiter:
+    """Spaces request starts at least 1 / requests_per_second apart (0 = no limit)"""
+
+    def __init__(self, requests_per_second: float):
+        self.interval = 1.0 / requests_per_second if requests_per_second > 0 else 0.0
+        self._next_start = 0.0
+
+    async def wait(self):
+        if not self.interval:
+            return
+        now = time.monotonic()
+        start = max(now, self._next_start)
+        self._next_start = start + self.interval
+        if start > now:
+            await asyncio.sleep(start - now)
+
+class GenerationPipeline:
+    """Generates questions for several TV serials concurrently and streams each batch into the database.
+
+    Completions run under a semaphore (max_concurrent) and a start-rate limit (requests_per_second); a failed
+    or invalid completion is retried with exponential backoff and jitter, up to max_retries times. Validated
+    batches go through a bounded queue to a single writer, which drops near-duplicates of the serial's bank
+    (question_dedup, unless deduplicate=False) and inserts and commits each batch as it arrives.
+    """
+
+    def __init__(self, client, questions_per_request: int = QUESTIONS_PER_REQUEST,
+                 max_concurrent: int = MAX_CONCURRENT_REQUESTS, requests_per_second: float = REQUESTS_PER_SECOND,
+                 max_retries: int = MAX_RETRIES, backoff_base_seconds: float = BACKOFF_BASE_SECONDS,
+                 deduplicate: bool = True):
+        self.client = client
+        self.questions_per_request = questions_per_request
+        self.max_concurrent = max_concurrent
+        self.max_retries = max_retries
+        self.backoff_base_seconds = backoff_base_seconds
+        self.deduplicate = deduplicate
+        self.rate_limiter = RateLimiter(requests_per_second)
+        self.requests = 0
+        self.retries = 0
+        self.failed_requests = 0
+        self.generated = 0
+        self.inserted = 0
+        self.duplicates = 0
+
+    async def _generate_with_retry(self, semaphore: asyncio.Semaphore, title: str, num_questions: int) -> Optional[List[Dict]]:
+        for attempt in range(self.max_retries + 1):
+            async with semaphore:
+                await self.rate_limiter.wait()
+                self.requests += 1
+                try:
+                    return await generate_questions(self.client, title, num_questions)
+                except Exception:
+                    pass
+            if attempt < self.max_retries:
+                self.retries += 1
+                backoff = min(BACKOFF_MAX_SECONDS, self.backoff_base_seconds * 2 ** attempt)
+                await asyncio.sleep(backoff * random.uniform(0.5, 1.5))
+        self.failed_requests += 1
+        print(f"Giving up on a batch of {num_questions} questions for {title} after {self.max_retries + 1} attempts")
+        return None
+
+    async def _produce(self, semaphore: asyncio.Semaphore, queue: asyncio.Queue, tv_serial_id: int,
+                       title: str, num_questions: int):
+        questions_data = await self._generate_with_retry(semaphore, title, num_questions)
+        if questions_data:
+            self.generated += len(questions_data)
+            await queue.put((tv_serial_id, questions_data))
+
+    async def _write(self, queue: asyncio.Queue):
+        async for session in get_session():
+            while True:
+                item = await queue.get()
+                if item is None:
+                    return
+                tv_serial_id, questions_data = item
+                try:
+                    if self.deduplicate:
+                        question_ids, fingerprints, rejected = await insert_unique_questions(
+                            session, tv_serial_id, questions_data
+                        )
+                    else:
+                        question_ids = await bulk_insert_questions(session, tv_serial_id, questions_data)
+                        fingerprints, rejected = None, 0
+                    await session.commit()
+                except Exception as e:
+                    await session.rollback()
+                    print(f"Error inserting questions: {str(e)}")
+                    raise
+                if fingerprints is None:
+                    question_dedup.invalidate(tv_serial_id)
+                else:
+                    question_dedup.add(tv_serial_id, question_ids, fingerprints)
+                question_cache.invalidate(tv_serial_id)
+                self.inserted += len(question_ids)
+                self.duplicates += rejected
+
+    def _requests_for(self, target: int) -> List[int]:
+        """Split a target count into completions of at most questions_per_request questions"""
+        full, rest = divmod(target, self.questions_per_request)
+        return [self.questions_per_request] * full + ([rest] if rest else [])
+
+    async def run(self, targets: Dict[str, int]) -> Dict:
+        """Generate targets[title] questions for each TV serial. Returns counts and questions/sec end to end."""
+        started = time.perf_counter()
+        serial_ids = await get_or_create_tv_serials(list(targets))
+        semaphore = asyncio.Semaphore(self.max_concurrent)
+        queue: asyncio.Queue = asyncio.Queue(maxsize=2 * self.max_concurrent)
+        writer = asyncio.create_task(self._write(queue))
+        # Interleave serials so every one of them makes progress from the start
+        per_serial = [[(title, size) for size in self._requests_for(target)] for title, target in targets.items()]
+        jobs = [job for round_ in itertools.zip_longest(*per_serial) for job in round_ if job is not None]
+        producers = [
+            asyncio.create_task(self._produce(semaphore, queue, serial_ids[title], title, num_questions))
+            for title, num_questions in jobs
+        ]
+        producing = asyncio.gather(*producers)
+        try:
+            # A failed insert stops the writer: surface it instead of leaving producers blocked on the queue
+            await asyncio.wait({producing, writer}, return_when=asyncio.FIRST_COMPLETED)
+            if writer.done():
+                writer.result()
+            await producing
+            await queue.put(None)
+            await writer
+        finally:
+            producing.cancel()
+            writer.cancel()
+        elapsed = time.perf_counter() - started
+        return {
+            "serials": len(targets),
+            "requests": self.requests,
+            "retries": self.retries,
+            "failed_requests": self.failed_requests,
+            "questions_generated": self.generated,
+            "questions_inserted": self.inserted,
+            "duplicates_rejected": self.duplicates,
+            "seconds": elapsed,
+            "questions_per_second": self.inserted / elapsed if elapsed > 0 else 0.0
+        }
+
+def parse_target(value: str) -> Tuple[str, int]:
+    title, _, count = value.rpartition("=")
+    if not title or not count.isdigit():
+        raise argparse.ArgumentTypeError(f"expected TITLE=COUNT, got '{value}'")
+    return title, int(count)
+
 async def main():
+    parser = argparse.ArgumentParser(description="Generate trivia questions for TV serials")
+    parser.add_argument("targets", nargs="*", type=parse_target, default=[("Breaking Bad", 10)],
+                        help="TITLE=COUNT pairs (default: \"Breaking Bad=10\")")
+    parser.add_argument("--per-request", type=int, default=QUESTIONS_PER_REQUEST)
+    parser.add_argument("--concurrency", type=int, default=MAX_CONCURRENT_REQUESTS)
+    parser.add_argument("--rate", type=float, default=REQUESTS_PER_SECOND, help="Completions started per second (0 = unlimited)")
+    parser.add_argument("--retries", type=int, default=MAX_RETRIES)
+    parser.add_argument("--allow-duplicates", action="store_true", help="Insert near-duplicate questions too")
+    parser.add_argument("--stub", action="store_true", help="Use the offline stub client instead of the OpenAI API")
+    parser.add_argument("--stub-latency", type=float, default=0.5, help="Seconds per stub completion")
+    parser.add_argument("--stub-failure-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
     try:
         # Initialize database
         await init_db()
 
-        async for session in get_session():
-            # Check if Breaking Bad already exists
-            result = await session.execute(
-                select(TVSerial).where(TVSerial.title == "Breaking Bad")
-            )
-            tv_serial = result.scalar_one_or_none()
-
-            if not tv_serial:
-                # Create Breaking Bad TV serial
-                tv_serial = TVSerial(title="Breaking Bad")
-                session.add(tv_serial)
-                await session.commit()
-                await session.refresh(tv_serial)
-                print("Created Breaking Bad TV serial entry")
-
-            # Generate and insert questions
-            print("Generating questions...")
-            questions_data = await generate_questions(tv_serial.id)
-            await insert_questions(tv_serial.id, questions_data)
-            print(f"Successfully generated and inserted {len(questions_data)} questions for Breaking Bad")
+        if args.stub:
+            from stub_completion_client import StubCompletionClient
+            client = StubCompletionClient(latency_seconds=args.stub_latency, failure_rate=args.stub_failure_rate)
+        else:
+            client = create_client()
+        pipeline = GenerationPipeline(client, questions_per_request=args.per_request, max_concurrent=args.concurrency,
+                                      requests_per_second=args.rate, max_retries=args.retries,
+                                      deduplicate=not args.allow_duplicates)
+        print("Generating questions...")
+        report = await pipeline.run(dict(args.targets))
+        print(f"Successfully generated and inserted {report['questions_inserted']} questions for "
+              f"{report['serials']} TV serials in {report['seconds']:.2f}s "
+              f"({report['questions_per_second']:.1f} questions/sec, {report['requests']} requests, "
+              f"{report['retries']} retries, {report['failed_requests']} failed, "
+              f"{report['duplicates_rejected']} near-duplicates skipped)")
     except Exception as e:
         print(f"An error occurred: {str(e)}")
         raise
 
 if __name__ == "__main__":
-    asyncio.run(main()) 
\ No newline at end of file
+    asyncio.run(main())
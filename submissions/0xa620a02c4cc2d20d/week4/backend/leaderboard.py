@@ -0,0 +1,155 @@
+from bisect import bisect_left, insort
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import case, func, insert, select
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models import Question, UserAnswer, UserScore
+from question_cache import question_cache
+
+# (user_id, tv_serial_id) -> [score, correct_answers, answers] added by one batch of answers
+ScoreDeltas = Dict[Tuple[int, int], List[int]]
+
+
+class RankedScores:
+    """Scores of one leaderboard kept in rank order: updates are O(log n) searches plus a list shift,
+    top(n) and rank() never look at answers."""
+
+    def __init__(self):
+        self.scores: Dict[int, int] = {}
+        self.correct_answers: Dict[int, int] = {}
+        self._order: List[Tuple[int, int]] = []  # (-score, user_id), best first
+
+    def __len__(self) -> int:
+        return len(self.scores)
+
+    def add(self, user_id: int, score: int, correct_answers: int):
+        old = self.scores.get(user_id)
+        if old is not None:
+            if not score:
+                self.correct_answers[user_id] += correct_answers
+                return
+            del self._order[bisect_left(self._order, (-old, user_id))]
+        new = (old or 0) + score
+        self.scores[user_id] = new
+        self.correct_answers[user_id] = self.correct_answers.get(user_id, 0) + correct_answers
+        insort(self._order, (-new, user_id))
+
+    def top(self, n: int) -> List[Tuple[int, int]]:
+        """(user_id, score) of the n best, ties by user id"""
+        return [(user_id, -negative_score) for negative_score, user_id in self._order[:n]]
+
+    def rank(self, user_id: int) -> Optional[int]:
+        """1 + number of users with a strictly higher score; None if the user has no answers here"""
+        score = self.scores.get(user_id)
+        if score is None:
+            return None
+        return bisect_left(self._order, (-score, -1)) + 1
+
+
+class Leaderboard:
+    """Global and per-serial leaderboards, fed by the answer write-behind buffer.
+
+    Each flushed batch of answers is aggregated into per-(user, serial) deltas that are upserted into
+    user_scores in the same transaction (stage), then applied to the in-memory rankings once it commits
+    (apply). The rankings are loaded from user_scores at startup; user_scores itself is rebuilt from
+    user_answers only if it is empty while answers exist (e.g. answers recorded before it existed).
+    """
+
+    def __init__(self):
+        self.overall = RankedScores()
+        self.by_serial: Dict[int, RankedScores] = defaultdict(RankedScores)
+
+    def scores(self, tv_serial_id: Optional[int] = None) -> RankedScores:
+        return self.overall if tv_serial_id is None else self.by_serial[tv_serial_id]
+
+    async def load(self, session: AsyncSession):
+        result = await session.execute(select(func.count()).select_from(UserScore))
+        if not result.scalar_one():
+            await rebuild_user_scores(session)
+            await session.commit()
+        self.overall = RankedScores()
+        self.by_serial = defaultdict(RankedScores)
+        result = await session.stream(
+            select(UserScore.user_id, UserScore.tv_serial_id, UserScore.score, UserScore.correct_answers)
+        )
+        async for user_id, tv_serial_id, score, correct_answers in result:
+            self.overall.add(user_id, score, correct_answers)
+            self.by_serial[tv_serial_id].add(user_id, score, correct_answers)
+
+    async def stage(self, session: AsyncSession, batch: List[Dict]) -> ScoreDeltas:
+        """Upsert the score deltas of a batch of user_answers rows (inside the flush transaction)"""
+        question_keys: Dict[int, Tuple[int, int]] = {}  # question_id -> (tv_serial_id, score)
+        missing = set()
+        for row in batch:
+            answer_key = question_cache.cached_answer_key(row["question_id"])
+            if answer_key is None:
+                missing.add(row["question_id"])
+            else:
+                question_keys[row["question_id"]] = (answer_key[2], answer_key[1])
+        if missing:
+            # Only for questions whose answer key this process has not looked up
+            result = await session.execute(
+                select(Question.id, Question.tv_serial_id, Question.score).where(Question.id.in_(missing))
+            )
+            for question_id, tv_serial_id, score in result:
+                question_keys[question_id] = (tv_serial_id, score)
+
+        deltas: ScoreDeltas = defaultdict(lambda: [0, 0, 0])
+        for row in batch:
+            question_key = question_keys.get(row["question_id"])
+            if question_key is None:
+                continue  # Question deleted since the answer was accepted: it scores nothing
+            tv_serial_id, score = question_key
+            delta = deltas[(row["user_id"], tv_serial_id)]
+            if row["is_correct"]:
+                delta[0] += score
+                delta[1] += 1
+            delta[2] += 1
+
+        if not deltas:
+            return deltas
+        upsert = (postgresql_insert if session.bind.dialect.name == "postgresql" else sqlite_insert)(UserScore)
+        await session.execute(
+            upsert.on_conflict_do_update(
+                index_elements=[UserScore.user_id, UserScore.tv_serial_id],
+                set_={
+                    "score": UserScore.score + upsert.excluded.score,
+                    "correct_answers": UserScore.correct_answers + upsert.excluded.correct_answers,
+                    "answers": UserScore.answers + upsert.excluded.answers
+                }
+            ),
+            [
+                {"user_id": user_id, "tv_serial_id": tv_serial_id, "score": score,
+                 "correct_answers": correct_answers, "answers": answers}
+                for (user_id, tv_serial_id), (score, correct_answers, answers) in deltas.items()
+            ]
+        )
+        return deltas
+
+    def apply(self, deltas: ScoreDeltas):
+        """Add committed deltas to the in-memory rankings"""
+        for (user_id, tv_serial_id), (score, correct_answers, _) in deltas.items():
+            self.overall.add(user_id, score, correct_answers)
+            self.by_serial[tv_serial_id].add(user_id, score, correct_answers)
+
+
+async def rebuild_user_scores(session: AsyncSession):
+    """Recompute user_scores from user_answers with one aggregate INSERT ... SELECT (full scan, startup only)"""
+    await session.execute(UserScore.__table__.delete())
+    points = case((UserAnswer.is_correct, Question.score), else_=0)
+    correct = case((UserAnswer.is_correct, 1), else_=0)
+    await session.execute(
+        insert(UserScore).from_select(
+            ["user_id", "tv_serial_id", "score", "correct_answers", "answers"],
+            select(UserAnswer.user_id, Question.tv_serial_id, func.sum(points), func.sum(correct), func.count())
+            .join(Question, Question.id == UserAnswer.question_id)
+            .group_by(UserAnswer.user_id, Question.tv_serial_id)
+        )
+    )
+
+
+leaderboard = Leaderboard()
@@ -1,12 +1,14 @@
-from fastapi import FastAPI, Depends, HTTPException
+from fastapi import FastAPI, Depends, HTTPException, Query, Response
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import List
-import random
+from typing import List, Optional
+from datetime import datetime
 
+from answers import BufferFullError, answer_buffer, user_directory
 from database import get_session, init_db
-from models import Question, Option, TVSerial
+from leaderboard import leaderboard
+from models import AnswerSubmission
+from question_cache import question_cache
 
 app = FastAPI(title="TV Quiz API")
 
@@ -28,65 +30,130 @@ app.add_middleware(
 @app.on_event("startup")
 async def startup_event():
     await init_db()
+    async for session in get_session():
+        await leaderboard.load(session)
+    # Every flushed batch of answers also updates the leaderboard, in the same transaction
+    answer_buffer.aggregators.append(leaderboard)
+    answer_buffer.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    # Write the answers still buffered before the process exits
+    await answer_buffer.stop()
 
 @app.get("/questions/{tv_serial_title}", response_model=List[dict])
 async def get_questions(
     tv_serial_title: str,
-    limit: int = 10,
+    limit: int = Query(10, ge=0),
     session: AsyncSession = Depends(get_session)
 ):
     """
     Get random questions for a specific TV serial.
+    Served from the in-process question bank cache; the database is only read on a miss or after the TTL.
     """
-    # Get TV serial
-    result = await session.execute(
-        select(TVSerial).where(TVSerial.title == tv_serial_title)
-    )
-    tv_serial = result.scalar_one_or_none()
+    bank = await question_cache.get_bank(session, tv_serial_title)
     
-    if not tv_serial:
+    if bank is None:
         raise HTTPException(status_code=404, detail=f"TV serial '{tv_serial_title}' not found")
     
-    # Get all questions for the TV serial
-    result = await session.execute(
-        select(Question).where(Question.tv_serial_id == tv_serial.id)
-    )
-    questions = result.scalars().all()
-    
-    if not questions:
+    if not bank.records:
         raise HTTPException(status_code=404, detail=f"No questions found for '{tv_serial_title}'")
     
-    # Randomly select questions
-    selected_questions = random.sample(questions, min(limit, len(questions)))
-    
-    # Get options for selected questions
-    questions_with_options = []
-    for question in selected_questions:
-        result = await session.execute(
-            select(Option).where(Option.question_id == question.id)
-        )
-        options = result.scalars().all()
-        
-        # Format options as a dictionary
-        options_dict = {opt.option_key: opt.option_text for opt in options}
-        
-        questions_with_options.append({
-            "id": question.id,
-            "question": question.question_text,
-            "difficulty": question.difficulty,
-            "score": question.score,
-            "options": options_dict,
-            "correct_option": question.correct_option
-        })
-    
-    return questions_with_options
+    # Records are pre-serialized: the random draw is joined into the response body as is
+    return Response(content=bank.sample_json(limit), media_type="application/json")
 
 @app.get("/tv-serials", response_model=List[dict])
 async def get_tv_serials(session: AsyncSession = Depends(get_session)):
     """
     Get all available TV serials.
     """
-    result = await session.execute(select(TVSerial))
-    tv_serials = result.scalars().all()
+    return Response(content=await question_cache.get_tv_serials_json(session), media_type="application/json")
+
+@app.post("/answers")
+async def submit_answer(submission: AnswerSubmission, session: AsyncSession = Depends(get_session)):
+    """
+    Record a user's answer and tell whether it was correct.
+    Checked against the cached answer keys and written to the database in batches (write-behind).
+    """
+    answer_key = await question_cache.get_answer_key(submission.question_id)
+    
+    if answer_key is None:
+        raise HTTPException(status_code=404, detail=f"Question {submission.question_id} not found")
+    
+    correct_option, score, _ = answer_key
+    user_id = await user_directory.get_user_id(session, submission.username)
+    is_correct = submission.selected_option.value == correct_option
+    
+    try:
+        answer_buffer.submit({
+            "user_id": user_id,
+            "question_id": submission.question_id,
+            "selected_option": submission.selected_option,
+            "is_correct": is_correct,
+            "answered_at": datetime.utcnow()
+        })
+    except BufferFullError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    
+    return {
+        "question_id": submission.question_id,
+        "is_correct": is_correct,
+        "correct_option": correct_option,
+        "score": score if is_correct else 0
+    }
+
+async def get_tv_serial_id(session: AsyncSession, tv_serial_title: Optional[str]) -> Optional[int]:
+    if tv_serial_title is None:
+        return None
+    bank = await question_cache.get_bank(session, tv_serial_title)
+    if bank is None:
+        raise HTTPException(status_code=404, detail=f"TV serial '{tv_serial_title}' not found")
+    return bank.tv_serial_id
+
+@app.get("/leaderboard", response_model=List[dict])
+async def get_leaderboard(
+    limit: int = Query(10, ge=1, le=100),
+    tv_serial_title: Optional[str] = None,
+    session: AsyncSession = Depends(get_session)
+):
+    """
+    Get the top players by score, overall or for one TV serial.
+    Served from the in-memory rankings; answers count once their batch is written.
+    """
+    scores = leaderboard.scores(await get_tv_serial_id(session, tv_serial_title))
+    top = scores.top(limit)
+    usernames = await user_directory.get_usernames(session, [user_id for user_id, _ in top])
+    
+    return [
+        {
+            "rank": scores.rank(user_id),
+            "username": usernames.get(user_id),
+            "score": score,
+            "correct_answers": scores.correct_answers[user_id]
+        }
+        for user_id, score in top
+    ]
+
+@app.get("/leaderboard/{username}")
+async def get_user_rank(
+    username: str,
+    tv_serial_title: Optional[str] = None,
+    session: AsyncSession = Depends(get_session)
+):
+    """
+    Get a player's rank and score, overall or for one TV serial (rank is null before their first answer there).
+    """
+    user_id = await user_directory.find_user_id(session, username)
+    
+    if user_id is None:
+        raise HTTPException(status_code=404, detail=f"User '{username}' not found")
+    
+    scores = leaderboard.scores(await get_tv_serial_id(session, tv_serial_title))
     
-    return [{"id": ts.id, "title": ts.title} for ts in tv_serials] 
\ No newline at end of file
+    return {
+        "username": username,
+        "rank": scores.rank(user_id),
+        "score": scores.scores.get(user_id, 0),
+        "correct_answers": scores.correct_answers.get(user_id, 0),
+        "players": len(scores)
+    }
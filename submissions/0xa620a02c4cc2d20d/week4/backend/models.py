@@ -28,7 +28,7 @@ class Question(SQLModel, table=True):
     
     id: Optional[int] = Field(default=None, primary_key=True)
     question_text: str
-    tv_serial_id: int = Field(foreign_key="tv_serials.id")
+    tv_serial_id: int = Field(foreign_key="tv_serials.id", index=True)
     difficulty: Difficulty
     score: int = Field(ge=0)
     correct_option: OptionKey
@@ -42,7 +42,7 @@ class Option(SQLModel, table=True):
     __tablename__ = "options"
     
     id: Optional[int] = Field(default=None, primary_key=True)
-    question_id: int = Field(foreign_key="questions.id")
+    question_id: int = Field(foreign_key="questions.id", index=True)
     option_key: OptionKey
     option_text: str
     
@@ -71,4 +71,19 @@ class UserAnswer(SQLModel, table=True):
     
     # Relationships
     user: User = Relationship(back_populates="answers")
-    question: Question = Relationship(back_populates="user_answers") 
\ No newline at end of file
+    question: Question = Relationship(back_populates="user_answers") 
+
+class UserScore(SQLModel, table=True):
+    __tablename__ = "user_scores"
+    
+    # Materialized per-user, per-serial totals of user_answers, updated with every batch of answers
+    user_id: int = Field(foreign_key="users.id", primary_key=True)
+    tv_serial_id: int = Field(foreign_key="tv_serials.id", primary_key=True)
+    score: int = Field(default=0)
+    correct_answers: int = Field(default=0)
+    answers: int = Field(default=0)
+
+class AnswerSubmission(SQLModel):
+    username: str = Field(min_length=1, max_length=64)
+    question_id: int
+    selected_option: OptionKey
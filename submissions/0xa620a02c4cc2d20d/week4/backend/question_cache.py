@@ -0,0 +1,234 @@
+import asyncio
+import json
+import os
+import random
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import get_session
+from models import Question, Option, TVSerial
+
+# Seconds a loaded bank is served without touching the database. After that, one cheap
+# version query decides whether it is reloaded or kept for another TTL.
+CACHE_TTL_SECONDS = float(os.getenv("QUESTION_CACHE_TTL_SECONDS", "300"))
+# Upper bound for all cached banks together; least recently used serials are evicted first.
+CACHE_MAX_BYTES = int(os.getenv("QUESTION_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+RECORD_OVERHEAD_BYTES = 160  # Approximate per-question cost of the bytes object, list slot and answer key
+
+
+class QuestionBank:
+    """All questions of one TV serial, each already encoded as the JSON object the API returns,
+    plus the answer key of each question (question id -> (correct option, score))."""
+
+    def __init__(self, tv_serial_id: int, title: str, records: List[bytes], version: Tuple[int, int],
+                 answer_keys: Dict[int, Tuple[str, int]]):
+        self.tv_serial_id = tv_serial_id
+        self.title = title
+        self.records = records
+        self.answer_keys = answer_keys
+        self.version = version
+        self.loaded_at = time.monotonic()
+        self.size_bytes = sum(len(record) for record in records) + RECORD_OVERHEAD_BYTES * len(records)
+
+    def sample_json(self, limit: int) -> bytes:
+        """A random draw of up to `limit` questions as a JSON array."""
+        return b"[" + b",".join(random.sample(self.records, min(limit, len(self.records)))) + b"]"
+
+
+def encode_question(question_id: int, question_text: str, difficulty, score: int,
+                    correct_option, options: Dict[str, str]) -> bytes:
+    return json.dumps({
+        "id": question_id,
+        "question": question_text,
+        "difficulty": difficulty.value,
+        "score": score,
+        "options": options,
+        "correct_option": correct_option.value
+    }, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+async def bank_version(session: AsyncSession, tv_serial_id: int) -> Tuple[int, int]:
+    """(number of questions, highest question id) of a serial: changes whenever questions are inserted or deleted."""
+    result = await session.execute(
+        select(func.count(Question.id), func.max(Question.id)).where(Question.tv_serial_id == tv_serial_id)
+    )
+    count, max_id = result.one()
+    return count, max_id or 0
+
+
+async def load_bank(session: AsyncSession, tv_serial: TVSerial) -> QuestionBank:
+    """Load a serial's questions and options with a single joined query."""
+    result = await session.execute(
+        select(Question.id, Question.question_text, Question.difficulty, Question.score,
+               Question.correct_option, Option.option_key, Option.option_text)
+        .outerjoin(Option, Option.question_id == Question.id)
+        .where(Question.tv_serial_id == tv_serial.id)
+        .order_by(Question.id, Option.id)
+    )
+    records = []
+    answer_keys: Dict[int, Tuple[str, int]] = {}
+    current = None
+    options: Dict[str, str] = {}
+    for question_id, text, difficulty, score, correct_option, option_key, option_text in result:
+        if current is None or current[0] != question_id:
+            if current is not None:
+                records.append(encode_question(*current, options))
+            current = (question_id, text, difficulty, score, correct_option)
+            answer_keys[question_id] = (correct_option.value, score)
+            options = {}
+        if option_key is not None:
+            options[option_key.value] = option_text
+    if current is not None:
+        records.append(encode_question(*current, options))
+    max_id = current[0] if current is not None else 0
+    return QuestionBank(tv_serial.id, tv_serial.title, records, (len(records), max_id), answer_keys)
+
+
+class QuestionBankCache:
+    """In-process cache of question banks per TV serial title, plus the serial list.
+
+    - Fresh banks (younger than ttl_seconds) are served with no database access at all.
+    - Stale banks are revalidated with bank_version(): unchanged banks are kept, changed ones reloaded,
+      so questions inserted by another process (generate_questions.py) show up within one TTL.
+    - invalidate() drops entries immediately, for inserts made in this process.
+    - Total size is kept under max_bytes by evicting the least recently used serials.
+    - Answer keys are kept apart from the banks and are not evicted with them, so checking an answer never
+      reloads a bank: a question not seen yet costs one single-row query. Reloading a serial's bank
+      replaces its answer keys, which drops deleted questions.
+    """
+
+    def __init__(self, ttl_seconds: float = CACHE_TTL_SECONDS, max_bytes: int = CACHE_MAX_BYTES):
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.size_bytes = 0
+        self._banks: "OrderedDict[str, QuestionBank]" = OrderedDict()
+        self._locks: Dict[str, asyncio.Lock] = {}
+        # tv_serial_id -> {question id -> (correct option, score)}
+        self._answer_keys: Dict[int, Dict[int, Tuple[str, int]]] = {}
+        self._answer_key_queries: Dict[int, asyncio.Event] = {}  # question id -> set once its lookup is done
+        self._serials_json: Optional[bytes] = None
+        self._serials_loaded_at = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+        self.evictions = 0
+
+    def _is_fresh(self, loaded_at: float) -> bool:
+        return time.monotonic() - loaded_at < self.ttl_seconds
+
+    async def get_bank(self, session: AsyncSession, title: str) -> Optional[QuestionBank]:
+        """The bank for `title`, loading or revalidating it if needed; None if the serial does not exist."""
+        bank = self._banks.get(title)
+        if bank is not None and self._is_fresh(bank.loaded_at):
+            self._banks.move_to_end(title)
+            self.hits += 1
+            return bank
+        # One loader per title: concurrent requests for the same stale bank wait for it instead of
+        # all querying the database
+        lock = self._locks.setdefault(title, asyncio.Lock())
+        async with lock:
+            bank = self._banks.get(title)
+            if bank is not None and self._is_fresh(bank.loaded_at):
+                self.hits += 1
+                return bank
+            if bank is not None:
+                self.revalidations += 1
+                if await bank_version(session, bank.tv_serial_id) == bank.version:
+                    bank.loaded_at = time.monotonic()
+                    return bank
+            self.misses += 1
+            result = await session.execute(select(TVSerial).where(TVSerial.title == title))
+            tv_serial = result.scalar_one_or_none()
+            if tv_serial is None:
+                self._remove(title)
+                self._locks.pop(title, None)
+                return None
+            bank = await load_bank(session, tv_serial)
+            self._answer_keys[bank.tv_serial_id] = bank.answer_keys
+            self._store(bank)
+            return bank
+
+    async def get_answer_key(self, question_id: int) -> Optional[Tuple[str, int, int]]:
+        """(correct option, score, tv_serial_id) of a question, or None if it does not exist. Served from the
+        answer keys in memory; a question not seen yet costs one single-row query, never a bank load."""
+        answer_key = self.cached_answer_key(question_id)
+        if answer_key is not None:
+            return answer_key
+        # Concurrent answers to the same new question wait for the first lookup instead of all querying
+        query_done = self._answer_key_queries.get(question_id)
+        if query_done is not None:
+            await query_done.wait()
+            answer_key = self.cached_answer_key(question_id)
+            # Not found, or that lookup failed: look it up again rather than sharing its outcome
+            return answer_key if answer_key is not None else await self._query_answer_key(question_id)
+        query_done = self._answer_key_queries[question_id] = asyncio.Event()
+        try:
+            return await self._query_answer_key(question_id)
+        finally:
+            del self._answer_key_queries[question_id]
+            query_done.set()
+
+    async def _query_answer_key(self, question_id: int) -> Optional[Tuple[str, int, int]]:
+        # A session of its own, closed right away: the caller's session would keep its connection checked out
+        # while the request goes on to wait for other locks (e.g. UserDirectory), which can drain the pool
+        async for session in get_session():
+            result = await session.execute(
+                select(Question.correct_option, Question.score, Question.tv_serial_id).where(Question.id == question_id)
+            )
+            row = result.one_or_none()
+        if row is None:
+            return None
+        correct_option, score, tv_serial_id = row
+        self._answer_keys.setdefault(tv_serial_id, {})[question_id] = (correct_option.value, score)
+        return correct_option.value, score, tv_serial_id
+
+    def cached_answer_key(self, question_id: int) -> Optional[Tuple[str, int, int]]:
+        """Like get_answer_key(), but only from the answer keys already in memory."""
+        for tv_serial_id, answer_keys in self._answer_keys.items():
+            answer_key = answer_keys.get(question_id)
+            if answer_key is not None:
+                return (*answer_key, tv_serial_id)
+        return None
+
+    async def get_tv_serials_json(self, session: AsyncSession) -> bytes:
+        """The /tv-serials response body, reloaded after ttl_seconds or invalidate()."""
+        if self._serials_json is None or not self._is_fresh(self._serials_loaded_at):
+            result = await session.execute(select(TVSerial.id, TVSerial.title))
+            self._serials_json = json.dumps([{"id": id_, "title": title} for id_, title in result],
+                                            ensure_ascii=False, separators=(",", ":")).encode()
+            self._serials_loaded_at = time.monotonic()
+        return self._serials_json
+
+    def _store(self, bank: QuestionBank):
+        self._remove(bank.title)
+        self._banks[bank.title] = bank
+        self.size_bytes += bank.size_bytes
+        # Evict other serials first; a single bank larger than max_bytes is still served, just not kept
+        while self.size_bytes > self.max_bytes and self._banks:
+            title = next(iter(self._banks))
+            self._remove(title)
+            self.evictions += 1
+
+    def _remove(self, title: str):
+        bank = self._banks.pop(title, None)
+        if bank is not None:
+            self.size_bytes -= bank.size_bytes
+
+    def invalidate(self, tv_serial_id: Optional[int] = None):
+        """Drop the cached bank of one serial (by id), or everything if no id is given."""
+        for title, bank in list(self._banks.items()):
+            if tv_serial_id is None or bank.tv_serial_id == tv_serial_id:
+                self._remove(title)
+        self._serials_json = None
+
+    def stats(self) -> Dict:
+        return {"serials": len(self._banks), "size_bytes": self.size_bytes, "hits": self.hits,
+                "misses": self.misses, "revalidations": self.revalidations, "evictions": self.evictions,
+                "answer_keys": sum(len(answer_keys) for answer_keys in self._answer_keys.values())}
+
+
+question_cache = QuestionBankCache()
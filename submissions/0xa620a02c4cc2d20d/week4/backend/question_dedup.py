@@ -0,0 +1,137 @@
+import hashlib
+import re
+import unicodedata
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models import Question
+
+# MinHash signature = NUM_BANDS bands of ROWS_PER_BAND rows. Two questions become candidates when any band
+# matches exactly, which happens with high probability above Jaccard ~ (1 / NUM_BANDS) ** (1 / ROWS_PER_BAND)
+# (about 0.5 here); candidates are then confirmed against SIMILARITY_THRESHOLD on the full signature.
+NUM_BANDS = 16
+ROWS_PER_BAND = 4
+NUM_PERMUTATIONS = NUM_BANDS * ROWS_PER_BAND
+SIMILARITY_THRESHOLD = 0.7
+SHINGLE_SIZE = 5  # Characters per shingle of the normalized text
+MAX_BUCKET_SIZE = 64  # Ids kept per LSH bucket, so a crowded bucket cannot make lookups grow with the bank
+
+_rng = np.random.default_rng(0x5EED)
+# Hash family h(x) = (a * x + b) mod 2**32 with odd a; fixed seed so signatures are stable across runs
+_HASH_A = (_rng.integers(0, 2 ** 31, NUM_PERMUTATIONS, dtype=np.uint64) * 2 + 1)[:, None]
+_HASH_B = _rng.integers(0, 2 ** 32, NUM_PERMUTATIONS, dtype=np.uint64)[:, None]
+_MASK_32 = np.uint64(0xFFFFFFFF)
+_NON_WORD = re.compile(r"[\W_]+")
+
+
+def normalize_text(text: str) -> str:
+    """Lowercase, accents and punctuation removed, whitespace collapsed"""
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return _NON_WORD.sub(" ", text.lower()).strip()
+
+
+class QuestionFingerprint:
+    """Exact key of the normalized text plus its MinHash signature"""
+
+    __slots__ = ("exact_key", "signature")
+
+    def __init__(self, text: str):
+        normalized = normalize_text(text)
+        self.exact_key = hashlib.blake2b(normalized.encode(), digest_size=8).digest()
+        shingles = {normalized[i:i + SHINGLE_SIZE] for i in range(max(1, len(normalized) - SHINGLE_SIZE + 1))}
+        hashes = np.fromiter((zlib.crc32(s.encode()) for s in shingles), dtype=np.uint64, count=len(shingles))
+        self.signature = ((_HASH_A * hashes + _HASH_B) & _MASK_32).min(axis=1).astype(np.uint32)
+
+    def band_keys(self) -> List[bytes]:
+        return [band.tobytes() for band in self.signature.reshape(NUM_BANDS, ROWS_PER_BAND)]
+
+
+class SerialDedupIndex:
+    """Exact-text and MinHash/LSH index of the questions of one TV serial"""
+
+    def __init__(self):
+        self.exact: Dict[bytes, int] = {}
+        self.signatures: Dict[int, np.ndarray] = {}
+        self.buckets: List[Dict[bytes, List[int]]] = [{} for _ in range(NUM_BANDS)]
+
+    def __len__(self) -> int:
+        return len(self.signatures)
+
+    def add(self, question_id: int, fingerprint: QuestionFingerprint):
+        self.exact.setdefault(fingerprint.exact_key, question_id)
+        self.signatures[question_id] = fingerprint.signature
+        for buckets, key in zip(self.buckets, fingerprint.band_keys()):
+            bucket = buckets.setdefault(key, [])
+            if len(bucket) < MAX_BUCKET_SIZE:
+                bucket.append(question_id)
+
+    def find_duplicate(self, fingerprint: QuestionFingerprint) -> Optional[int]:
+        """Id of an indexed question with the same normalized text or estimated Jaccard >= SIMILARITY_THRESHOLD"""
+        question_id = self.exact.get(fingerprint.exact_key)
+        if question_id is not None:
+            return question_id
+        seen = set()
+        for buckets, key in zip(self.buckets, fingerprint.band_keys()):
+            for candidate in buckets.get(key, ()):
+                if candidate in seen:
+                    continue
+                seen.add(candidate)
+                if np.mean(self.signatures[candidate] == fingerprint.signature) >= SIMILARITY_THRESHOLD:
+                    return candidate
+        return None
+
+
+class QuestionDedupIndex:
+    """Near-duplicate index per TV serial, built from the database on first use and kept up to date by add()"""
+
+    def __init__(self):
+        self._serials: Dict[int, SerialDedupIndex] = {}
+
+    async def get_serial_index(self, session: AsyncSession, tv_serial_id: int) -> SerialDedupIndex:
+        index = self._serials.get(tv_serial_id)
+        if index is None:
+            index = SerialDedupIndex()
+            result = await session.stream(
+                select(Question.id, Question.question_text).where(Question.tv_serial_id == tv_serial_id)
+            )
+            async for question_id, text in result:
+                index.add(question_id, QuestionFingerprint(text))
+            self._serials[tv_serial_id] = index
+        return index
+
+    async def filter_batch(self, session: AsyncSession, tv_serial_id: int, questions_data: List[Dict]
+                           ) -> Tuple[List[Dict], List[QuestionFingerprint], List[Tuple[Dict, Optional[int]]]]:
+        """Split a batch into (unique questions, their fingerprints, rejected (question, duplicate_of) pairs).
+        duplicate_of is the id of the existing question, or None for a duplicate within the batch itself."""
+        index = await self.get_serial_index(session, tv_serial_id)
+        batch_index = SerialDedupIndex()
+        unique, fingerprints, rejected = [], [], []
+        for position, q_data in enumerate(questions_data):
+            fingerprint = QuestionFingerprint(q_data["question"])
+            duplicate_of = index.find_duplicate(fingerprint)
+            if duplicate_of is None and batch_index.find_duplicate(fingerprint) is None:
+                batch_index.add(position, fingerprint)
+                unique.append(q_data)
+                fingerprints.append(fingerprint)
+            else:
+                rejected.append((q_data, duplicate_of))
+        return unique, fingerprints, rejected
+
+    def add(self, tv_serial_id: int, question_ids: List[int], fingerprints: List[QuestionFingerprint]):
+        """Register inserted questions (only for serials already loaded; others are read on first use)"""
+        index = self._serials.get(tv_serial_id)
+        if index is not None:
+            for question_id, fingerprint in zip(question_ids, fingerprints):
+                index.add(question_id, fingerprint)
+
+    def invalidate(self, tv_serial_id: int):
+        """Forget a serial (e.g. after inserting without deduplication); it is reloaded on next use"""
+        self._serials.pop(tv_serial_id, None)
+
+
+question_dedup = QuestionDedupIndex()
@@ -0,0 +1,65 @@
+import asyncio
+import json
+import random
+import re
+from types import SimpleNamespace
+from typing import Optional
+
+PROMPT_PATTERN = re.compile(r"Generate (\d+) trivia questions about (.+?) TV series")
+SYLLABLES = ["ka", "lo", "mi", "ne", "ru", "sa", "ti", "vo", "ze", "pa", "go", "di", "fu", "ba", "je", "wi"]
+
+
+class StubCompletionError(Exception):
+    pass
+
+
+class StubCompletionClient:
+    """Offline stand-in for AsyncOpenAI with the same client.chat.completions.create(...) shape.
+
+    Answers each prompt with the requested number of valid, distinct questions after latency_seconds,
+    and fails with StubCompletionError (or returns invalid JSON) with the given probabilities, so the
+    generation pipeline's concurrency, retries and throughput can be exercised without the API.
+    """
+
+    def __init__(self, latency_seconds: float = 0.5, failure_rate: float = 0.0,
+                 invalid_json_rate: float = 0.0, seed: Optional[int] = None):
+        self.latency_seconds = latency_seconds
+        self.failure_rate = failure_rate
+        self.invalid_json_rate = invalid_json_rate
+        self.random = random.Random(seed)
+        self.calls = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._next_question = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    async def create(self, model: str, messages, **kwargs):
+        self.calls += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.latency_seconds)
+            if self.random.random() < self.failure_rate:
+                raise StubCompletionError("stub completion failed")
+            match = PROMPT_PATTERN.search(messages[-1]["content"])
+            num_questions, title = int(match.group(1)), match.group(2)
+            if self.random.random() < self.invalid_json_rate:
+                content = '{"questions": ['
+            else:
+                content = json.dumps({"questions": [self._question(title) for _ in range(num_questions)]})
+            return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+        finally:
+            self.in_flight -= 1
+
+    def _question(self, title: str) -> dict:
+        self._next_question += 1
+        n = self._next_question
+        # Random words, so stub questions are not near-duplicates of each other
+        words = " ".join("".join(self.random.choice(SYLLABLES) for _ in range(3)) for _ in range(6))
+        return {
+            "question": f"In {title}, {words}?",
+            "difficulty": self.random.choice(["easy", "medium", "hard"]),
+            "score": self.random.randint(1, 5),
+            "options": {key: f"Option {key} for question {n}" for key in "ABCD"},
+            "correct_option": self.random.choice("ABCD")
+        }
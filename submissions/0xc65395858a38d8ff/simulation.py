@@ -1,16 +1,42 @@
+import heapq
+import itertools
+import math
 import random
 import time
 import uuid
-from typing import Dict, List, Optional, Tuple
-import matplotlib.pyplot as plt
+from array import array
+from collections.abc import Mapping
+from typing import Dict, Iterable, List, Optional, Tuple
 import numpy as np
 
+from simulation_eventos import (EVENTO_AMBIENTE_CREADO, EVENTO_AMBIENTE_LLENO, EVENTO_CRIATURA_AÑADIDA, EVENTO_CRIATURA_REMOVIDA,
+                                EVENTO_HOMEOSTASIS, EVENTO_MUERTE, EVENTO_NACIMIENTO, EVENTO_REPRODUCCION, EVENTO_TICK,
+                                HOMEOSTASIS_APLICADA, HOMEOSTASIS_EP_INSUFICIENTES, HOMEOSTASIS_GEN_NO_VISIBLE, bus_eventos)
+from simulation_hashing import (FNV_OFFSET_BASIS_64, FNV_PRIME_64, MODO_HASH_ENTERO, MODO_HASH_TEXTO,
+                                cache_tablas_hash, fnv1a_64, semillas_por_contador, simple_hash)
+
 # --- Constantes de Simulación ---
 TIMESTEPS_POR_DIA_SIMULADO = 300
 DIA_EN_SEGUNDOS_SIMULADOS = 60.0 # Para pruebas: 1 día simulado = 1 minuto. Cambiar a 24*60*60 para real.
 MAX_CRIATURAS_POR_AMBIENTE = 5
 PROBABILIDAD_REPRODUCCION_DIARIA_POR_PAREJA = 0.25 # Aumentado para más acción en sim corta
 
+# --- Catch-up de criaturas inactivas ---
+CATCH_UP_POR_DIAS_COMPLETOS = False # Reloj entero de ticks; procesa tramos del día en lote (ver Criatura._actualizar_por_ticks)
+MIN_TIMESTEPS_TRAMO_EN_LOTE = 16 # Tramos más cortos se evolucionan timestep a timestep
+
+# --- Semillas diarias ---
+# False: se sacan de `random` (historias existentes). True: se derivan de (SEMILLA_MUNDO, id de criatura, día),
+# así que no dependen del orden de ejecución y se puede saltar a cualquier día (ver Criatura.saltar_a_dia).
+SEMILLAS_DIARIAS_POR_CONTADOR = False
+SEMILLA_MUNDO = 42
+
+# --- Ambientes grandes ---
+# True: cada Ambiente mantiene un índice incremental de candidatas a reproducción (ver IndiceReproduccion), y cada
+# pasada de intentar_reproduccion_ambiente cuesta en proporción a las candidatas, no a la población. Mismos
+# emparejamientos y mismo consumo de `random` que el recorrido completo.
+REPRODUCCION_INDEXADA = False
+
 # --- Configuración de Genes ---
 GENES_VISIBLES_DEFAULT = {
     "colorR": (0.0, 1.0), "colorG": (0.0, 1.0), "colorB": (0.0, 1.0),
@@ -29,32 +55,112 @@ GENES_OCULTOS_DEFAULT = {
     "agilidadCombate": (0.5, 2.0)
 }
 
+# Índices fijos de cada gen en los vectores de Criatura y límites precalculados (min, max, es_entero)
+NOMBRES_GENES_VISIBLES = list(GENES_VISIBLES_DEFAULT.keys())
+NOMBRES_GENES_OCULTOS = list(GENES_OCULTOS_DEFAULT.keys())
+INDICE_GEN_VISIBLE = {gen: i for i, gen in enumerate(NOMBRES_GENES_VISIBLES)}
+INDICE_GEN_OCULTO = {gen: i for i, gen in enumerate(NOMBRES_GENES_OCULTOS)}
+LIMITES_GENES_VISIBLES = [(min_val, max_val, isinstance(min_val, int)) for min_val, max_val in GENES_VISIBLES_DEFAULT.values()]
+LIMITES_GENES_OCULTOS = [(min_val, max_val, isinstance(min_val, int)) for min_val, max_val in GENES_OCULTOS_DEFAULT.values()]
+GENES_OCULTOS_ESTATICOS = ["tasaMetabolica", "fertilidad", "potencialEvolutivo", "max_lifespan_dias_base"] # No evolucionan por timestep
+IDX_POTENCIAL_EVOLUTIVO = INDICE_GEN_OCULTO["potencialEvolutivo"]
+IDX_FERTILIDAD = INDICE_GEN_OCULTO["fertilidad"]
+IDX_TAMAÑO_BASE = INDICE_GEN_VISIBLE["tamañoBase"]
+IDX_FORMA_PRINCIPAL = INDICE_GEN_VISIBLE["formaPrincipal"]
+IDX_NUM_APENDICES = INDICE_GEN_VISIBLE["numApendices"]
+
 # --- Factores de Evolución ---
 TASA_APRENDIZAJE_HOMEOSTASIS_BASE = 0.05
 TASA_EVOLUCION_PASIVA_GEN_BASE = 0.001 # Cambio base por timestep
 FACTOR_GANANCIA_EP_POR_TIMESTEP = 0.002  # Aumentado de 0.0002 a 0.002
 FACTOR_INFLUENCIA_VISUAL_SOBRE_COMBATE = 0.0001 # Cuánto influye un gen visible en uno de combate, por timestep
 
-# --- Constantes para FNV-1a Hash (ejemplo) ---
-FNV_PRIME_64 = 1099511627776
-FNV_OFFSET_BASIS_64 = 14695981039346656037
+# --- Hashing de la deriva de genes (ver simulation_hashing.py) ---
+MODO_HASH_GENES = MODO_HASH_TEXTO # MODO_HASH_TEXTO reproduce simple_hash sobre f-strings; no cambiar en historias existentes
 
-def fnv1a_64(data_str: str) -> int:
-    """Calcula un hash FNV-1a de 64 bits para una cadena."""
-    hash_val = FNV_OFFSET_BASIS_64
-    for byte_char in data_str.encode('utf-8'):
-        hash_val = (hash_val ^ byte_char) * FNV_PRIME_64
-        hash_val &= 0xffffffffffffffff # Asegurar que sea un UInt64
-    return hash_val
+def tabla_pseudo_rand_dia(semilla: int) -> np.ndarray:
+    """Tabla (TIMESTEPS_POR_DIA_SIMULADO, n_genes) con hash(f"{semilla}-{timestep_in_day}-{gene_idx}") % 10000, cacheada por semilla."""
+    n_genes = len(GENES_VISIBLES_DEFAULT) + len(GENES_OCULTOS_DEFAULT)
+    return cache_tablas_hash.obtener(semilla, TIMESTEPS_POR_DIA_SIMULADO, n_genes, MODO_HASH_GENES)
 
-def simple_hash(seed_str: str) -> int:
-    """Función de hash simple para derivación determinista."""
-    return fnv1a_64(seed_str)
+def filas_pseudo_rand_dia(semilla: int, ts_inicio: int, n_timesteps: int, tramo: int = None) -> np.ndarray:
+    """Filas ts_inicio .. ts_inicio+n_timesteps-1 de tabla_pseudo_rand_dia(semilla). Si la tabla no está en cache
+    y el tramo (por defecto n_timesteps) es corto, se calculan solo esas filas (ver simulation_hashing)."""
+    n_genes = len(GENES_VISIBLES_DEFAULT) + len(GENES_OCULTOS_DEFAULT)
+    return cache_tablas_hash.filas(semilla, ts_inicio, n_timesteps, TIMESTEPS_POR_DIA_SIMULADO, n_genes, MODO_HASH_GENES, tramo)
 
 def clamp(valor, minimo, maximo):
     return max(minimo, min(valor, maximo))
 
+def modificador_influencia_combate(gen_nombre_oculto: str, forma_actual: np.ndarray, tend_tamaño_norm_factor: np.ndarray,
+                                   norm_num_apendices: np.ndarray, apendices_actuales: np.ndarray) -> Optional[np.ndarray]:
+    """Versión en arrays de las tendencias de _evolucion_un_timestep para un gen de combate (None si no es de combate).
+    Mantiene el mismo orden de sumas que la versión escalar para obtener resultados idénticos."""
+    if gen_nombre_oculto == "puntosSaludMax":
+        tendencia_forma = np.where(forma_actual == 2, 0.5, 0.0)
+        return tend_tamaño_norm_factor * 1.0 + tendencia_forma
+    if gen_nombre_oculto == "ataqueBase":
+        tendencia_forma = np.where(forma_actual == 3, 1.0, np.where(forma_actual == 1, -0.3, 0.0))
+        return tendencia_forma + norm_num_apendices * 0.7 + tend_tamaño_norm_factor * 0.3
+    if gen_nombre_oculto == "defensaBase":
+        tendencia_forma = np.where(forma_actual == 2, 1.0, np.where(forma_actual == 3, -0.3, 0.0))
+        return tendencia_forma + tend_tamaño_norm_factor * 1.0
+    if gen_nombre_oculto == "agilidadCombate":
+        tendencia_forma = np.where(forma_actual == 1, 1.0, np.where(forma_actual == 2, -0.7, 0.0))
+        tendencia_tamaño = -tend_tamaño_norm_factor * 1.0
+        min_na, max_na = GENES_VISIBLES_DEFAULT["numApendices"]
+        optimo_apendices = (min_na + max_na) / 2.0
+        dist_max_desde_optimo_ap = (max_na - min_na) / 2.0
+        if dist_max_desde_optimo_ap == 0:
+            tendencia_apendices_u_shape = np.zeros_like(apendices_actuales)
+        else:
+            tendencia_apendices_u_shape = ((1.0 - np.abs(apendices_actuales - optimo_apendices) / dist_max_desde_optimo_ap) - 0.5) * 2.0
+        return tendencia_forma + tendencia_tamaño + tendencia_apendices_u_shape * 0.5
+    return None
+
+class VistaGenes(Mapping):
+    """Vista de solo lectura, tipo dict (nombre de gen -> valor), sobre un vector de genes de Criatura."""
+    __slots__ = ("_valores", "_indices")
+
+    def __init__(self, valores: array, indices: Dict[str, int]):
+        self._valores = valores
+        self._indices = indices
+
+    def __getitem__(self, gen_nombre: str) -> float:
+        return self._valores[self._indices[gen_nombre]]
+
+    def __iter__(self):
+        return iter(self._indices)
+
+    def __len__(self) -> int:
+        return len(self._indices)
+
+    def __repr__(self) -> str:
+        return repr(dict(self))
+
+class VistaObjetivosHomeostasis(VistaGenes):
+    """Como VistaGenes, pero solo con los genes que tienen objetivo (NaN en el vector = sin objetivo)."""
+    __slots__ = ()
+
+    def __getitem__(self, gen_nombre: str) -> float:
+        valor = self._valores[self._indices[gen_nombre]]
+        if valor != valor:
+            raise KeyError(gen_nombre)
+        return valor
+
+    def __iter__(self):
+        return (gen for gen, i in self._indices.items() if self._valores[i] == self._valores[i])
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
 class Criatura:
+    # Representación compacta: sin __dict__ y con los genes en vectores de índice fijo (ver NOMBRES_GENES_*)
+    __slots__ = ("id", "nombre", "esta_viva", "birth_timestamp", "last_evolution_processed_timestamp",
+                 "last_seed_generation_timestamp", "_semillas_diarias", "edad_dias_completos",
+                 "edad_timesteps_evolutivos_total", "_genes_visibles", "_genes_ocultos", "_homeostasis_targets",
+                 "puntos_evolucion", "lifespan_total_dias")
+
     def __init__(self, nombre: str, birth_timestamp: float, id_criatura: Optional[str] = None, ep_inicial: Optional[float] = None, genes_padre1: Optional[Dict] = None, genes_padre2: Optional[Dict] = None):
         self.id: str = id_criatura if id_criatura else uuid.uuid4().hex[:8]
         self.nombre: str = nombre
@@ -68,64 +174,107 @@ class Criatura:
         self.edad_dias_completos: float = 0.0 # Días simulados vividos
         self.edad_timesteps_evolutivos_total: int = 0
 
-        self.genes_visibles: Dict[str, float] = {}
-        self.genes_ocultos: Dict[str, float] = {}
-        self.homeostasis_targets: Dict[str, float] = {}
+        self._genes_visibles = array('d', bytes(8 * len(NOMBRES_GENES_VISIBLES)))
+        self._genes_ocultos = array('d', bytes(8 * len(NOMBRES_GENES_OCULTOS)))
+        self._homeostasis_targets = array('d', [math.nan] * len(NOMBRES_GENES_VISIBLES))
 
         if genes_padre1 and genes_padre2: # Herencia
             self._heredar_genes(genes_padre1, genes_padre2)
         else: # Generación inicial
-            for gen, (min_val, max_val) in GENES_VISIBLES_DEFAULT.items():
-                self.genes_visibles[gen] = float(random.randint(min_val, max_val)) if isinstance(min_val, int) else random.uniform(min_val, max_val)
-            for gen, (min_val, max_val) in GENES_OCULTOS_DEFAULT.items():
-                self.genes_ocultos[gen] = random.uniform(min_val, max_val)
+            for i, (min_val, max_val, es_entero) in enumerate(LIMITES_GENES_VISIBLES):
+                self._genes_visibles[i] = float(random.randint(min_val, max_val)) if es_entero else random.uniform(min_val, max_val)
+            for i, (min_val, max_val, _) in enumerate(LIMITES_GENES_OCULTOS):
+                self._genes_ocultos[i] = random.uniform(min_val, max_val)
 
         self.puntos_evolucion: float = ep_inicial if ep_inicial is not None else random.uniform(10.0, 25.0)
-        base_lifespan = self.genes_ocultos["max_lifespan_dias_base"]
+        base_lifespan = self._genes_ocultos[INDICE_GEN_OCULTO["max_lifespan_dias_base"]]
         self.lifespan_total_dias: float = random.uniform(base_lifespan * 0.9, base_lifespan * 1.1)
         
-        print(f"    Criatura creada: {self.nombre} (ID: {self.id}), Nacimiento: {self.birth_timestamp:.2f}s, EP_inicial: {self.puntos_evolucion:.1f}, Vida: {self.lifespan_total_dias:.1f}d")
+        if bus_eventos.oyentes:
+            bus_eventos.emitir(EVENTO_NACIMIENTO, id=self.id, nombre=self.nombre, t=self.birth_timestamp,
+                               ep=self.puntos_evolucion, lifespan_dias=self.lifespan_total_dias)
+
+    # Vistas de solo lectura para el código que accede a los genes por nombre (display_estado, herencia, etc.)
+    @property
+    def genes_visibles(self) -> VistaGenes:
+        return VistaGenes(self._genes_visibles, INDICE_GEN_VISIBLE)
+
+    @property
+    def genes_ocultos(self) -> VistaGenes:
+        return VistaGenes(self._genes_ocultos, INDICE_GEN_OCULTO)
+
+    @property
+    def homeostasis_targets(self) -> VistaObjetivosHomeostasis:
+        return VistaObjetivosHomeostasis(self._homeostasis_targets, INDICE_GEN_VISIBLE)
+
+    @property
+    def current_daily_random_seeds(self) -> array:
+        return self._semillas_diarias
+
+    @current_daily_random_seeds.setter
+    def current_daily_random_seeds(self, semillas):
+        self._semillas_diarias = array('Q', semillas)
+
+    def cargar_genes(self, genes_visibles, genes_ocultos):
+        """Sobrescribe los vectores de genes (valores en el orden de NOMBRES_GENES_VISIBLES / NOMBRES_GENES_OCULTOS)."""
+        self._genes_visibles[:] = array('d', genes_visibles)
+        self._genes_ocultos[:] = array('d', genes_ocultos)
 
     def _heredar_genes(self, genes_p1: Dict, genes_p2: Dict):
         # Simple herencia y mutación (adaptar de la versión anterior)
-        for gen_nombre, (min_val, max_val) in GENES_VISIBLES_DEFAULT.items():
+        for i, gen_nombre in enumerate(NOMBRES_GENES_VISIBLES):
+            min_val, max_val, es_entero = LIMITES_GENES_VISIBLES[i]
             val_p1 = genes_p1['visibles'][gen_nombre]
             val_p2 = genes_p2['visibles'][gen_nombre]
             gen_cria = random.choice([val_p1, val_p2])
             if random.random() < 0.1: # Mutación
-                cambio = random.choice([-1,1]) if isinstance(min_val,int) else random.uniform(-(max_val-min_val)*0.05, (max_val-min_val)*0.05)
+                cambio = random.choice([-1,1]) if es_entero else random.uniform(-(max_val-min_val)*0.05, (max_val-min_val)*0.05)
                 gen_cria += cambio
-            self.genes_visibles[gen_nombre] = float(round(clamp(gen_cria, min_val, max_val))) if isinstance(min_val,int) else clamp(gen_cria, min_val, max_val)
+            self._genes_visibles[i] = float(round(clamp(gen_cria, min_val, max_val))) if es_entero else clamp(gen_cria, min_val, max_val)
 
-        for gen_nombre, (min_val, max_val) in GENES_OCULTOS_DEFAULT.items():
+        for i, gen_nombre in enumerate(NOMBRES_GENES_OCULTOS):
+            min_val, max_val, _ = LIMITES_GENES_OCULTOS[i]
             val_p1 = genes_p1['ocultos'][gen_nombre]
             val_p2 = genes_p2['ocultos'][gen_nombre]
             gen_cria = (val_p1 + val_p2) / 2
             if random.random() < 0.05: # Mutación
                 cambio = random.uniform(-(max_val-min_val)*0.05, (max_val-min_val)*0.05)
                 gen_cria += cambio
-            self.genes_ocultos[gen_nombre] = clamp(gen_cria, min_val, max_val)
+            self._genes_ocultos[i] = clamp(gen_cria, min_val, max_val)
 
-    def _generate_new_daily_seeds(self) -> List[int]:
+    def _generate_new_daily_seeds(self, dia: Optional[int] = None) -> List[int]:
         # print(f"      {self.nombre}: Generando nuevas semillas diarias.")
+        if SEMILLAS_DIARIAS_POR_CONTADOR:
+            return semillas_por_contador(self.id, self.indice_dia_semillas() if dia is None else dia, semilla_mundo=SEMILLA_MUNDO)
         return [random.randint(0, 2**32 - 1) for _ in range(5)] # Simula obtención de Flow
 
-    def _aplicar_cambio_gen(self, gen_nombre: str, cambio: float):
-        if gen_nombre in self.genes_visibles:
-            min_val, max_val = GENES_VISIBLES_DEFAULT[gen_nombre]
-            self.genes_visibles[gen_nombre] += cambio
-            if isinstance(min_val, int): # Asegurar que los genes enteros permanezcan enteros
-                self.genes_visibles[gen_nombre] = float(round(self.genes_visibles[gen_nombre]))
-            self.genes_visibles[gen_nombre] = clamp(self.genes_visibles[gen_nombre], min_val, max_val)
-
-    def _aplicar_cambio_gen_oculto(self, gen_nombre: str, cambio: float):
-        if gen_nombre in self.genes_ocultos:
-            min_val, max_val = GENES_OCULTOS_DEFAULT[gen_nombre]
-            self.genes_ocultos[gen_nombre] += cambio
-            # Los genes ocultos suelen ser flotantes, no necesitan redondeo especial a menos que se defina
-            self.genes_ocultos[gen_nombre] = clamp(self.genes_ocultos[gen_nombre], min_val, max_val)
-
-    def _evolucion_un_timestep(self, timestep_in_day: int):
+    def indice_dia_semillas(self) -> int:
+        """Día (0 = nacimiento) al que corresponden las semillas actuales."""
+        return int(round((self.last_seed_generation_timestamp - self.birth_timestamp) / DIA_EN_SEGUNDOS_SIMULADOS))
+
+    def clonar(self) -> "Criatura":
+        """Copia independiente (p.ej. una instantánea desde la que luego saltar a otro día)."""
+        copia = Criatura.__new__(Criatura)
+        for atributo in Criatura.__slots__:
+            valor = getattr(self, atributo)
+            setattr(copia, atributo, array(valor.typecode, valor) if isinstance(valor, array) else valor)
+        return copia
+
+    def _aplicar_cambio_gen(self, gene_idx: int, cambio: float):
+        min_val, max_val, es_entero = LIMITES_GENES_VISIBLES[gene_idx]
+        valor = self._genes_visibles[gene_idx] + cambio
+        if es_entero: # Asegurar que los genes enteros permanezcan enteros
+            valor = float(round(valor))
+        self._genes_visibles[gene_idx] = clamp(valor, min_val, max_val)
+
+    def _aplicar_cambio_gen_oculto(self, gene_idx: int, cambio: float):
+        min_val, max_val, _ = LIMITES_GENES_OCULTOS[gene_idx]
+        # Los genes ocultos suelen ser flotantes, no necesitan redondeo especial a menos que se defina
+        self._genes_ocultos[gene_idx] = clamp(self._genes_ocultos[gene_idx] + cambio, min_val, max_val)
+
+    def _evolucion_un_timestep(self, timestep_in_day: int, timesteps_tramo: int = None):
+        """Un timestep. timesteps_tramo: cuántos timesteps seguidos de este día quedan por evolucionar desde este
+        (decide si compensa construir las tablas de hash del día; None = el resto del día)."""
         if not self.esta_viva: return
 
         # Roles de las semillas (R0-R4)
@@ -134,65 +283,71 @@ class Criatura:
         daily_volatility_factor = 0.5 + ((R0_volatilidad % 1000) / 999.0) # 0.5 a 1.5
         daily_homeostasis_boost = 0.8 + ((R2_boost_homeo % 1000) / 999.0) * 0.4 # 0.8 a 1.2
 
+        # Derivación determinista: fila del timestep en las tablas diarias de R1 y R3
+        # (fila[gene_idx] == simple_hash(f"{semilla}-{timestep_in_day}-{gene_idx}") % 10000 en MODO_HASH_TEXTO)
+        if timesteps_tramo is None:
+            timesteps_tramo = TIMESTEPS_POR_DIA_SIMULADO - timestep_in_day
+        pseudo_rands_pasiva = filas_pseudo_rand_dia(R1_semilla_pasiva, timestep_in_day, 1, timesteps_tramo)[0].tolist()
+        pseudo_rands_homeo_efec = filas_pseudo_rand_dia(R3_semilla_homeo_efec, timestep_in_day, 1, timesteps_tramo)[0].tolist()
+
         # 1. Ganancia de EP - Mejorada con factor de edad y volatilidad
         factor_edad = 1.0 + (self.edad_dias_completos * 0.1)  # Crece 10% adicional por cada día vivido
-        ep_ganancia_base = self.genes_ocultos["potencialEvolutivo"] * FACTOR_GANANCIA_EP_POR_TIMESTEP * 10.0  # x10
+        genes_visibles = self._genes_visibles
+        objetivos_homeostasis = self._homeostasis_targets
+        potencial_evolutivo = self._genes_ocultos[IDX_POTENCIAL_EVOLUTIVO]
+        ep_ganancia_base = potencial_evolutivo * FACTOR_GANANCIA_EP_POR_TIMESTEP * 10.0  # x10
         self.puntos_evolucion += ep_ganancia_base * factor_edad * daily_volatility_factor
         
         # 2. Evolución de Genes Visibles (Homeostasis y Pasiva)
-        for gene_idx, gen_nombre in enumerate(list(self.genes_visibles.keys())): # Usar list() si se modifica el dict
+        for gene_idx in range(len(genes_visibles)):
             # Derivación determinista para evolución pasiva
-            hash_input_pasiva = f"{R1_semilla_pasiva}-{timestep_in_day}-{gene_idx}"
-            pseudo_rand_pasiva = simple_hash(hash_input_pasiva) % 10000
+            pseudo_rand_pasiva = pseudo_rands_pasiva[gene_idx]
             factor_cambio_pasivo_norm = (pseudo_rand_pasiva / 9999.0) - 0.5 # -0.5 a 0.5
 
             # Derivación determinista para efectividad de homeostasis
-            hash_input_homeo_efec = f"{R3_semilla_homeo_efec}-{timestep_in_day}-{gene_idx}"
-            pseudo_rand_homeo_efec = simple_hash(hash_input_homeo_efec) % 10000
+            pseudo_rand_homeo_efec = pseudo_rands_homeo_efec[gene_idx]
             efectividad_timestep_homeo = 0.8 + (pseudo_rand_homeo_efec / 9999.0) * 0.4 # 0.8 a 1.2
 
-            if gen_nombre in self.homeostasis_targets:
+            target_valor = objetivos_homeostasis[gene_idx]
+            if target_valor == target_valor: # NaN = sin objetivo
                 # Homeostasis
-                actual_valor = self.genes_visibles[gen_nombre]
-                target_valor = self.homeostasis_targets[gen_nombre]
+                actual_valor = genes_visibles[gene_idx]
                 diferencia = target_valor - actual_valor
-                cambio_base = diferencia * TASA_APRENDIZAJE_HOMEOSTASIS_BASE * self.genes_ocultos["potencialEvolutivo"]
+                cambio_base = diferencia * TASA_APRENDIZAJE_HOMEOSTASIS_BASE * potencial_evolutivo
                 cambio_final = cambio_base * efectividad_timestep_homeo * daily_homeostasis_boost
-                self._aplicar_cambio_gen(gen_nombre, cambio_final)
+                self._aplicar_cambio_gen(gene_idx, cambio_final)
             else:
                 # Evolución Pasiva
-                cambio_pasivo = factor_cambio_pasivo_norm * TASA_EVOLUCION_PASIVA_GEN_BASE * self.genes_ocultos["potencialEvolutivo"] * daily_volatility_factor
-                self._aplicar_cambio_gen(gen_nombre, cambio_pasivo)
+                cambio_pasivo = factor_cambio_pasivo_norm * TASA_EVOLUCION_PASIVA_GEN_BASE * potencial_evolutivo * daily_volatility_factor
+                self._aplicar_cambio_gen(gene_idx, cambio_pasivo)
 
         # 3. Evolución Pasiva de Genes Ocultos (con influencias para combate)
         # Pre-calcular normalizaciones de genes visibles relevantes una vez para este timestep
         min_tb, max_tb = GENES_VISIBLES_DEFAULT["tamañoBase"]
-        norm_tamaño_base = (self.genes_visibles["tamañoBase"] - min_tb) / (max_tb - min_tb) if (max_tb - min_tb) != 0 else 0.5
+        norm_tamaño_base = (genes_visibles[IDX_TAMAÑO_BASE] - min_tb) / (max_tb - min_tb) if (max_tb - min_tb) != 0 else 0.5
         tend_tamaño_norm_factor = (norm_tamaño_base - 0.5) * 2 # Rango -1 a 1, centro 0
 
         min_na, max_na = GENES_VISIBLES_DEFAULT["numApendices"]
         # Normalización para numApendices (0 a 1)
-        norm_num_apendices = (self.genes_visibles["numApendices"] - min_na) / (max_na - min_na) if (max_na - min_na) != 0 else 0.5
+        norm_num_apendices = (genes_visibles[IDX_NUM_APENDICES] - min_na) / (max_na - min_na) if (max_na - min_na) != 0 else 0.5
         
-        forma_actual = self.genes_visibles["formaPrincipal"] # Entero
-        apendices_actuales = self.genes_visibles["numApendices"] # Entero
+        forma_actual = genes_visibles[IDX_FORMA_PRINCIPAL] # Entero
+        apendices_actuales = genes_visibles[IDX_NUM_APENDICES] # Entero
 
-        genes_ocultos_a_procesar = list(self.genes_ocultos.keys())
-        offset_idx_oculto = len(self.genes_visibles) # Para generar hashes diferentes a los visibles
+        offset_idx_oculto = len(genes_visibles) # Para generar hashes diferentes a los visibles
 
-        for gene_idx_oculto, gen_nombre_oculto in enumerate(genes_ocultos_a_procesar):
+        for gene_idx_oculto, gen_nombre_oculto in enumerate(NOMBRES_GENES_OCULTOS):
             # No evolucionar estos genes ocultos aquí si tienen su propia lógica o son estáticos post-nacimiento
-            if gen_nombre_oculto in ["tasaMetabolica", "fertilidad", "potencialEvolutivo", "max_lifespan_dias_base"]:
+            if gen_nombre_oculto in GENES_OCULTOS_ESTATICOS:
                 continue
 
-            hash_input_pasiva_oculto = f"{R1_semilla_pasiva}-{timestep_in_day}-{offset_idx_oculto + gene_idx_oculto}"
-            pseudo_rand_pasiva_oculto = simple_hash(hash_input_pasiva_oculto) % 10000
+            pseudo_rand_pasiva_oculto = pseudo_rands_pasiva[offset_idx_oculto + gene_idx_oculto]
             factor_cambio_pasivo_norm_oculto = (pseudo_rand_pasiva_oculto / 9999.0) - 0.5 
 
             # Cambio base aleatorio pasivo
             cambio_base_pasivo_oculto = (factor_cambio_pasivo_norm_oculto * 
                                   TASA_EVOLUCION_PASIVA_GEN_BASE * 
-                                  self.genes_ocultos["potencialEvolutivo"] * 
+                                  potencial_evolutivo * 
                                   daily_volatility_factor)
             
             modificador_influencia_especifico = 0.0 # Suma de todas las tendencias de influencia para este gen
@@ -243,13 +398,100 @@ class Criatura:
             cambio_total_oculto = cambio_base_pasivo_oculto
             # Aplicar influencia solo a genes de combate
             if gen_nombre_oculto in ["puntosSaludMax", "ataqueBase", "defensaBase", "agilidadCombate"]:
-                cambio_influencia = modificador_influencia_especifico * FACTOR_INFLUENCIA_VISUAL_SOBRE_COMBATE * self.genes_ocultos["potencialEvolutivo"] * daily_volatility_factor
+                cambio_influencia = modificador_influencia_especifico * FACTOR_INFLUENCIA_VISUAL_SOBRE_COMBATE * potencial_evolutivo * daily_volatility_factor
                 cambio_total_oculto += cambio_influencia
 
-            self._aplicar_cambio_gen_oculto(gen_nombre_oculto, cambio_total_oculto)
+            self._aplicar_cambio_gen_oculto(gene_idx_oculto, cambio_total_oculto)
         
         self.edad_timesteps_evolutivos_total += 1
 
+    def _acumular_cambios_gen(self, genes: array, gene_idx: int, cambios: np.ndarray, min_val, max_val, es_entero: bool) -> np.ndarray:
+        """Aplica una secuencia de cambios a un gen (como _aplicar_cambio_gen repetido) y devuelve su valor tras cada uno."""
+        valor = genes[gene_idx]
+        if es_entero:
+            # Un gen entero dentro de rango con cambios pequeños vuelve siempre a su valor al redondear
+            if float(round(valor)) == valor and min_val <= valor <= max_val and np.all(np.abs(cambios) < 0.25):
+                return np.full(len(cambios), float(valor))
+        else:
+            # Sin clamp efectivo la evolución es una suma acumulada (cumsum suma en el mismo orden que el bucle)
+            trayectoria = np.cumsum(np.concatenate(([valor], cambios)))[1:]
+            if trayectoria.min() >= min_val and trayectoria.max() <= max_val:
+                genes[gene_idx] = float(trayectoria[-1])
+                return trayectoria
+
+        trayectoria = []
+        for cambio in cambios.tolist():
+            valor += cambio
+            if es_entero:
+                valor = float(round(valor))
+            valor = clamp(valor, min_val, max_val)
+            trayectoria.append(valor)
+        genes[gene_idx] = valor
+        return np.array(trayectoria, dtype=np.float64)
+
+    def _evolucion_tramo(self, ts_inicio: int, n_timesteps: int):
+        """Equivale a llamar _evolucion_un_timestep para ts_inicio .. ts_inicio+n_timesteps-1 dentro de un mismo día,
+        calculando los hashes del tramo y los cambios de genes como arrays."""
+        if not self.esta_viva: return
+
+        R0_volatilidad, R1_semilla_pasiva, R2_boost_homeo, R3_semilla_homeo_efec, _ = self.current_daily_random_seeds
+        daily_volatility_factor = 0.5 + ((R0_volatilidad % 1000) / 999.0)
+        daily_homeostasis_boost = 0.8 + ((R2_boost_homeo % 1000) / 999.0) * 0.4
+        genes_visibles = self._genes_visibles
+        objetivos_homeostasis = self._homeostasis_targets
+        potencial = self._genes_ocultos[IDX_POTENCIAL_EVOLUTIVO]
+        hay_objetivos = any(objetivo == objetivo for objetivo in objetivos_homeostasis)
+        pseudo_rand_pasiva = filas_pseudo_rand_dia(R1_semilla_pasiva, ts_inicio, n_timesteps).astype(np.float64)
+        pseudo_rand_homeo_efec = filas_pseudo_rand_dia(R3_semilla_homeo_efec, ts_inicio, n_timesteps).astype(np.float64) if hay_objetivos else None
+
+        # 1. Ganancia de EP: el incremento es constante durante el día
+        factor_edad = 1.0 + (self.edad_dias_completos * 0.1)
+        ep_ganancia_base = potencial * FACTOR_GANANCIA_EP_POR_TIMESTEP * 10.0
+        incrementos = np.full(n_timesteps + 1, ep_ganancia_base * factor_edad * daily_volatility_factor)
+        incrementos[0] = self.puntos_evolucion
+        self.puntos_evolucion = float(np.cumsum(incrementos)[-1])
+
+        # 2. Genes visibles: trayectoria completa del tramo (los genes ocultos dependen de ella)
+        trayectorias: List[np.ndarray] = []
+        for gene_idx, (min_val, max_val, es_entero) in enumerate(LIMITES_GENES_VISIBLES):
+            target_valor = objetivos_homeostasis[gene_idx]
+            if target_valor == target_valor:
+                # La homeostasis depende del valor anterior: se recorre en escalar con la efectividad ya calculada
+                efectividades = 0.8 + (pseudo_rand_homeo_efec[:, gene_idx] / 9999.0) * 0.4
+                trayectoria = []
+                for efectividad_timestep_homeo in efectividades.tolist():
+                    diferencia = target_valor - genes_visibles[gene_idx]
+                    cambio_base = diferencia * TASA_APRENDIZAJE_HOMEOSTASIS_BASE * potencial
+                    self._aplicar_cambio_gen(gene_idx, cambio_base * efectividad_timestep_homeo * daily_homeostasis_boost)
+                    trayectoria.append(genes_visibles[gene_idx])
+                trayectorias.append(np.array(trayectoria, dtype=np.float64))
+            else:
+                factor_cambio_pasivo_norm = (pseudo_rand_pasiva[:, gene_idx] / 9999.0) - 0.5
+                cambios = factor_cambio_pasivo_norm * TASA_EVOLUCION_PASIVA_GEN_BASE * potencial * daily_volatility_factor
+                trayectorias.append(self._acumular_cambios_gen(genes_visibles, gene_idx, cambios, min_val, max_val, es_entero))
+
+        # 3. Genes ocultos, usando los genes visibles de cada timestep
+        min_tb, max_tb = GENES_VISIBLES_DEFAULT["tamañoBase"]
+        norm_tamaño_base = (trayectorias[IDX_TAMAÑO_BASE] - min_tb) / (max_tb - min_tb) if (max_tb - min_tb) != 0 else np.full(n_timesteps, 0.5)
+        tend_tamaño_norm_factor = (norm_tamaño_base - 0.5) * 2
+        min_na, max_na = GENES_VISIBLES_DEFAULT["numApendices"]
+        apendices_actuales = trayectorias[IDX_NUM_APENDICES]
+        norm_num_apendices = (apendices_actuales - min_na) / (max_na - min_na) if (max_na - min_na) != 0 else np.full(n_timesteps, 0.5)
+        forma_actual = trayectorias[IDX_FORMA_PRINCIPAL]
+
+        offset_idx_oculto = len(genes_visibles)
+        for gene_idx_oculto, gen_nombre_oculto in enumerate(NOMBRES_GENES_OCULTOS):
+            if gen_nombre_oculto in GENES_OCULTOS_ESTATICOS:
+                continue
+            factor_cambio_pasivo_norm_oculto = (pseudo_rand_pasiva[:, offset_idx_oculto + gene_idx_oculto] / 9999.0) - 0.5
+            cambios = factor_cambio_pasivo_norm_oculto * TASA_EVOLUCION_PASIVA_GEN_BASE * potencial * daily_volatility_factor
+            modificador = modificador_influencia_combate(gen_nombre_oculto, forma_actual, tend_tamaño_norm_factor, norm_num_apendices, apendices_actuales)
+            if modificador is not None:
+                cambios = cambios + modificador * FACTOR_INFLUENCIA_VISUAL_SOBRE_COMBATE * potencial * daily_volatility_factor
+            self._acumular_cambios_gen(self._genes_ocultos, gene_idx_oculto, cambios, *LIMITES_GENES_OCULTOS[gene_idx_oculto])
+
+        self.edad_timesteps_evolutivos_total += n_timesteps
+
     def _procesar_fin_dia_eventos(self, current_timestamp:float):
         """Se llama cuando se completa un día simulado."""
         # R4 es para evento diario menor o modificador de EP
@@ -268,7 +510,9 @@ class Criatura:
         self.edad_dias_completos += 1
         if self.edad_dias_completos >= self.lifespan_total_dias:
             self.esta_viva = False
-            print(f"    ¡EVENTO! {self.nombre} ha muerto de vejez a los {self.edad_dias_completos:.1f} días simulados (Vida max: {self.lifespan_total_dias:.1f}d).")
+            if bus_eventos.oyentes:
+                bus_eventos.emitir(EVENTO_MUERTE, id=self.id, nombre=self.nombre, edad_dias=self.edad_dias_completos,
+                                   lifespan_dias=self.lifespan_total_dias)
         return self.esta_viva
 
     def actualizar_estado_hasta(self, target_timestamp: float, ambiente_id_usuario: str) -> bool:
@@ -276,6 +520,9 @@ class Criatura:
         if not self.esta_viva or target_timestamp <= self.last_evolution_processed_timestamp:
             return self.esta_viva
 
+        if CATCH_UP_POR_DIAS_COMPLETOS:
+            return self._actualizar_por_ticks(target_timestamp)
+
         # print(f"    {self.nombre}: Actualizando de {self.last_evolution_processed_timestamp:.2f}s a {target_timestamp:.2f}s")
         
         current_processing_time = self.last_evolution_processed_timestamp
@@ -300,7 +547,9 @@ class Criatura:
 
             # Evolucionar un timestep
             timestep_in_current_day = (self.edad_timesteps_evolutivos_total % TIMESTEPS_POR_DIA_SIMULADO)
-            self._evolucion_un_timestep(timestep_in_current_day)
+            timesteps_tramo = min(TIMESTEPS_POR_DIA_SIMULADO - timestep_in_current_day,
+                                  math.ceil((target_timestamp - current_processing_time) / timestep_duration))
+            self._evolucion_un_timestep(timestep_in_current_day, timesteps_tramo)
             
             current_processing_time += timestep_duration
             # Pequeño ajuste para evitar problemas de flotantes acumulados si procesamos muchos timesteps
@@ -310,21 +559,95 @@ class Criatura:
         self.last_evolution_processed_timestamp = min(current_processing_time, target_timestamp)
         return self.esta_viva
 
+    def _actualizar_por_ticks(self, target_timestamp: float) -> bool:
+        """Catch-up sobre un reloj entero: el tick k ocurre en birth_timestamp + k * timestep_duration
+        y el día d empieza en el tick d * TIMESTEPS_POR_DIA_SIMULADO. Cada tramo entre límites de día
+        (días completos y los parciales de los extremos) se evoluciona de una vez con _evolucion_tramo.
+
+        Equivale al bucle timestep a timestep mientras cada llamada empiece sobre la rejilla de ticks. Tras un
+        target fuera de ella, el bucle guarda target como último instante procesado y vuelve a evolucionar el
+        timestep parcial en la llamada siguiente; el reloj entero no (ver _tick_objetivo)."""
+        timestep_duration = DIA_EN_SEGUNDOS_SIMULADOS / TIMESTEPS_POR_DIA_SIMULADO
+        tick_objetivo = self._tick_objetivo(target_timestamp, timestep_duration)
+
+        while self.esta_viva and self.edad_timesteps_evolutivos_total < tick_objetivo:
+            tick_actual = self.edad_timesteps_evolutivos_total
+            tick_inicio_dia_siguiente = (int(self.edad_dias_completos) + 1) * TIMESTEPS_POR_DIA_SIMULADO
+            if tick_actual >= tick_inicio_dia_siguiente:
+                if not self._cerrar_dia(self.birth_timestamp + tick_actual * timestep_duration):
+                    break
+                continue
+
+            timestep_in_current_day = tick_actual % TIMESTEPS_POR_DIA_SIMULADO
+            n_timesteps = min(tick_objetivo, tick_inicio_dia_siguiente) - tick_actual
+            n_timesteps = min(n_timesteps, TIMESTEPS_POR_DIA_SIMULADO - timestep_in_current_day)
+            if n_timesteps >= MIN_TIMESTEPS_TRAMO_EN_LOTE:
+                self._evolucion_tramo(timestep_in_current_day, n_timesteps)
+            else:
+                for i in range(n_timesteps):
+                    self._evolucion_un_timestep(timestep_in_current_day + i, n_timesteps - i)
+
+        tiempo_procesado = self.birth_timestamp + self.edad_timesteps_evolutivos_total * timestep_duration
+        self.last_evolution_processed_timestamp = min(tiempo_procesado, target_timestamp)
+        return self.esta_viva
+
+    def _tick_objetivo(self, target_timestamp: float, timestep_duration: float) -> int:
+        """Primer tick cuyo instante, redondeado a 4 decimales como en el bucle timestep a timestep, no es
+        menor que target_timestamp: el mismo número de pasos que da ese bucle (p.ej. 4 hasta 0.6000000000000001
+        con timesteps de 0.2, no 3)."""
+        tick = math.ceil(round((target_timestamp - self.birth_timestamp) / timestep_duration, 6))
+        while round(self.birth_timestamp + tick * timestep_duration, 4) < target_timestamp:
+            tick += 1
+        while tick > 0 and round(self.birth_timestamp + (tick - 1) * timestep_duration, 4) >= target_timestamp:
+            tick -= 1
+        return tick
+
+    def _cerrar_dia(self, current_timestamp: float) -> bool:
+        """Paso a un nuevo día de semillas: semillas nuevas, evento R4 y envejecimiento. Devuelve True si sigue viva."""
+        self.last_seed_generation_timestamp += DIA_EN_SEGUNDOS_SIMULADOS
+        self.current_daily_random_seeds = self._generate_new_daily_seeds()
+        self._procesar_fin_dia_eventos(current_timestamp)
+        return self.envejecer_y_verificar_muerte()
+
+    def saltar_a_dia(self, dia: int) -> bool:
+        """Lleva la criatura al comienzo del día `dia` (edad == dia, semillas de ese día ya generadas) con el
+        catch-up por ticks. Requiere SEMILLAS_DIARIAS_POR_CONTADOR: el resultado no depende de `random` ni del
+        orden respecto a otras criaturas. Para volver a un día pasado, saltar desde una instantánea (clonar)
+        anterior; ver estado_en_dia. Devuelve True si sigue viva."""
+        if not SEMILLAS_DIARIAS_POR_CONTADOR:
+            raise ValueError("saltar_a_dia requiere SEMILLAS_DIARIAS_POR_CONTADOR = True")
+        if dia < self.edad_dias_completos:
+            raise ValueError(f"{self.nombre} ya está en el día {self.edad_dias_completos:.0f}; salte desde una instantánea anterior")
+        timestep_duration = DIA_EN_SEGUNDOS_SIMULADOS / TIMESTEPS_POR_DIA_SIMULADO
+        t_inicio_dia = self.birth_timestamp + dia * TIMESTEPS_POR_DIA_SIMULADO * timestep_duration
+        if self.esta_viva and self.edad_timesteps_evolutivos_total < dia * TIMESTEPS_POR_DIA_SIMULADO:
+            self._actualizar_por_ticks(t_inicio_dia)
+        if self.esta_viva and self.edad_dias_completos < dia:
+            self._cerrar_dia(t_inicio_dia)
+        return self.esta_viva
+
     def set_homeostasis_target(self, gen_nombre: str, valor: float, current_sim_time: float, costo_ep: float = 5.0) -> bool:
         self.actualizar_estado_hasta(current_sim_time, "internal_call") # Asegurar estado actualizado
         
         if self.puntos_evolucion < costo_ep:
-            print(f"    {self.nombre} (a {current_sim_time:.2f}s): No hay suficientes EP ({self.puntos_evolucion:.2f}) para establecer objetivo homeostasis '{gen_nombre}' (costo: {costo_ep:.2f}).")
+            if bus_eventos.oyentes:
+                bus_eventos.emitir(EVENTO_HOMEOSTASIS, resultado=HOMEOSTASIS_EP_INSUFICIENTES, id=self.id, nombre=self.nombre,
+                                   t=current_sim_time, gen=gen_nombre, ep=self.puntos_evolucion, costo_ep=costo_ep)
             return False
 
         if gen_nombre in GENES_VISIBLES_DEFAULT:
             min_val, max_val = GENES_VISIBLES_DEFAULT[gen_nombre]
-            self.homeostasis_targets[gen_nombre] = clamp(valor, min_val, max_val)
+            self._homeostasis_targets[INDICE_GEN_VISIBLE[gen_nombre]] = clamp(valor, min_val, max_val)
             self.puntos_evolucion -= costo_ep # Restar EP
-            print(f"    {self.nombre} (a {current_sim_time:.2f}s): Objetivo homeostasis para '{gen_nombre}' en {self.homeostasis_targets[gen_nombre]:.2f}. Costo: {costo_ep:.2f} EP. EP restantes: {self.puntos_evolucion:.2f}.")
+            if bus_eventos.oyentes:
+                bus_eventos.emitir(EVENTO_HOMEOSTASIS, resultado=HOMEOSTASIS_APLICADA, id=self.id, nombre=self.nombre,
+                                   t=current_sim_time, gen=gen_nombre, valor=self.homeostasis_targets[gen_nombre],
+                                   ep=self.puntos_evolucion, costo_ep=costo_ep)
             return True
         else:
-            print(f"    ADVERTENCIA: Gen '{gen_nombre}' no es visible para homeostasis.")
+            if bus_eventos.oyentes:
+                bus_eventos.emitir(EVENTO_HOMEOSTASIS, resultado=HOMEOSTASIS_GEN_NO_VISIBLE, id=self.id, nombre=self.nombre,
+                                   t=current_sim_time, gen=gen_nombre)
             return False
 
     def display_estado(self, current_sim_time: float):
@@ -344,21 +667,81 @@ class Criatura:
         for gen, valor in self.genes_ocultos.items(): print(f"    {gen:<20} (O): {valor:.4f}")
         print("------------------------------------")
 
+def es_elegible_para_reproduccion(c: Criatura, dias_check: Dict[str, int]) -> bool:
+    return c.esta_viva and c.edad_dias_completos >= 1.0 and \
+           c._genes_ocultos[IDX_FERTILIDAD] > 0.3 and \
+           c.edad_dias_completos > dias_check.get(c.id, -1.0)
+
+
+class IndiceReproduccion:
+    """Candidatas a reproducción de un Ambiente, mantenidas de forma incremental.
+
+    Una criatura entra como candidata al añadirse o al completar un día (las únicas formas de volverse
+    elegible, porque la fertilidad no evoluciona) y sale al emparejarse, morir o retirarse. Las candidatas
+    se revalidan al usarlas, así que una que ya no esté en el ambiente simplemente se descarta.
+    `posicion` guarda el orden de inserción en Ambiente.criaturas para devolver las elegibles en el mismo
+    orden que el recorrido completo (y que random.shuffle dé los mismos emparejamientos).
+    """
+    __slots__ = ("posicion", "candidatas", "_siguiente_posicion")
+
+    def __init__(self, criaturas: Dict[str, Criatura], dias_check: Dict[str, int]):
+        self.posicion: Dict[str, int] = {c_id: i for i, c_id in enumerate(criaturas)}
+        self._siguiente_posicion = len(self.posicion)
+        self.candidatas = {c_id for c_id, c in criaturas.items() if es_elegible_para_reproduccion(c, dias_check)}
+
+    def añadida(self, criatura: Criatura, dias_check: Dict[str, int]):
+        self.posicion[criatura.id] = self._siguiente_posicion
+        self._siguiente_posicion += 1
+        self.considerar(criatura, dias_check)
+
+    def considerar(self, criatura: Criatura, dias_check: Dict[str, int]):
+        if es_elegible_para_reproduccion(criatura, dias_check):
+            self.candidatas.add(criatura.id)
+
+    def retirada(self, c_id: str):
+        self.posicion.pop(c_id, None)
+        self.candidatas.discard(c_id)
+
+    def elegibles(self, criaturas: Dict[str, Criatura], dias_check: Dict[str, int]) -> List[Criatura]:
+        """Candidatas aún elegibles, en orden de inserción; las demás salen del índice."""
+        elegibles = []
+        for c_id in list(self.candidatas):
+            c = criaturas.get(c_id)
+            if c is not None and es_elegible_para_reproduccion(c, dias_check):
+                elegibles.append(c)
+            else:
+                self.candidatas.discard(c_id)
+                if c is None:
+                    self.posicion.pop(c_id, None)
+        elegibles.sort(key=lambda c: self.posicion[c.id])
+        return elegibles
+
+
 class Ambiente:
     def __init__(self, id_usuario: str, current_sim_time: float):
         self.id_usuario = id_usuario
         self.criaturas: Dict[str, Criatura] = {}
         self.max_criaturas = MAX_CRIATURAS_POR_AMBIENTE
-        self.dias_completados_para_reproduccion_check: Dict[str, float] = {} # criatura_id -> ultimo_dia_reproduccion_considerado
-        print(f"Ambiente creado para {self.id_usuario} a t={current_sim_time:.2f}s")
+        self.dias_completados_para_reproduccion_check: Dict[str, int] = {} # criatura_id -> ultimo_dia_reproduccion_considerado
+        self.reproduccion_indexada = REPRODUCCION_INDEXADA
+        self._indice_reproduccion: Optional[IndiceReproduccion] = None # Se construye en la primera pasada
+        self._indice_nombres: Optional[Dict[str, List[str]]] = None # nombre -> ids en orden de inserción; ídem
+        if bus_eventos.oyentes:
+            bus_eventos.emitir(EVENTO_AMBIENTE_CREADO, id_usuario=self.id_usuario, t=current_sim_time)
 
     def add_criatura(self, criatura: Criatura):
         if len(self.criaturas) < self.max_criaturas:
             self.criaturas[criatura.id] = criatura
-            print(f"  {criatura.nombre} añadida al ambiente de {self.id_usuario}.")
+            if bus_eventos.oyentes:
+                bus_eventos.emitir(EVENTO_CRIATURA_AÑADIDA, id_usuario=self.id_usuario, id=criatura.id, nombre=criatura.nombre)
             self.dias_completados_para_reproduccion_check[criatura.id] = 0 # Iniciar para chequeo de reproducción
+            if self._indice_reproduccion is not None:
+                self._indice_reproduccion.añadida(criatura, self.dias_completados_para_reproduccion_check)
+            if self._indice_nombres is not None:
+                self._indice_nombres.setdefault(criatura.nombre, []).append(criatura.id)
             return True
-        print(f"  Ambiente lleno. No se pudo añadir a {criatura.nombre}.")
+        if bus_eventos.oyentes:
+            bus_eventos.emitir(EVENTO_AMBIENTE_LLENO, id_usuario=self.id_usuario, id=criatura.id, nombre=criatura.nombre)
         return False
 
     def get_criaturas_vivas(self) -> List[Criatura]:
@@ -370,16 +753,60 @@ class Ambiente:
         self.add_criatura(nueva_criatura)
         return nueva_criatura
 
+    def notificar_dia_completado(self, criatura: Criatura):
+        """Para quien avance criaturas por su cuenta (sin actualizar_todas_las_criaturas): puede haberse vuelto elegible."""
+        if self._indice_reproduccion is not None:
+            self._indice_reproduccion.considerar(criatura, self.dias_completados_para_reproduccion_check)
+
+    def invalidar_indices(self):
+        """Tras modificar criaturas, edades o checks directamente: los índices se reconstruyen en el próximo uso."""
+        self._indice_reproduccion = None
+        self._indice_nombres = None
+
+    def buscar_criatura(self, nombre: Optional[str] = None, id_criatura: Optional[str] = None) -> Optional[Criatura]:
+        """Primera criatura viva (en orden de llegada al ambiente) con ese id o, si no se da, con ese nombre."""
+        if id_criatura is not None:
+            criatura = self.criaturas.get(id_criatura)
+            return criatura if criatura is not None and criatura.esta_viva else None
+        if self._indice_nombres is None:
+            self._indice_nombres = {}
+            for c_id, c in self.criaturas.items():
+                self._indice_nombres.setdefault(c.nombre, []).append(c_id)
+        ids = self._indice_nombres.get(nombre)
+        if not ids:
+            return None
+        encontrada = None
+        vigentes = []
+        for c_id in ids:
+            criatura = self.criaturas.get(c_id)
+            if criatura is None:
+                continue # Retirada del ambiente: sale del índice
+            vigentes.append(c_id)
+            if encontrada is None and criatura.esta_viva:
+                encontrada = criatura
+                if len(vigentes) == 1:
+                    return encontrada # Caso habitual: la primera sigue ahí y viva, sin reconstruir la lista
+        if vigentes:
+            self._indice_nombres[nombre] = vigentes
+        else:
+            del self._indice_nombres[nombre]
+        return encontrada
+
     def intentar_reproduccion_ambiente(self, current_sim_time: float):
         # Este método ahora es más complejo porque la reproducción depende de que las criaturas
         # hayan completado un nuevo día SIMULADO, lo cual se sabe después de actualizar su estado.
         
-        criaturas_elegibles_hoy = []
-        for c_id, c in self.criaturas.items():
-            if c.esta_viva and c.edad_dias_completos >= 1.0 and \
-               c.genes_ocultos["fertilidad"] > 0.3 and \
-               c.edad_dias_completos > self.dias_completados_para_reproduccion_check.get(c_id, -1.0):
-                criaturas_elegibles_hoy.append(c)
+        if self.reproduccion_indexada:
+            if self._indice_reproduccion is None:
+                self._indice_reproduccion = IndiceReproduccion(self.criaturas, self.dias_completados_para_reproduccion_check)
+            criaturas_elegibles_hoy = self._indice_reproduccion.elegibles(self.criaturas, self.dias_completados_para_reproduccion_check)
+        else:
+            criaturas_elegibles_hoy = []
+            for c_id, c in self.criaturas.items():
+                if c.esta_viva and c.edad_dias_completos >= 1.0 and \
+                   c.genes_ocultos["fertilidad"] > 0.3 and \
+                   c.edad_dias_completos > self.dias_completados_para_reproduccion_check.get(c_id, -1.0):
+                    criaturas_elegibles_hoy.append(c)
         
         if len(criaturas_elegibles_hoy) < 2:
             return
@@ -391,13 +818,18 @@ class Ambiente:
             padre2 = criaturas_elegibles_hoy[i+1]
 
             # Actualizar el día en que se consideró para reproducción
-            self.dias_completados_para_reproduccion_check[padre1.id] = padre1.edad_dias_completos
-            self.dias_completados_para_reproduccion_check[padre2.id] = padre2.edad_dias_completos
+            self.dias_completados_para_reproduccion_check[padre1.id] = int(padre1.edad_dias_completos)
+            self.dias_completados_para_reproduccion_check[padre2.id] = int(padre2.edad_dias_completos)
+            if self._indice_reproduccion is not None:
+                self._indice_reproduccion.candidatas.difference_update((padre1.id, padre2.id))
 
             if random.random() < PROBABILIDAD_REPRODUCCION_DIARIA_POR_PAREJA:
                 prob_exito = (padre1.genes_ocultos["fertilidad"] + padre2.genes_ocultos["fertilidad"]) / 2
                 if random.random() < prob_exito:
-                    print(f"    ¡REPRODUCCIÓN en {self.id_usuario} a t={current_sim_time:.2f}s! {padre1.nombre} y {padre2.nombre} tuvieron cría.")
+                    if bus_eventos.oyentes:
+                        bus_eventos.emitir(EVENTO_REPRODUCCION, id_usuario=self.id_usuario, t=current_sim_time,
+                                           id_padre1=padre1.id, nombre_padre1=padre1.nombre,
+                                           id_padre2=padre2.id, nombre_padre2=padre2.nombre)
                     self._crear_descendencia(padre1, padre2, current_sim_time)
                     if len(self.criaturas) >= self.max_criaturas: break # Detener si el ambiente se llenó
 
@@ -417,21 +849,128 @@ class Ambiente:
     def actualizar_todas_las_criaturas(self, current_sim_time: float):
         # print(f"  Ambiente {self.id_usuario}: Actualizando todas las criaturas a t={current_sim_time:.2f}s...")
         ids_criaturas_a_remover = []
+        indice = self._indice_reproduccion
         for c_id, criatura in list(self.criaturas.items()): # list() para poder remover durante iteración
+            edad_antes = criatura.edad_dias_completos
             if not criatura.actualizar_estado_hasta(current_sim_time, self.id_usuario):
                 if not criatura.esta_viva: # Si murió en esta actualización
                     ids_criaturas_a_remover.append(c_id)
+            elif indice is not None and criatura.edad_dias_completos != edad_antes:
+                indice.considerar(criatura, self.dias_completados_para_reproduccion_check)
         
         for c_id in ids_criaturas_a_remover:
-            print(f"    Removiendo a {self.criaturas[c_id].nombre} (muerta) del ambiente {self.id_usuario}.")
+            if bus_eventos.oyentes:
+                bus_eventos.emitir(EVENTO_CRIATURA_REMOVIDA, id_usuario=self.id_usuario, id=c_id, nombre=self.criaturas[c_id].nombre)
             del self.criaturas[c_id]
             if c_id in self.dias_completados_para_reproduccion_check:
                  del self.dias_completados_para_reproduccion_check[c_id]
+            if indice is not None:
+                indice.retirada(c_id)
+
+
+# Prompt programado: (t, secuencia, gen, valor, nombre_criatura, id_criatura, costo_ep, reintentos)
+PromptHomeostasis = Tuple[float, int, str, float, Optional[str], Optional[str], float, int]
+
+
+class ColaPromptsHomeostasis:
+    """Prompts de homeostasis programados de un Ambiente, en un heap por (instante, orden de llegada).
+
+    Cada llamada a procesar_hasta(t) solo mira los prompts vencidos. Si la criatura aún no existe o no tiene
+    EP suficientes, el prompt se reintenta en la siguiente llamada (o tras intervalo_reintento), hasta
+    max_reintentos veces (None = sin límite, como los eventos de run_simulation). Los de genes no visibles
+    se descartan: nunca podrían aplicarse.
+    """
+
+    def __init__(self, ambiente: Ambiente, max_reintentos: Optional[int] = None, intervalo_reintento: float = 0.0):
+        self.ambiente = ambiente
+        self.max_reintentos = max_reintentos
+        self.intervalo_reintento = intervalo_reintento
+        self._heap: List[PromptHomeostasis] = []
+        self._secuencia = itertools.count()
+        self.aplicados = 0
+        self.reintentos = 0
+        self.descartados = 0
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def programar(self, t: float, nombre_criatura: Optional[str], gen_nombre: str, valor: float, costo_ep: float = 5.0,
+                  id_criatura: Optional[str] = None) -> int:
+        """Encola un prompt para la criatura con ese id o, si no se da, la primera viva con ese nombre. Devuelve su secuencia."""
+        secuencia = next(self._secuencia)
+        heapq.heappush(self._heap, (t, secuencia, gen_nombre, valor, nombre_criatura, id_criatura, costo_ep, 0))
+        return secuencia
+
+    def programar_varios(self, prompts: Iterable[Tuple]) -> int:
+        """Encola en bloque tuplas (t, nombre_criatura, gen, valor[, costo_ep]), el formato de eventos_programados. Devuelve cuántos."""
+        nuevos = []
+        for prompt in prompts:
+            t, nombre_criatura, gen_nombre, valor = prompt[:4]
+            costo_ep = prompt[4] if len(prompt) > 4 else 5.0
+            nuevos.append((t, next(self._secuencia), gen_nombre, valor, nombre_criatura, None, costo_ep, 0))
+        if len(nuevos) > len(self._heap): # Más barato reconstruir el heap entero (O(n)) que n inserciones
+            self._heap.extend(nuevos)
+            heapq.heapify(self._heap)
+        else:
+            for prompt in nuevos:
+                heapq.heappush(self._heap, prompt)
+        return len(nuevos)
+
+    def proximo(self) -> Optional[float]:
+        return self._heap[0][0] if self._heap else None
+
+    def procesar_hasta(self, current_sim_time: float) -> int:
+        """Intenta aplicar, en orden, todos los prompts con t <= current_sim_time. Devuelve cuántos se aplicaron."""
+        aplicados = 0
+        pendientes = []
+        while self._heap and self._heap[0][0] <= current_sim_time:
+            prompt = heapq.heappop(self._heap)
+            t, secuencia, gen_nombre, valor, nombre_criatura, id_criatura, costo_ep, reintentos = prompt
+            if gen_nombre not in INDICE_GEN_VISIBLE:
+                # set_homeostasis_target avisa (evento HOMEOSTASIS_GEN_NO_VISIBLE) y devuelve False
+                criatura = self.ambiente.buscar_criatura(nombre_criatura, id_criatura)
+                if criatura is not None:
+                    criatura.set_homeostasis_target(gen_nombre, valor, current_sim_time, costo_ep)
+                self.descartados += 1
+                continue
+            criatura = self.ambiente.buscar_criatura(nombre_criatura, id_criatura)
+            if criatura is not None and criatura.set_homeostasis_target(gen_nombre, valor, current_sim_time, costo_ep):
+                aplicados += 1
+                continue
+            if self.max_reintentos is not None and reintentos >= self.max_reintentos:
+                self.descartados += 1
+                continue
+            # Sin intervalo se conserva la clave original: el reintento mantiene su orden respecto a los demás
+            t_reintento = t if self.intervalo_reintento <= 0 else current_sim_time + self.intervalo_reintento
+            pendientes.append((t_reintento, secuencia, gen_nombre, valor, nombre_criatura, id_criatura, costo_ep, reintentos + 1))
+        for prompt in pendientes: # Después del bucle: un reintento nunca se procesa dos veces en la misma llamada
+            heapq.heappush(self._heap, prompt)
+        self.aplicados += aplicados
+        self.reintentos += len(pendientes)
+        return aplicados
+
+
+def estado_en_dia(instantanea: Criatura, dia: int) -> Criatura:
+    """Estado de una criatura al comienzo del día `dia`, calculado desde una instantánea sin modificarla
+    (p.ej. la tomada al nacer o tras su último cambio de homeostasis). Requiere SEMILLAS_DIARIAS_POR_CONTADOR."""
+    criatura = instantanea.clonar()
+    criatura.saltar_a_dia(dia)
+    return criatura
 
 
 # --- Simulación Principal ---
-def run_simulation(id_usuario: str, duracion_total_sim_seg: float, intervalo_actualizacion_seg: float, generate_graph: bool = True):
-    random.seed(42)
+def _informar_grafico(futuro) -> None:
+    """Callback del render en segundo plano: informa de la ruta guardada o del error (p.ej. sin matplotlib)."""
+    if futuro.exception() is None:
+        print(f"\n✨ Gráfico guardado como '{futuro.result()}' ✨")
+    else:
+        print(f"Error al generar el gráfico: {futuro.exception()!r}")
+
+
+def run_simulation(id_usuario: str, duracion_total_sim_seg: float, intervalo_actualizacion_seg: float, generate_graph: bool = True,
+                   renderizador=None, semilla: int = 42, observador=None):
+    """observador(ambiente, t), si se da, se llama al empezar (t=0) y tras cada intervalo con el ambiente ya actualizado."""
+    random.seed(semilla)
     current_sim_time = 0.0
 
     ambiente_usuario = Ambiente(id_usuario, current_sim_time)
@@ -451,16 +990,21 @@ def run_simulation(id_usuario: str, duracion_total_sim_seg: float, intervalo_act
         (DIA_EN_SEGUNDOS_SIMULADOS * 1.5, "Sparky", "numApendices", 5.0),
         (DIA_EN_SEGUNDOS_SIMULADOS * 2.2, "Zapper", "colorG", 0.2),
     ]
-    eventos_aplicados = [False] * len(eventos_programados)
+    prompts = ColaPromptsHomeostasis(ambiente_usuario)
+    prompts.programar_varios(eventos_programados)
 
-    # Para gráfico de evolución
+    # Para gráfico de evolución: EP de todas las criaturas vivas en cada tick, por id
     if generate_graph:
-        tiempos_grafico = []
-        ep_por_criatura = {nombre: [] for nombre in nombres_iniciales}
+        from simulation_registro import RegistroSeriesTemporales
+        registro_ep = RegistroSeriesTemporales(campos=["puntos_evolucion"])
+        ids_iniciales = {c.nombre: c_id for c_id, c in ambiente_usuario.criaturas.items()}
+    if observador is not None:
+        observador(ambiente_usuario, current_sim_time)
         
     while current_sim_time < duracion_total_sim_seg:
         next_update_time = min(current_sim_time + intervalo_actualizacion_seg, duracion_total_sim_seg)
-        print(f"\n--- Avanzando tiempo de simulación a: {next_update_time:.2f}s (Intervalo: {intervalo_actualizacion_seg:.2f}s) ---")
+        if bus_eventos.oyentes:
+            bus_eventos.emitir(EVENTO_TICK, id_usuario=id_usuario, t=next_update_time, intervalo=intervalo_actualizacion_seg)
 
         # Actualizar todas las criaturas en el ambiente
         ambiente_usuario.actualizar_todas_las_criaturas(next_update_time)
@@ -468,28 +1012,14 @@ def run_simulation(id_usuario: str, duracion_total_sim_seg: float, intervalo_act
         # Intentar reproducción (ahora que las criaturas están actualizadas)
         ambiente_usuario.intentar_reproduccion_ambiente(next_update_time)
 
-        # Aplicar eventos programados (ej. prompts de homeostasis)
-        for i, (t_evento, nombre_c, gen_e, val_e) in enumerate(eventos_programados):
-            if not eventos_aplicados[i] and next_update_time >= t_evento:
-                criatura_obj = next((c for c_id, c in ambiente_usuario.criaturas.items() if c.nombre == nombre_c and c.esta_viva), None)
-                if criatura_obj:
-                    # Ahora set_homeostasis_target devuelve True/False indicando éxito
-                    if criatura_obj.set_homeostasis_target(gen_e, val_e, next_update_time): # Costo por defecto de 5.0 EP se usará
-                        eventos_aplicados[i] = True
+        # Aplicar eventos programados (ej. prompts de homeostasis); los que no se pueden aplicar se reintentan
+        prompts.procesar_hasta(next_update_time)
         
         # Recopilar datos para gráfico
         if generate_graph:
-            tiempos_grafico.append(next_update_time / DIA_EN_SEGUNDOS_SIMULADOS)  # Convertir a días
-            for nombre in nombres_iniciales:
-                criatura = next((c for c_id, c in ambiente_usuario.criaturas.items() if c.nombre == nombre and c.esta_viva), None)
-                if criatura:
-                    ep_por_criatura[nombre].append(criatura.puntos_evolucion)
-                else:
-                    # Si la criatura ya no existe o está muerta
-                    if ep_por_criatura[nombre]:  # Si hay datos previos
-                        ep_por_criatura[nombre].append(None)  # Marcar como None para discontinuidad
-                    else:
-                        ep_por_criatura[nombre].append(0)  # Si nunca hubo datos
+            registro_ep.registrar(next_update_time / DIA_EN_SEGUNDOS_SIMULADOS, ambiente_usuario.get_criaturas_vivas())  # Tiempo en días
+        if observador is not None:
+            observador(ambiente_usuario, next_update_time)
         
         current_sim_time = next_update_time
 
@@ -504,62 +1034,14 @@ def run_simulation(id_usuario: str, duracion_total_sim_seg: float, intervalo_act
     else:
         print("Ninguna criatura en el ambiente al final.")
     
-    # Generar y guardar gráfico
+    # Generar y guardar gráfico: se renderiza en un proceso aparte (simulation_graficos), sin bloquear
     if generate_graph:
-        plt.figure(figsize=(12, 7))
-        plt.style.use('dark_background')  # Fondo oscuro para un aspecto más místico
-        
-        # Colores y estilos para cada criatura
-        colores = {
-            "Sparky": "#FF5733",  # Rojo-naranja
-            "Blobby": "#33FF57",  # Verde
-            "Zapper": "#3357FF",  # Azul
-            "Wisp": "#B433FF",    # Púrpura
-            "Glimmer": "#FFD733"  # Amarillo-dorado
-        }
-        
-        for nombre, eps in ep_por_criatura.items():
-            # Filtrar los valores None para no dibujar líneas discontinuas
-            x_vals = []
-            y_vals = []
-            
-            for i, ep in enumerate(eps):
-                if ep is not None:
-                    x_vals.append(tiempos_grafico[i])
-                    y_vals.append(ep)
-                elif x_vals:  # Si hay puntos anteriores, dibujar lo que tenemos y reiniciar
-                    plt.plot(x_vals, y_vals, '-', color=colores[nombre], linewidth=2.5, label=nombre if i == 0 else "")
-                    x_vals = []
-                    y_vals = []
-            
-            # Dibujar los puntos restantes
-            if x_vals:
-                plt.plot(x_vals, y_vals, '-', color=colores[nombre], linewidth=2.5, label=nombre)
-                
-        # Añadir elementos místicos al gráfico
-        plt.title("ElementalStrikers: Evolution Points Over Time", fontsize=18, fontweight='bold')
-        plt.xlabel("Time (Simulated Days)", fontsize=14)
-        plt.ylabel("Evolution Energy (EP)", fontsize=14)
-        plt.grid(True, linestyle='--', alpha=0.3)
-        
-        # Añadir eventos de homeostasis como puntos destacados
-        for t_evento, nombre_c, gen_e, val_e in eventos_programados:
-            t_dias = t_evento / DIA_EN_SEGUNDOS_SIMULADOS
-            plt.axvline(x=t_dias, color='white', linestyle='--', alpha=0.3)
-            plt.text(t_dias, plt.ylim()[1]*0.9, f"{nombre_c}'s Transformation", 
-                     rotation=90, ha='right', va='top', alpha=0.7, fontsize=8)
-        
-        plt.legend(loc='upper left', frameon=True, framealpha=0.7)
-        
-        # Añadir marca de agua / mensaje promocional
-        plt.figtext(0.5, 0.02, 
-                   "#MayTheFlowBeWithYou - ElementalStrikers evolving on @flow_blockchain",
-                   ha="center", fontsize=10, alpha=0.7)
-        
-        # Guardar y mostrar
-        plt.tight_layout()
-        plt.savefig("elemental_strikers_evolution.png", dpi=300, bbox_inches='tight')
-        print("\n✨ Gráfico guardado como 'elemental_strikers_evolution.png' ✨")
+        from simulation_graficos import datos_grafico_ep, renderizador_por_defecto
+        series_ep = registro_ep.series("puntos_evolucion")
+        datos = datos_grafico_ep({nombre: series_ep.get(c_id, ((), ())) for nombre, c_id in ids_iniciales.items()},
+                                 [(t_evento / DIA_EN_SEGUNDOS_SIMULADOS, nombre_c) for t_evento, nombre_c, _, _ in eventos_programados])
+        futuro_grafico = (renderizador or renderizador_por_defecto()).enviar(datos)
+        futuro_grafico.add_done_callback(_informar_grafico)
         
         # Mensaje promocional para redes sociales
         promo_message = """
@@ -575,8 +1057,6 @@ Full reveal coming soon... #MayTheFlowBeWithYou @flow_blockchain
         print("\n=== MENSAJE PROMOCIONAL PARA REDES SOCIALES ===")
         print(promo_message)
         print("===============================================")
-        
-        plt.show()
     
     return ambiente_usuario
 
@@ -0,0 +1,202 @@
+"""Benchmarks de simulation.py con curvas de escalado y salida JSON comparable entre commits.
+
+Mide, sin gráficos ni mensajes (bus de eventos silenciado):
+- timesteps_por_segundo: timesteps de criatura por segundo (ruta escalar y motor vectorizado).
+- catch_up: latencia de poner al día una criatura inactiva varios días (timestep a timestep y por ticks).
+- reproduccion: coste de una pasada de intentar_reproduccion_ambiente con N criaturas elegibles.
+- run_simulation: tiempo de extremo a extremo de run_simulation(generate_graph=False).
+- combate: emparejamientos por segundo de un torneo todos contra todos (simulation_combate).
+
+Cada medida se repite con las combinaciones de población, TIMESTEPS_POR_DIA_SIMULADO y
+DIA_EN_SEGUNDOS_SIMULADOS pedidas (incluido el día real de 24 h).
+
+Uso:
+    python simulation_benchmark.py --salida bench.json
+    python simulation_benchmark.py --rapido --salida nuevo.json --comparar bench.json
+"""
+import argparse
+import json
+import platform
+import random
+import subprocess
+import time
+from typing import Callable, Dict, List, Sequence
+
+import numpy as np
+
+import simulation as sim
+from simulation_config import configuracion_simulacion, sin_salida
+from simulation_vectorized import PoblacionVectorizada
+
+DIA_REAL_SEGUNDOS = 24 * 60 * 60.0
+POBLACIONES_DEFAULT = (10, 100, 1000)
+TIMESTEPS_POR_DIA_DEFAULT = (100, 300, 1000)
+DIAS_EN_SEGUNDOS_DEFAULT = (60.0, DIA_REAL_SEGUNDOS)
+DIAS_CATCH_UP_DEFAULT = (1, 7, 30)
+COMBATIENTES_DEFAULT = (100, 1000)
+REPETICIONES_DEFAULT = 3
+
+
+def _mejor_tiempo(funcion: Callable[[], None], preparar: Callable[[], object], repeticiones: int) -> float:
+    """Mínimo de `repeticiones` ejecuciones; preparar() se llama antes de cada una y no se cronometra."""
+    tiempos = []
+    for _ in range(repeticiones):
+        estado = preparar()
+        inicio = time.perf_counter()
+        funcion(estado)
+        tiempos.append(time.perf_counter() - inicio)
+    return min(tiempos)
+
+
+def _crear_criaturas(n: int, semilla: int = 1234) -> List[sim.Criatura]:
+    random.seed(semilla)
+    criaturas = [sim.Criatura(f"B{i}", birth_timestamp=0.0) for i in range(n)]
+    for c in criaturas[::3]: # Un tercio con homeostasis, como en una partida real
+        c.puntos_evolucion += 10.0
+        c.set_homeostasis_target("tamañoBase", 2.0, 0.0)
+    return criaturas
+
+
+def bench_timesteps(n_criaturas: int, timesteps: int, repeticiones: int) -> Dict:
+    dt = sim.DIA_EN_SEGUNDOS_SIMULADOS / sim.TIMESTEPS_POR_DIA_SIMULADO
+    target = timesteps * dt
+
+    def escalar(criaturas):
+        for c in criaturas:
+            c.actualizar_estado_hasta(target, "bench")
+
+    def vectorizado(criaturas):
+        PoblacionVectorizada(criaturas).avanzar_hasta(target)
+
+    resultado = {}
+    for nombre, funcion in (("escalar", escalar), ("vectorizado", vectorizado)):
+        segundos = _mejor_tiempo(funcion, lambda: _crear_criaturas(n_criaturas), repeticiones)
+        resultado[nombre] = {"segundos": segundos, "timesteps_por_segundo": n_criaturas * timesteps / segundos}
+    return resultado
+
+
+def bench_catch_up(dias: int, repeticiones: int) -> Dict:
+    target = dias * sim.DIA_EN_SEGUNDOS_SIMULADOS
+
+    def ponerse_al_dia(criaturas):
+        for c in criaturas:
+            c.lifespan_total_dias = dias + 1.0 # Que no muera antes de terminar
+            c.actualizar_estado_hasta(target, "bench")
+
+    resultado = {}
+    for nombre, por_ticks in (("timestep_a_timestep", False), ("por_ticks", True)):
+        with configuracion_simulacion(CATCH_UP_POR_DIAS_COMPLETOS=por_ticks):
+            segundos = _mejor_tiempo(ponerse_al_dia, lambda: _crear_criaturas(1), repeticiones)
+        resultado[nombre] = {"segundos": segundos, "timesteps_por_segundo": dias * sim.TIMESTEPS_POR_DIA_SIMULADO / segundos}
+    return resultado
+
+
+def bench_reproduccion(n_criaturas: int, repeticiones: int) -> Dict:
+    def preparar():
+        ambiente = sim.Ambiente("bench", 0.0)
+        ambiente.max_criaturas = 2 * n_criaturas # Deja sitio para las crías
+        for c in _crear_criaturas(n_criaturas):
+            c.edad_dias_completos = 2.0
+            c._genes_ocultos[sim.INDICE_GEN_OCULTO["fertilidad"]] = 0.8
+            ambiente.add_criatura(c)
+        return ambiente
+
+    segundos = _mejor_tiempo(lambda ambiente: ambiente.intentar_reproduccion_ambiente(0.0), preparar, repeticiones)
+    return {"segundos": segundos, "criaturas_por_segundo": n_criaturas / segundos}
+
+
+def bench_run_simulation(dias: float, repeticiones: int) -> Dict:
+    dia = sim.DIA_EN_SEGUNDOS_SIMULADOS
+    segundos = _mejor_tiempo(lambda _: sim.run_simulation("bench", dia * dias, dia / 4, generate_graph=False),
+                             lambda: None, repeticiones)
+    return {"segundos": segundos, "dias_simulados": dias}
+
+
+def bench_combate(n_criaturas: int, repeticiones: int) -> Dict:
+    from simulation_combate import Combatientes, torneo_todos_contra_todos
+    combatientes = Combatientes.desde_criaturas(_crear_criaturas(n_criaturas))
+    segundos = _mejor_tiempo(lambda _: torneo_todos_contra_todos(combatientes, semilla=7), lambda: None, repeticiones)
+    emparejamientos = n_criaturas * (n_criaturas - 1) // 2
+    return {"segundos": segundos, "emparejamientos": emparejamientos, "emparejamientos_por_segundo": emparejamientos / segundos}
+
+
+def ejecutar_benchmarks(poblaciones: Sequence[int] = POBLACIONES_DEFAULT,
+                        timesteps_por_dia: Sequence[int] = TIMESTEPS_POR_DIA_DEFAULT,
+                        dias_en_segundos: Sequence[float] = DIAS_EN_SEGUNDOS_DEFAULT,
+                        dias_catch_up: Sequence[int] = DIAS_CATCH_UP_DEFAULT,
+                        repeticiones: int = REPETICIONES_DEFAULT,
+                        combatientes: Sequence[int] = COMBATIENTES_DEFAULT) -> List[Dict]:
+    """Ejecuta todas las medidas sobre el barrido de configuraciones. Cada resultado lleva su clave de configuración."""
+    resultados = []
+    with sin_salida(): # El combate no depende de la configuración del reloj: se mide una vez
+        for n in combatientes:
+            resultados.append({"benchmark": "combate", "criaturas": n, **bench_combate(n, repeticiones)})
+    for timesteps in timesteps_por_dia:
+        for dia in dias_en_segundos:
+            config = {"timesteps_por_dia": timesteps, "dia_en_segundos": dia}
+            with configuracion_simulacion(TIMESTEPS_POR_DIA_SIMULADO=timesteps, DIA_EN_SEGUNDOS_SIMULADOS=dia), sin_salida():
+                for n in poblaciones:
+                    resultados.append({"benchmark": "timesteps_por_segundo", **config, "criaturas": n,
+                                       **bench_timesteps(n, timesteps, repeticiones)})
+                    resultados.append({"benchmark": "reproduccion", **config, "criaturas": n,
+                                       **bench_reproduccion(n, repeticiones)})
+                for dias in dias_catch_up:
+                    resultados.append({"benchmark": "catch_up", **config, "dias": dias, **bench_catch_up(dias, repeticiones)})
+                resultados.append({"benchmark": "run_simulation", **config, **bench_run_simulation(3.5, repeticiones)})
+    return resultados
+
+
+def _commit_actual() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "desconocido"
+
+
+def _clave(resultado: Dict) -> tuple:
+    return tuple((k, v) for k, v in sorted(resultado.items())
+                 if not isinstance(v, dict) and k != "segundos" and not k.endswith("_por_segundo"))
+
+
+def comparar(actual: Dict, referencia: Dict) -> List[str]:
+    """Líneas 'benchmark config: ratio' (segundos de referencia / actuales; > 1 es más rápido ahora)."""
+    por_clave = {_clave(r): r for r in referencia["resultados"]}
+    lineas = []
+    for r in actual["resultados"]:
+        base = por_clave.get(_clave(r))
+        if base is None:
+            continue
+        config = " ".join(f"{k}={v}" for k, v in _clave(r) if k != "benchmark")
+        variantes = [k for k, v in r.items() if isinstance(v, dict)] or [None]
+        for variante in variantes:
+            nuevo = r[variante]["segundos"] if variante else r["segundos"]
+            viejo = base[variante]["segundos"] if variante else base["segundos"]
+            nombre = f"{r['benchmark']}/{variante}" if variante else r["benchmark"]
+            lineas.append(f"{nombre:<36} {config:<60} x{viejo / nuevo:.2f}")
+    return lineas
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--salida", default="simulation_benchmark.json")
+    parser.add_argument("--rapido", action="store_true", help="Barrido reducido (poblaciones 10 y 100, 300 timesteps/día)")
+    parser.add_argument("--repeticiones", type=int, default=REPETICIONES_DEFAULT)
+    parser.add_argument("--comparar", help="JSON de una ejecución anterior con el que comparar")
+    args = parser.parse_args()
+
+    if args.rapido:
+        resultados = ejecutar_benchmarks((10, 100), (300,), DIAS_EN_SEGUNDOS_DEFAULT, (1, 7), args.repeticiones, (100, 500))
+    else:
+        resultados = ejecutar_benchmarks(repeticiones=args.repeticiones)
+    informe = {"commit": _commit_actual(), "fecha": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": platform.python_version(),
+               "numpy": np.__version__, "plataforma": platform.platform(), "resultados": resultados}
+    with open(args.salida, "w") as archivo:
+        json.dump(informe, archivo, indent=2)
+    print(f"{len(resultados)} resultados guardados en {args.salida}")
+    if args.comparar:
+        with open(args.comparar) as archivo:
+            print("\n".join(comparar(informe, json.load(archivo))))
+
+
+if __name__ == "__main__":
+    main()
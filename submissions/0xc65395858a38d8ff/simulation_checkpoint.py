@@ -0,0 +1,222 @@
+"""Checkpoint binario de Ambientes y Criaturas (guardar y continuar una simulación exactamente igual).
+
+Formato de archivo (versionado, little-endian):
+    MAGIA (8 bytes) | versión u32 | longitud de cabecera u32 | cabecera JSON | arrays alineados a 64 bytes
+
+La cabecera describe cada array (dtype, forma, offset), así que al abrir el archivo todos se
+mapean en memoria con np.memmap sin copiarlos: abrir un checkpoint de 100k ambientes es inmediato
+y solo se materializan los objetos que se piden. Los textos (ids, nombres) van en un blob UTF-8
+con offsets. El estado de `random` (global y, opcionalmente, uno por ambiente como en el runner)
+se guarda completo, así que lo restaurado continúa bit a bit igual.
+"""
+import json
+import math
+import random
+from array import array
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+import simulation as sim
+from simulation import Ambiente, Criatura, NOMBRES_GENES_OCULTOS, NOMBRES_GENES_VISIBLES
+
+MAGIA_CHECKPOINT = b"ESCKPT\x00\x00"
+VERSION_CHECKPOINT = 1
+ALINEACION_CHECKPOINT = 64
+
+DTYPE_CRIATURA = np.dtype([
+    ("birth_timestamp", "<f8"),
+    ("last_evolution_processed_timestamp", "<f8"),
+    ("last_seed_generation_timestamp", "<f8"),
+    ("edad_dias_completos", "<f8"),
+    ("edad_timesteps_evolutivos_total", "<i8"),
+    ("puntos_evolucion", "<f8"),
+    ("lifespan_total_dias", "<f8"),
+    ("dia_check_reproduccion", "<i8"), # -1 = sin entrada en dias_completados_para_reproduccion_check (NaN en checkpoints <f8 anteriores)
+    ("esta_viva", "?"),
+    ("semillas", "<u8", (5,)),
+    ("genes_visibles", "<f8", (len(NOMBRES_GENES_VISIBLES),)),
+    ("genes_ocultos", "<f8", (len(NOMBRES_GENES_OCULTOS),)),
+    ("homeostasis_targets", "<f8", (len(NOMBRES_GENES_VISIBLES),)), # NaN = sin objetivo
+])
+DTYPE_AMBIENTE = np.dtype([("primera_criatura", "<i8"), ("n_criaturas", "<i4"), ("max_criaturas", "<i4")])
+LONGITUD_ESTADO_MT = 625 # Estado interno del Mersenne Twister de random (624 palabras + posición)
+
+EstadoRng = tuple
+
+
+def _empaquetar_textos(textos: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+    codificados = [t.encode("utf-8") for t in textos]
+    offsets = np.zeros(len(codificados) + 1, dtype="<i8")
+    np.cumsum([len(c) for c in codificados], out=offsets[1:])
+    return np.frombuffer(b"".join(codificados), dtype=np.uint8), offsets
+
+
+def _desempaquetar_textos(blob: np.ndarray, offsets: np.ndarray, inicio: int = 0, fin: Optional[int] = None) -> List[str]:
+    fin = len(offsets) - 1 if fin is None else fin
+    posiciones = offsets[inicio:fin + 1].tolist()
+    datos = blob[posiciones[0]:posiciones[-1]].tobytes()
+    base = posiciones[0]
+    return [datos[a - base:b - base].decode("utf-8") for a, b in zip(posiciones, posiciones[1:])]
+
+
+def _empaquetar_estados_rng(estados: Sequence[EstadoRng]) -> Tuple[np.ndarray, np.ndarray]:
+    palabras = np.array([estado[1] for estado in estados], dtype="<u4").reshape(len(estados), LONGITUD_ESTADO_MT)
+    gauss = np.array([math.nan if estado[2] is None else estado[2] for estado in estados], dtype="<f8")
+    return palabras, gauss
+
+
+def _estado_rng(palabras: np.ndarray, gauss: float) -> EstadoRng:
+    return (3, tuple(palabras.tolist()), None if math.isnan(gauss) else float(gauss))
+
+
+def guardar_checkpoint(ruta: str, ambientes: Sequence[Ambiente], estados_rng: Optional[Dict[str, EstadoRng]] = None):
+    """Guarda los ambientes, el estado global de random y, si se dan, los estados de random por ambiente."""
+    criaturas = [c for ambiente in ambientes for c in ambiente.criaturas.values()]
+    filas_amb = np.zeros(len(ambientes), dtype=DTYPE_AMBIENTE)
+    filas = np.zeros(len(criaturas), dtype=DTYPE_CRIATURA)
+    inicio = 0
+    for a, ambiente in enumerate(ambientes):
+        filas_amb[a] = (inicio, len(ambiente.criaturas), ambiente.max_criaturas)
+        checks = ambiente.dias_completados_para_reproduccion_check
+        for c_id, c in ambiente.criaturas.items():
+            filas[inicio] = (c.birth_timestamp, c.last_evolution_processed_timestamp, c.last_seed_generation_timestamp,
+                             c.edad_dias_completos, c.edad_timesteps_evolutivos_total, c.puntos_evolucion,
+                             c.lifespan_total_dias, checks.get(c_id, -1), c.esta_viva, c.current_daily_random_seeds,
+                             c._genes_visibles, c._genes_ocultos, c._homeostasis_targets)
+            inicio += 1
+
+    arrays: Dict[str, np.ndarray] = {"ambientes": filas_amb, "criaturas": filas}
+    arrays["id_usuario_blob"], arrays["id_usuario_offsets"] = _empaquetar_textos([a.id_usuario for a in ambientes])
+    arrays["id_criatura_blob"], arrays["id_criatura_offsets"] = _empaquetar_textos([c.id for c in criaturas])
+    arrays["nombre_blob"], arrays["nombre_offsets"] = _empaquetar_textos([c.nombre for c in criaturas])
+    arrays["rng_global"], arrays["rng_global_gauss"] = _empaquetar_estados_rng([random.getstate()])
+    if estados_rng is not None:
+        arrays["rng_ambientes"], arrays["rng_ambientes_gauss"] = _empaquetar_estados_rng([estados_rng[a.id_usuario] for a in ambientes])
+
+    cabecera = {"compatibilidad": _compatibilidad(), "arrays": {}}
+    offset = 0
+    for nombre, datos in arrays.items():
+        cabecera["arrays"][nombre] = {"dtype": datos.dtype.descr if datos.dtype.names else datos.dtype.str,
+                                      "forma": list(datos.shape), "offset": offset}
+        offset += -(-datos.nbytes // ALINEACION_CHECKPOINT) * ALINEACION_CHECKPOINT
+    cabecera_bytes = json.dumps(cabecera).encode("utf-8")
+    inicio_datos = -(-(len(MAGIA_CHECKPOINT) + 8 + len(cabecera_bytes)) // ALINEACION_CHECKPOINT) * ALINEACION_CHECKPOINT
+
+    with open(ruta, "wb") as archivo:
+        archivo.write(MAGIA_CHECKPOINT)
+        archivo.write(np.array([VERSION_CHECKPOINT, len(cabecera_bytes)], dtype="<u4").tobytes())
+        archivo.write(cabecera_bytes)
+        for nombre, datos in arrays.items():
+            archivo.seek(inicio_datos + cabecera["arrays"][nombre]["offset"])
+            archivo.write(np.ascontiguousarray(datos).tobytes())
+        archivo.truncate(inicio_datos + offset)
+
+
+def _compatibilidad() -> Dict:
+    """Constantes de las que depende la continuación exacta; deben coincidir al restaurar."""
+    return {"genes_visibles": NOMBRES_GENES_VISIBLES, "genes_ocultos": NOMBRES_GENES_OCULTOS,
+            "timesteps_por_dia": sim.TIMESTEPS_POR_DIA_SIMULADO, "dia_en_segundos": sim.DIA_EN_SEGUNDOS_SIMULADOS,
+            "modo_hash_genes": sim.MODO_HASH_GENES}
+
+
+class CheckpointMapeado:
+    """Checkpoint abierto con todos sus arrays mapeados en memoria; los ambientes se materializan bajo demanda."""
+
+    def __init__(self, ruta: str):
+        with open(ruta, "rb") as archivo:
+            if archivo.read(len(MAGIA_CHECKPOINT)) != MAGIA_CHECKPOINT:
+                raise ValueError(f"{ruta} no es un checkpoint de simulación")
+            self.version, longitud_cabecera = np.frombuffer(archivo.read(8), dtype="<u4").tolist()
+            if self.version > VERSION_CHECKPOINT:
+                raise ValueError(f"Versión de checkpoint {self.version} no soportada (máxima {VERSION_CHECKPOINT})")
+            cabecera = json.loads(archivo.read(longitud_cabecera).decode("utf-8"))
+        if cabecera["compatibilidad"] != json.loads(json.dumps(_compatibilidad())):
+            raise ValueError(f"Checkpoint generado con otra configuración de simulación: {cabecera['compatibilidad']}")
+        inicio_datos = -(-(len(MAGIA_CHECKPOINT) + 8 + longitud_cabecera) // ALINEACION_CHECKPOINT) * ALINEACION_CHECKPOINT
+
+        self.arrays: Dict[str, np.ndarray] = {}
+        for nombre, info in cabecera["arrays"].items():
+            dtype = np.dtype([tuple(campo) for campo in info["dtype"]] if isinstance(info["dtype"], list) else info["dtype"])
+            forma = tuple(info["forma"])
+            if int(np.prod(forma)) == 0:
+                self.arrays[nombre] = np.zeros(forma, dtype=dtype)
+            else:
+                self.arrays[nombre] = np.memmap(ruta, dtype=dtype, mode="r", offset=inicio_datos + info["offset"], shape=forma)
+        self.ids_usuario = _desempaquetar_textos(self.arrays["id_usuario_blob"], self.arrays["id_usuario_offsets"])
+        self._indice_por_usuario = {id_usuario: i for i, id_usuario in enumerate(self.ids_usuario)}
+
+    def __len__(self) -> int:
+        return len(self.ids_usuario)
+
+    @property
+    def estado_rng_global(self) -> EstadoRng:
+        return _estado_rng(self.arrays["rng_global"][0], float(self.arrays["rng_global_gauss"][0]))
+
+    def estado_rng_ambiente(self, id_usuario: str) -> Optional[EstadoRng]:
+        if "rng_ambientes" not in self.arrays:
+            return None
+        i = self._indice_por_usuario[id_usuario]
+        return _estado_rng(self.arrays["rng_ambientes"][i], float(self.arrays["rng_ambientes_gauss"][i]))
+
+    def _construir_ambientes(self, inicio: int, fin: int) -> List[Ambiente]:
+        """Materializa los ambientes [inicio, fin) convirtiendo cada columna del bloque de criaturas una sola vez."""
+        filas_amb = np.asarray(self.arrays["ambientes"][inicio:fin])
+        if not len(filas_amb):
+            return []
+        primera = int(filas_amb["primera_criatura"][0])
+        ultima = int(filas_amb["primera_criatura"][-1] + filas_amb["n_criaturas"][-1])
+        filas = np.asarray(self.arrays["criaturas"][primera:ultima])
+        ids = _desempaquetar_textos(self.arrays["id_criatura_blob"], self.arrays["id_criatura_offsets"], primera, ultima)
+        nombres = _desempaquetar_textos(self.arrays["nombre_blob"], self.arrays["nombre_offsets"], primera, ultima)
+        escalares = list(zip(ids, nombres, filas["birth_timestamp"].tolist(), filas["last_evolution_processed_timestamp"].tolist(),
+                             filas["last_seed_generation_timestamp"].tolist(), filas["edad_dias_completos"].tolist(),
+                             filas["edad_timesteps_evolutivos_total"].tolist(), filas["puntos_evolucion"].tolist(),
+                             filas["lifespan_total_dias"].tolist(), filas["dia_check_reproduccion"].tolist(), filas["esta_viva"].tolist()))
+        # Bytes de cada vector, troceados por fila (tamaño fijo) para crear los array() sin pasar por floats de Python
+        vectores = [(campo, np.ascontiguousarray(filas[campo]).tobytes(), filas.dtype[campo].itemsize, codigo)
+                    for campo, codigo in (("semillas", 'Q'), ("genes_visibles", 'd'), ("genes_ocultos", 'd'), ("homeostasis_targets", 'd'))]
+
+        ambientes = []
+        for i, (primera_amb, n, max_criaturas) in enumerate(filas_amb.tolist()):
+            ambiente = Ambiente.__new__(Ambiente) # Sin __init__: no se emiten eventos de creación
+            ambiente.id_usuario = self.ids_usuario[inicio + i]
+            ambiente.max_criaturas = max_criaturas
+            ambiente.criaturas = {}
+            ambiente.dias_completados_para_reproduccion_check = {}
+            ambiente.reproduccion_indexada = sim.REPRODUCCION_INDEXADA
+            ambiente._indice_reproduccion = None
+            ambiente._indice_nombres = None
+            for j in range(primera_amb - primera, primera_amb - primera + n):
+                c = Criatura.__new__(Criatura)
+                (c.id, c.nombre, c.birth_timestamp, c.last_evolution_processed_timestamp, c.last_seed_generation_timestamp,
+                 c.edad_dias_completos, c.edad_timesteps_evolutivos_total, c.puntos_evolucion, c.lifespan_total_dias,
+                 dia_check, c.esta_viva) = escalares[j]
+                (c._semillas_diarias, c._genes_visibles, c._genes_ocultos, c._homeostasis_targets) = (
+                    array(codigo, datos[j * tam:(j + 1) * tam]) for _, datos, tam, codigo in vectores)
+                ambiente.criaturas[c.id] = c
+                if dia_check == dia_check and dia_check >= 0: # -1 (o NaN) = sin entrada
+                    ambiente.dias_completados_para_reproduccion_check[c.id] = int(dia_check)
+            ambientes.append(ambiente)
+        return ambientes
+
+    def ambiente(self, id_usuario: str) -> Ambiente:
+        """Materializa un solo ambiente (p.ej. para traer de vuelta el mundo de un jugador)."""
+        i = self._indice_por_usuario[id_usuario]
+        return self._construir_ambientes(i, i + 1)[0]
+
+    def iterar_ambientes(self, tam_bloque: int = 4096) -> Iterator[Ambiente]:
+        for inicio in range(0, len(self.ids_usuario), tam_bloque):
+            yield from self._construir_ambientes(inicio, min(inicio + tam_bloque, len(self.ids_usuario)))
+
+
+def cargar_checkpoint(ruta: str, restaurar_rng_global: bool = True) -> Tuple[List[Ambiente], Optional[Dict[str, EstadoRng]]]:
+    """Restaura todos los ambientes. Devuelve (ambientes, estados de random por ambiente o None si no se guardaron)."""
+    checkpoint = CheckpointMapeado(ruta)
+    ambientes = list(checkpoint.iterar_ambientes())
+    estados_rng = None
+    if "rng_ambientes" in checkpoint.arrays:
+        estados_rng = {a.id_usuario: checkpoint.estado_rng_ambiente(a.id_usuario) for a in ambientes}
+    if restaurar_rng_global:
+        random.setstate(checkpoint.estado_rng_global)
+    return ambientes, estados_rng
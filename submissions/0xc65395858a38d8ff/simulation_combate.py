@@ -0,0 +1,187 @@
+"""Motor de combate vectorizado sobre los genes de combate (puntosSaludMax, ataqueBase, defensaBase, agilidadCombate).
+
+Un combate son rondas de golpes alternos: ataca primero el más ágil (a igualdad, el primero del
+emparejamiento) y el segundo solo responde si sigue en pie. Cada golpe acierta con probabilidad
+0.75 + 0.15 * (agilidad propia - agilidad rival), acotada a [0.25, 0.95], y hace
+ataque * ataque / (ataque + defensa rival) * U(0.85, 1.15) de daño (mínimo 1). Si nadie cae en
+MAX_RONDAS_COMBATE rondas gana quien conserve más fracción de salud (igual fracción: empate).
+
+Los números aleatorios salen de un generador basado en contador (splitmix64 de la semilla, los ids
+de ambas criaturas, la ronda y el golpe): un combate da siempre el mismo resultado, se resuelva solo
+o dentro de un lote de millones, y en cualquier orden. Todas las rondas se evalúan en arrays sobre los
+emparejamientos que siguen activos.
+
+Uso:
+    combatientes = Combatientes.desde_criaturas(ambiente.get_criaturas_vivas())
+    tabla = torneo_todos_contra_todos(combatientes, semilla=7)
+    campeon, rondas = torneo_eliminatorio(combatientes, semilla=7)
+"""
+from typing import List, Sequence, Tuple
+
+import numpy as np
+
+from simulation import Criatura, INDICE_GEN_OCULTO
+from simulation_hashing import fnv1a_64_estandar, splitmix64_vectorizado
+
+MAX_RONDAS_COMBATE = 50
+GOLPES_POR_RONDA = 2 # Cada golpe consume dos uniformes: acierto y variación de daño
+TAM_LOTE_COMBATES = 1 << 18 # Emparejamientos resueltos a la vez en los torneos
+
+GANA_A = 0
+GANA_B = 1
+EMPATE = 2
+
+_GENES_COMBATE = ("puntosSaludMax", "ataqueBase", "defensaBase", "agilidadCombate")
+
+
+class Combatientes:
+    """Columnas de combate de una población (una fila por criatura) y la clave de hash de cada id."""
+
+    def __init__(self, ids: Sequence[str], salud: np.ndarray, ataque: np.ndarray, defensa: np.ndarray, agilidad: np.ndarray):
+        self.ids = list(ids)
+        self.salud = np.asarray(salud, dtype=np.float64)
+        self.ataque = np.asarray(ataque, dtype=np.float64)
+        self.defensa = np.asarray(defensa, dtype=np.float64)
+        self.agilidad = np.asarray(agilidad, dtype=np.float64)
+        self.claves = np.array([fnv1a_64_estandar(id_c) for id_c in self.ids], dtype=np.uint64)
+
+    @classmethod
+    def desde_criaturas(cls, criaturas: Sequence[Criatura]) -> "Combatientes":
+        columnas = [[c._genes_ocultos[INDICE_GEN_OCULTO[gen]] for c in criaturas] for gen in _GENES_COMBATE]
+        return cls([c.id for c in criaturas], *columnas)
+
+    @classmethod
+    def desde_poblacion(cls, poblacion) -> "Combatientes":
+        """Desde un PoblacionVectorizada, leyendo directamente sus columnas de genes ocultos."""
+        columnas = [poblacion.genes_ocultos[INDICE_GEN_OCULTO[gen]] for gen in _GENES_COMBATE]
+        return cls([c.id for c in poblacion.criaturas], *columnas)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+
+def _uniformes(claves: np.ndarray, contador: int) -> np.ndarray:
+    """U[0, 1) de 53 bits, una por clave, para la posición `contador` del flujo de cada combate."""
+    return (splitmix64_vectorizado(claves + np.uint64(contador)) >> np.uint64(11)).astype(np.float64) * (1.0 / (1 << 53))
+
+
+def resolver_combates(combatientes: Combatientes, idx_a: np.ndarray, idx_b: np.ndarray, semilla: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    """Resuelve los combates idx_a[k] contra idx_b[k]. Devuelve (resultado: GANA_A/GANA_B/EMPATE, rondas)."""
+    idx_a = np.asarray(idx_a, dtype=np.int64)
+    idx_b = np.asarray(idx_b, dtype=np.int64)
+    n = idx_a.size
+    semilla_mezclada = splitmix64_vectorizado(np.array([semilla & 0xffffffffffffffff], dtype=np.uint64))[0]
+    claves = splitmix64_vectorizado(splitmix64_vectorizado(combatientes.claves[idx_a] ^ semilla_mezclada) + combatientes.claves[idx_b])
+
+    # Columna 0 = quien golpea primero en cada ronda
+    invertido = combatientes.agilidad[idx_b] > combatientes.agilidad[idx_a]
+    primero = np.where(invertido, idx_b, idx_a)
+    segundo = np.where(invertido, idx_a, idx_b)
+    salud_max = np.stack((combatientes.salud[primero], combatientes.salud[segundo]))
+    salud = salud_max.copy()
+    diferencia_agilidad = combatientes.agilidad[primero] - combatientes.agilidad[segundo]
+    acierto = np.clip(0.75 + 0.15 * np.stack((diferencia_agilidad, -diferencia_agilidad)), 0.25, 0.95)
+    ataque = np.stack((combatientes.ataque[primero], combatientes.ataque[segundo]))
+    defensa_rival = np.stack((combatientes.defensa[segundo], combatientes.defensa[primero]))
+    daño_base = ataque * ataque / (ataque + defensa_rival)
+
+    rondas = np.full(n, MAX_RONDAS_COMBATE, dtype=np.int16)
+    activos = np.arange(n)
+    for ronda in range(MAX_RONDAS_COMBATE):
+        if activos.size == 0:
+            break
+        claves_activas = claves[activos]
+        base = ronda * 2 * GOLPES_POR_RONDA
+        for golpeador in (0, 1):
+            rival = 1 - golpeador
+            acierta = _uniformes(claves_activas, base + 2 * golpeador) < acierto[golpeador, activos]
+            if golpeador == 1:
+                acierta &= salud[1, activos] > 0 # El segundo solo responde si sigue en pie
+            variacion = 0.85 + 0.3 * _uniformes(claves_activas, base + 2 * golpeador + 1)
+            daño = np.maximum(1.0, daño_base[golpeador, activos] * variacion)
+            salud[rival, activos] -= np.where(acierta, daño, 0.0)
+        terminados = (salud[0, activos] <= 0) | (salud[1, activos] <= 0)
+        rondas[activos[terminados]] = ronda + 1
+        activos = activos[~terminados]
+
+    fraccion = salud / salud_max
+    resultado = np.where(fraccion[0] > fraccion[1], GANA_A, np.where(fraccion[1] > fraccion[0], GANA_B, EMPATE)).astype(np.int8)
+    # Volver a la orientación (a, b) pedida
+    resultado[invertido & (resultado != EMPATE)] ^= 1
+    return resultado, rondas
+
+
+def resolver_combate(a: Criatura, b: Criatura, semilla: int = 0) -> Tuple[int, int]:
+    """Un combate suelto (mismo resultado que dentro de un lote). Devuelve (GANA_A/GANA_B/EMPATE, rondas)."""
+    resultado, rondas = resolver_combates(Combatientes.desde_criaturas([a, b]), np.array([0]), np.array([1]), semilla)
+    return int(resultado[0]), int(rondas[0])
+
+
+class TablaTorneo:
+    """Victorias, empates y derrotas por combatiente; puntos = victorias + empates / 2."""
+
+    def __init__(self, ids: List[str], victorias: np.ndarray, empates: np.ndarray, derrotas: np.ndarray):
+        self.ids = ids
+        self.victorias = victorias
+        self.empates = empates
+        self.derrotas = derrotas
+        self.puntos = victorias + 0.5 * empates
+
+    def clasificacion(self) -> List[Tuple[str, float]]:
+        """(id, puntos) de mayor a menor; a igualdad de puntos, más victorias y luego orden original."""
+        orden = np.lexsort((np.arange(len(self.ids)), -self.victorias, -self.puntos))
+        return [(self.ids[i], float(self.puntos[i])) for i in orden]
+
+
+def _inicio_fila(i: np.ndarray, n: int) -> np.ndarray:
+    return i * n - i * (i + 1) // 2
+
+
+def _parejas_todos_contra_todos(n: int, desde: int, hasta: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Parejas (i, j), i < j, de posición [desde, hasta) en el orden lexicográfico de todas las parejas."""
+    k = np.arange(desde, hasta, dtype=np.int64)
+    # Se invierte inicio_fila(i) <= k con la fórmula cuadrática y se corrige el redondeo en coma flotante
+    i = np.floor((2 * n - 1 - np.sqrt((2 * n - 1) ** 2 - 8 * k.astype(np.float64))) / 2).astype(np.int64)
+    i -= _inicio_fila(i, n) > k
+    i += _inicio_fila(i + 1, n) <= k
+    return i, k - _inicio_fila(i, n) + i + 1
+
+
+def torneo_todos_contra_todos(combatientes: Combatientes, semilla: int = 0, tam_lote: int = TAM_LOTE_COMBATES) -> TablaTorneo:
+    """Todos contra todos (una vez cada pareja), resuelto por lotes de tam_lote combates para acotar la memoria."""
+    n = len(combatientes)
+    victorias = np.zeros(n, dtype=np.int64)
+    empates = np.zeros(n, dtype=np.int64)
+    derrotas = np.zeros(n, dtype=np.int64)
+    total = n * (n - 1) // 2
+    for desde in range(0, total, tam_lote):
+        idx_a, idx_b = _parejas_todos_contra_todos(n, desde, min(desde + tam_lote, total))
+        resultado, _ = resolver_combates(combatientes, idx_a, idx_b, semilla)
+        ganador = np.where(resultado == GANA_A, idx_a, idx_b)
+        perdedor = np.where(resultado == GANA_A, idx_b, idx_a)
+        decidido = resultado != EMPATE
+        victorias += np.bincount(ganador[decidido], minlength=n)
+        derrotas += np.bincount(perdedor[decidido], minlength=n)
+        empates += np.bincount(idx_a[~decidido], minlength=n) + np.bincount(idx_b[~decidido], minlength=n)
+    return TablaTorneo(combatientes.ids, victorias, empates, derrotas)
+
+
+def torneo_eliminatorio(combatientes: Combatientes, semilla: int = 0) -> Tuple[str, List[List[str]]]:
+    """Cuadro eliminatorio en el orden dado (cabezas de serie primero): si no es potencia de 2, los primeros pasan
+    la primera ronda sin combatir. En empate pasa el más ágil y, si no, el mejor cabeza de serie.
+    Devuelve (id del campeón, ids que pasan cada ronda)."""
+    if len(combatientes) == 0:
+        raise ValueError("torneo_eliminatorio necesita al menos un combatiente")
+    vivos = np.arange(len(combatientes))
+    byes = (1 << (len(vivos) - 1).bit_length()) - len(vivos) if len(vivos) > 1 else 0
+    rondas: List[List[str]] = []
+    while vivos.size > 1:
+        exentos, en_juego = vivos[:byes], vivos[byes:]
+        byes = 0
+        # Cuadro plegado: el mejor cabeza de serie restante contra el peor
+        idx_a, idx_b = en_juego[:en_juego.size // 2], en_juego[::-1][:en_juego.size // 2]
+        resultado, _ = resolver_combates(combatientes, idx_a, idx_b, semilla + len(rondas))
+        pasa_b = (resultado == GANA_B) | ((resultado == EMPATE) & (combatientes.agilidad[idx_b] > combatientes.agilidad[idx_a]))
+        vivos = np.concatenate((exentos, np.where(pasa_b, idx_b, idx_a)))
+        rondas.append([combatientes.ids[i] for i in vivos])
+    return combatientes.ids[int(vivos[0])], rondas
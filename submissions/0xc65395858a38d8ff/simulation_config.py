@@ -0,0 +1,41 @@
+"""Configuración temporal de las constantes de módulo de simulation, compartida por benchmarks, ensembles y runner.
+
+Las constantes (TIMESTEPS_POR_DIA_SIMULADO, PROBABILIDAD_REPRODUCCION_DIARIA_POR_PAREJA...) se leen de
+`simulation` en tiempo de ejecución, así que se cambian con setattr. Un proceso worker solo hereda esos
+cambios con el método de arranque fork; con spawn/forkserver vuelve a importar simulation con los valores
+por defecto. Por eso quien reparte trabajo entre procesos toma una instantánea con constantes_actuales()
+en el proceso principal y el worker la aplica con configuracion_simulacion(**constantes).
+"""
+import contextlib
+import io
+from typing import Dict
+
+import simulation as sim
+from simulation_eventos import bus_eventos
+
+TIPOS_CONSTANTE = (bool, int, float, str) # Constantes ajustables; las tablas derivadas (listas, dicts) no se copian
+
+
+@contextlib.contextmanager
+def configuracion_simulacion(**constantes):
+    """Cambia temporalmente constantes de módulo de simulation (p.ej. TIMESTEPS_POR_DIA_SIMULADO=1000)."""
+    anteriores = {nombre: getattr(sim, nombre) for nombre in constantes}
+    for nombre, valor in constantes.items():
+        setattr(sim, nombre, valor)
+    try:
+        yield
+    finally:
+        for nombre, valor in anteriores.items():
+            setattr(sim, nombre, valor)
+
+
+@contextlib.contextmanager
+def sin_salida():
+    with bus_eventos.silenciado(), contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+def constantes_actuales() -> Dict[str, object]:
+    """Valores actuales de las constantes escalares de simulation, para pasarlos explícitamente a un worker."""
+    return {nombre: valor for nombre, valor in vars(sim).items()
+            if nombre.isupper() and isinstance(valor, TIPOS_CONSTANTE)}
@@ -0,0 +1,208 @@
+"""Ensembles Monte Carlo y barridos de parámetros sobre run_simulation.
+
+Cada réplica es un run_simulation completo con sus constantes de módulo (p.ej.
+PROBABILIDAD_REPRODUCCION_DIARIA_POR_PAREJA) fijadas en el proceso worker y su propia semilla,
+sacada de un np.random.SeedSequence por configuración: las réplicas son independientes y el
+resultado no depende del número de workers ni del orden en que terminan.
+
+Los resultados se agregan en cuanto llega cada réplica (medias y varianzas de Welford, histograma
+con bordes fijos), así que la memoria no crece con el número de réplicas.
+
+Uso:
+    resultados = barrido_parametros({"PROBABILIDAD_REPRODUCCION_DIARIA_POR_PAREJA": [0.1, 0.25, 0.5],
+                                     "MAX_CRIATURAS_POR_AMBIENTE": [5, 10]}, replicas=64)
+    for r in resultados:
+        print(r.constantes, r.poblacion.media[-1], r.poblacion.desviacion()[-1])
+"""
+import itertools
+import os
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from typing import Dict, Iterator, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+import simulation as sim
+from simulation_config import configuracion_simulacion, constantes_actuales, sin_salida
+
+DURACION_ENSEMBLE_DEFAULT = sim.DIA_EN_SEGUNDOS_SIMULADOS * 3.5
+INTERVALO_ENSEMBLE_DEFAULT = sim.DIA_EN_SEGUNDOS_SIMULADOS / 4
+BORDES_EP_DEFAULT = np.linspace(0.0, 1000.0, 101) # Valores fuera de rango cuentan en el primer/último bin
+TRABAJOS_EN_VUELO_POR_WORKER = 2 # Réplicas enviadas y sin agregar, por worker
+
+
+class AcumuladorWelford:
+    """Media, varianza, mínimo y máximo elemento a elemento de arrays de forma fija, añadidos de uno en uno.
+
+    Los NaN (p.ej. la deriva genética de una réplica extinta) no cuentan: cada celda lleva su propio número
+    de valores (cuentas), y las celdas sin ninguno dan media NaN.
+    """
+
+    def __init__(self, forma: Tuple[int, ...]):
+        self.n = 0
+        self.cuentas = np.zeros(forma, dtype=np.int64)
+        self._media = np.zeros(forma)
+        self._m2 = np.zeros(forma)
+        self.minimo = np.full(forma, np.inf)
+        self.maximo = np.full(forma, -np.inf)
+
+    def añadir(self, valores: np.ndarray):
+        self.n += 1
+        validos = ~np.isnan(valores)
+        self.cuentas += validos
+        delta = np.where(validos, valores - self._media, 0.0)
+        self._media += delta / np.maximum(self.cuentas, 1)
+        self._m2 += delta * np.where(validos, valores - self._media, 0.0)
+        np.fmin(self.minimo, valores, out=self.minimo)
+        np.fmax(self.maximo, valores, out=self.maximo)
+
+    @property
+    def media(self) -> np.ndarray:
+        return np.where(self.cuentas > 0, self._media, np.nan)
+
+    def varianza(self) -> np.ndarray:
+        """Varianza muestral (ddof=1); NaN en las celdas con menos de dos valores."""
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(self.cuentas >= 2, self._m2 / (self.cuentas - 1), np.nan)
+
+    def desviacion(self) -> np.ndarray:
+        return np.sqrt(self.varianza())
+
+
+class ResultadoEnsemble:
+    """Estadísticas agregadas de las réplicas de una configuración de constantes.
+
+    - tiempos: instantes de observación (días simulados): 0 y el final de cada intervalo de run_simulation.
+    - poblacion, ep_medio: por instante, criaturas vivas y su EP medio (0 si no queda ninguna).
+    - genes: por instante y gen (visibles y luego ocultos, ver nombres_genes), media sobre las vivas menos la
+      media de las criaturas iniciales en t=0 (deriva genética). Las réplicas extintas no cuentan a partir de
+      su extinción (genes.cuentas); NaN si no queda ninguna en ninguna réplica.
+    - histograma_ep: EP final de todas las criaturas vivas de todas las réplicas, con bordes_ep.
+    """
+
+    def __init__(self, constantes: Dict[str, object], tiempos: np.ndarray, bordes_ep: np.ndarray):
+        self.constantes = constantes
+        self.tiempos = tiempos
+        self.nombres_genes = sim.NOMBRES_GENES_VISIBLES + sim.NOMBRES_GENES_OCULTOS
+        self.poblacion = AcumuladorWelford(tiempos.shape)
+        self.ep_medio = AcumuladorWelford(tiempos.shape)
+        self.genes = AcumuladorWelford((len(tiempos), len(self.nombres_genes)))
+        self.bordes_ep = bordes_ep
+        self.histograma_ep = np.zeros(len(bordes_ep) - 1, dtype=np.int64)
+
+    @property
+    def replicas(self) -> int:
+        return self.poblacion.n
+
+    def añadir(self, replica: Dict[str, np.ndarray]):
+        self.poblacion.añadir(replica["poblacion"])
+        self.ep_medio.añadir(replica["ep_medio"])
+        self.genes.añadir(replica["genes"])
+        ep_final = np.clip(replica["ep_final"], self.bordes_ep[0], self.bordes_ep[-1])
+        self.histograma_ep += np.histogram(ep_final, self.bordes_ep)[0]
+
+    def resumen(self) -> Dict[str, np.ndarray]:
+        """Arrays listos para guardar (np.savez(ruta, **resultado.resumen()))."""
+        return {"tiempos": self.tiempos, "replicas": np.array(self.replicas),
+                "poblacion_media": self.poblacion.media, "poblacion_desviacion": self.poblacion.desviacion(),
+                "poblacion_min": self.poblacion.minimo, "poblacion_max": self.poblacion.maximo,
+                "ep_medio_media": self.ep_medio.media, "ep_medio_desviacion": self.ep_medio.desviacion(),
+                "deriva_genes_media": self.genes.media, "deriva_genes_desviacion": self.genes.desviacion(),
+                "deriva_genes_replicas": self.genes.cuentas,
+                "nombres_genes": np.array(self.nombres_genes),
+                "histograma_ep": self.histograma_ep, "bordes_ep": self.bordes_ep}
+
+
+class _ObservadorReplica:
+    """Observador de run_simulation que guarda una fila por intervalo (solo números, nada de criaturas)."""
+
+    def __init__(self):
+        self.tiempos: List[float] = []
+        self.poblacion: List[int] = []
+        self.ep_medio: List[float] = []
+        self.genes: List[np.ndarray] = []
+
+    @staticmethod
+    def _matriz_genes(vivas: List[sim.Criatura]) -> np.ndarray:
+        return np.array([list(c._genes_visibles) + list(c._genes_ocultos) for c in vivas], dtype=np.float64)
+
+    def __call__(self, ambiente: sim.Ambiente, t: float):
+        vivas = ambiente.get_criaturas_vivas()
+        self.tiempos.append(t / sim.DIA_EN_SEGUNDOS_SIMULADOS)
+        self.poblacion.append(len(vivas))
+        self.ep_medio.append(sum(c.puntos_evolucion for c in vivas) / len(vivas) if vivas else 0.0)
+        n_genes = len(sim.NOMBRES_GENES_VISIBLES) + len(sim.NOMBRES_GENES_OCULTOS)
+        self.genes.append(self._matriz_genes(vivas).mean(axis=0) if vivas else np.full(n_genes, np.nan))
+
+
+def ejecutar_replica(constantes: Dict[str, object], semilla: int, duracion_total_sim_seg: float,
+                     intervalo_actualizacion_seg: float) -> Dict[str, np.ndarray]:
+    """Una réplica (en el proceso worker): run_simulation silencioso con las constantes y semilla dadas."""
+    observador = _ObservadorReplica()
+    with configuracion_simulacion(**constantes), sin_salida():
+        ambiente = sim.run_simulation(f"ensemble-{semilla}", duracion_total_sim_seg, intervalo_actualizacion_seg,
+                                      generate_graph=False, semilla=semilla, observador=observador)
+        vivas = ambiente.get_criaturas_vivas()
+    return {"tiempos": np.array(observador.tiempos), "poblacion": np.array(observador.poblacion, dtype=np.float64),
+            "ep_medio": np.array(observador.ep_medio), "genes": np.array(observador.genes) - observador.genes[0],
+            "ep_final": np.array([c.puntos_evolucion for c in vivas], dtype=np.float64)}
+
+
+def _combinaciones(rejilla: Dict[str, Sequence]) -> List[Dict[str, object]]:
+    for nombre in rejilla:
+        if not nombre.isupper() or not hasattr(sim, nombre):
+            raise ValueError(f"'{nombre}' no es una constante de simulation")
+    nombres = list(rejilla)
+    return [dict(zip(nombres, valores)) for valores in itertools.product(*(rejilla[n] for n in nombres))]
+
+
+def _trabajos(combinaciones: List[Dict[str, object]], replicas: int, semilla_base: int) -> Iterator[Tuple[int, int]]:
+    """(índice de configuración, semilla) por réplica. Cada configuración tiene su propia SeedSequence hija."""
+    for i, secuencia in enumerate(np.random.SeedSequence(semilla_base).spawn(len(combinaciones))):
+        for hija in secuencia.spawn(replicas):
+            yield i, int(hija.generate_state(1, dtype=np.uint64)[0])
+
+
+def barrido_parametros(rejilla: Dict[str, Sequence], replicas: int,
+                       duracion_total_sim_seg: float = DURACION_ENSEMBLE_DEFAULT,
+                       intervalo_actualizacion_seg: float = INTERVALO_ENSEMBLE_DEFAULT,
+                       semilla_base: int = 0, n_workers: Optional[int] = None,
+                       bordes_ep: np.ndarray = BORDES_EP_DEFAULT) -> List[ResultadoEnsemble]:
+    """Ejecuta `replicas` réplicas de cada combinación de la rejilla (constante -> valores) en un pool de
+    procesos (n_workers=None: todos los núcleos). Devuelve un ResultadoEnsemble por combinación, en el orden
+    de itertools.product sobre la rejilla."""
+    if replicas < 1:
+        raise ValueError("replicas debe ser >= 1")
+    combinaciones = _combinaciones(rejilla)
+    # Los workers reciben todas las constantes, no solo las de la rejilla: así ven también las cambiadas
+    # en este proceso aunque el pool no arranque con fork
+    base = constantes_actuales()
+    resultados: List[Optional[ResultadoEnsemble]] = [None] * len(combinaciones)
+    trabajos = _trabajos(combinaciones, replicas, semilla_base)
+
+    n_workers = n_workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=n_workers) as pool:
+        max_en_vuelo = TRABAJOS_EN_VUELO_POR_WORKER * n_workers
+        en_vuelo: Dict[Future, int] = {}
+
+        def enviar_siguientes():
+            for i, semilla in itertools.islice(trabajos, max_en_vuelo - len(en_vuelo)):
+                en_vuelo[pool.submit(ejecutar_replica, {**base, **combinaciones[i]}, semilla, duracion_total_sim_seg,
+                                     intervalo_actualizacion_seg)] = i
+
+        enviar_siguientes()
+        while en_vuelo:
+            terminados: Set[Future] = wait(en_vuelo, return_when=FIRST_COMPLETED).done
+            for futuro in terminados:
+                i = en_vuelo.pop(futuro)
+                replica = futuro.result()
+                if resultados[i] is None:
+                    resultados[i] = ResultadoEnsemble(combinaciones[i], replica["tiempos"], np.asarray(bordes_ep, dtype=np.float64))
+                resultados[i].añadir(replica)
+            enviar_siguientes()
+    return resultados
+
+
+def ejecutar_ensemble(replicas: int, constantes: Dict[str, object] = None, **opciones) -> ResultadoEnsemble:
+    """Ensemble de una sola configuración (constantes: nombre -> valor; vacío = valores actuales del módulo)."""
+    rejilla = {nombre: [valor] for nombre, valor in (constantes or {}).items()}
+    return barrido_parametros(rejilla, replicas, **opciones)[0]
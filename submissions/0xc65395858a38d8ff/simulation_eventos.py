@@ -0,0 +1,142 @@
+"""Eventos estructurados de la simulación (nacimiento, muerte, reproducción, homeostasis, tick...).
+
+El código de simulation.py no imprime directamente: emite eventos (tipo + campos) en `bus_eventos`.
+Las llamadas van protegidas con `if bus_eventos.oyentes:`, así que sin oyentes no se construye ni
+se formatea nada. Por defecto hay un SinkConsola suscrito que reproduce los mensajes de siempre;
+para ejecuciones sin terminal se desuscribe y se usa SinkJSONL, que escribe por lotes.
+"""
+import contextlib
+import gzip
+import json
+from typing import Callable, Dict, List, Optional
+
+# --- Tipos de evento ---
+EVENTO_NACIMIENTO = "nacimiento"
+EVENTO_MUERTE = "muerte"
+EVENTO_REPRODUCCION = "reproduccion"
+EVENTO_HOMEOSTASIS = "homeostasis"
+EVENTO_TICK = "tick"
+EVENTO_AMBIENTE_CREADO = "ambiente_creado"
+EVENTO_CRIATURA_AÑADIDA = "criatura_añadida"
+EVENTO_AMBIENTE_LLENO = "ambiente_lleno"
+EVENTO_CRIATURA_REMOVIDA = "criatura_removida"
+
+# Resultados posibles de un EVENTO_HOMEOSTASIS
+HOMEOSTASIS_APLICADA = "aplicada"
+HOMEOSTASIS_EP_INSUFICIENTES = "ep_insuficientes"
+HOMEOSTASIS_GEN_NO_VISIBLE = "gen_no_visible"
+
+TAM_LOTE_ESCRITURA = 1000 # Eventos acumulados antes de escribir a disco
+
+Oyente = Callable[[str, Dict], None]
+
+
+class BusEventos:
+    """Reparte cada evento a los oyentes suscritos (cualquier callable oyente(tipo, campos))."""
+
+    def __init__(self):
+        self.oyentes: List[Oyente] = []
+
+    def suscribir(self, oyente: Oyente) -> Oyente:
+        self.oyentes.append(oyente)
+        return oyente
+
+    def desuscribir(self, oyente: Oyente):
+        if oyente in self.oyentes:
+            self.oyentes.remove(oyente)
+
+    def emitir(self, tipo: str, **campos):
+        for oyente in self.oyentes:
+            oyente(tipo, campos)
+
+    @contextlib.contextmanager
+    def silenciado(self):
+        """Desactiva temporalmente todos los oyentes (p.ej. en los workers del runner)."""
+        oyentes, self.oyentes = self.oyentes, []
+        try:
+            yield
+        finally:
+            self.oyentes = oyentes
+
+
+class SinkConsola:
+    """Formatea los eventos como los print() originales de la simulación."""
+
+    def __call__(self, tipo: str, campos: Dict):
+        formatear = _FORMATOS_CONSOLA.get(tipo)
+        if formatear is not None:
+            print(formatear(campos))
+
+
+def _formato_homeostasis(c: Dict) -> str:
+    if c["resultado"] == HOMEOSTASIS_APLICADA:
+        return (f"    {c['nombre']} (a {c['t']:.2f}s): Objetivo homeostasis para '{c['gen']}' en {c['valor']:.2f}. "
+                f"Costo: {c['costo_ep']:.2f} EP. EP restantes: {c['ep']:.2f}.")
+    if c["resultado"] == HOMEOSTASIS_EP_INSUFICIENTES:
+        return (f"    {c['nombre']} (a {c['t']:.2f}s): No hay suficientes EP ({c['ep']:.2f}) para establecer "
+                f"objetivo homeostasis '{c['gen']}' (costo: {c['costo_ep']:.2f}).")
+    return f"    ADVERTENCIA: Gen '{c['gen']}' no es visible para homeostasis."
+
+
+_FORMATOS_CONSOLA: Dict[str, Callable[[Dict], str]] = {
+    EVENTO_NACIMIENTO: lambda c: (f"    Criatura creada: {c['nombre']} (ID: {c['id']}), Nacimiento: {c['t']:.2f}s, "
+                                  f"EP_inicial: {c['ep']:.1f}, Vida: {c['lifespan_dias']:.1f}d"),
+    EVENTO_MUERTE: lambda c: (f"    ¡EVENTO! {c['nombre']} ha muerto de vejez a los {c['edad_dias']:.1f} días simulados "
+                              f"(Vida max: {c['lifespan_dias']:.1f}d)."),
+    EVENTO_REPRODUCCION: lambda c: (f"    ¡REPRODUCCIÓN en {c['id_usuario']} a t={c['t']:.2f}s! "
+                                    f"{c['nombre_padre1']} y {c['nombre_padre2']} tuvieron cría."),
+    EVENTO_HOMEOSTASIS: _formato_homeostasis,
+    EVENTO_TICK: lambda c: f"\n--- Avanzando tiempo de simulación a: {c['t']:.2f}s (Intervalo: {c['intervalo']:.2f}s) ---",
+    EVENTO_AMBIENTE_CREADO: lambda c: f"Ambiente creado para {c['id_usuario']} a t={c['t']:.2f}s",
+    EVENTO_CRIATURA_AÑADIDA: lambda c: f"  {c['nombre']} añadida al ambiente de {c['id_usuario']}.",
+    EVENTO_AMBIENTE_LLENO: lambda c: f"  Ambiente lleno. No se pudo añadir a {c['nombre']}.",
+    EVENTO_CRIATURA_REMOVIDA: lambda c: f"    Removiendo a {c['nombre']} (muerta) del ambiente {c['id_usuario']}.",
+}
+
+
+class SinkJSONL:
+    """Escribe un evento por línea ({"tipo": ..., **campos}) acumulando tam_lote eventos por escritura.
+    Si la ruta termina en .gz se escribe comprimido con gzip."""
+
+    def __init__(self, ruta: str, tam_lote: int = TAM_LOTE_ESCRITURA, tipos: Optional[set] = None):
+        self.ruta = ruta
+        self.tam_lote = tam_lote
+        self.tipos = tipos # None = todos los tipos
+        self._archivo = gzip.open(ruta, "wt", encoding="utf-8") if ruta.endswith(".gz") else open(ruta, "w", encoding="utf-8")
+        self._pendientes: List[str] = []
+        self.eventos_escritos = 0
+
+    def __call__(self, tipo: str, campos: Dict):
+        if self.tipos is not None and tipo not in self.tipos:
+            return
+        self._pendientes.append(json.dumps({"tipo": tipo, **campos}, ensure_ascii=False, separators=(",", ":")))
+        if len(self._pendientes) >= self.tam_lote:
+            self.vaciar()
+
+    def vaciar(self):
+        if self._pendientes:
+            self._archivo.write("\n".join(self._pendientes) + "\n")
+            self.eventos_escritos += len(self._pendientes)
+            self._pendientes.clear()
+
+    def cerrar(self):
+        if not self._archivo.closed:
+            self.vaciar()
+            self._archivo.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.cerrar()
+
+
+def leer_jsonl(ruta: str) -> List[Dict]:
+    """Carga los eventos escritos por un SinkJSONL."""
+    abrir = gzip.open if ruta.endswith(".gz") else open
+    with abrir(ruta, "rt", encoding="utf-8") as archivo:
+        return [json.loads(linea) for linea in archivo if linea.strip()]
+
+
+bus_eventos = BusEventos()
+sink_consola = bus_eventos.suscribir(SinkConsola())
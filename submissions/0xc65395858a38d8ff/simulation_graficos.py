@@ -0,0 +1,126 @@
+"""Renderizado de gráficos fuera del proceso de simulación.
+
+run_simulation ya no dibuja: empaqueta las series registradas (reducidas con min/max por columna de
+píxeles) en un diccionario serializable y lo envía a un pool de procesos que renderiza con el backend
+Agg (sin ventana). La simulación devuelve el Ambiente en cuanto envía el trabajo, y los gráficos de
+muchos ambientes se renderizan en paralelo.
+"""
+import atexit
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+COLORES_CRIATURAS_INICIALES = {
+    "Sparky": "#FF5733",  # Rojo-naranja
+    "Blobby": "#33FF57",  # Verde
+    "Zapper": "#3357FF",  # Azul
+    "Wisp": "#B433FF",    # Púrpura
+    "Glimmer": "#FFD733"  # Amarillo-dorado
+}
+TAMAÑO_FIGURA = (12, 7)
+DPI_GRAFICO = 300
+RUTA_GRAFICO_DEFAULT = "elemental_strikers_evolution.png"
+
+
+def reducir_min_max(x: np.ndarray, y: np.ndarray, n_columnas: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Reduce una serie a, como mucho, el mínimo y el máximo de cada una de n_columnas columnas (en orden de x).
+    Conserva los picos que se verían al dibujar la serie completa a esa resolución."""
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n = len(x)
+    if n <= 2 * n_columnas:
+        return x, y
+    columna = (np.arange(n) * n_columnas) // n
+    orden = np.lexsort((y, columna)) # Dentro de cada columna, de menor a mayor y
+    inicios = np.searchsorted(columna[orden], np.arange(n_columnas))
+    finales = np.append(inicios[1:], n) - 1
+    indices = np.unique(np.concatenate((orden[inicios], orden[finales]))) # Ordenados: se mantiene el orden temporal
+    return x[indices], y[indices]
+
+
+def datos_grafico_ep(series: Dict[str, Tuple[np.ndarray, np.ndarray]], eventos: Sequence[Tuple[float, str]],
+                     ruta: str = RUTA_GRAFICO_DEFAULT, dpi: int = DPI_GRAFICO) -> Dict:
+    """Trabajo de renderizado del gráfico de EP. series: nombre -> (días, EP); eventos: (día, nombre de criatura)."""
+    n_columnas = int(TAMAÑO_FIGURA[0] * dpi)
+    return {
+        "series": {nombre: reducir_min_max(x, y, n_columnas) for nombre, (x, y) in series.items() if len(x)},
+        "eventos": list(eventos),
+        "ruta": ruta,
+        "dpi": dpi,
+    }
+
+
+def renderizar_grafico_ep(datos: Dict) -> str:
+    """Dibuja y guarda el gráfico de EP (se ejecuta en el proceso worker). Devuelve la ruta del archivo."""
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    with plt.style.context('dark_background'):  # Fondo oscuro para un aspecto más místico
+        figura, ejes = plt.subplots(figsize=TAMAÑO_FIGURA)
+        for nombre, (x_vals, y_vals) in datos["series"].items():
+            ejes.plot(x_vals, y_vals, '-', color=COLORES_CRIATURAS_INICIALES.get(nombre), linewidth=2.5, label=nombre)
+
+        # Añadir elementos místicos al gráfico
+        ejes.set_title("ElementalStrikers: Evolution Points Over Time", fontsize=18, fontweight='bold')
+        ejes.set_xlabel("Time (Simulated Days)", fontsize=14)
+        ejes.set_ylabel("Evolution Energy (EP)", fontsize=14)
+        ejes.grid(True, linestyle='--', alpha=0.3)
+
+        # Añadir eventos de homeostasis como puntos destacados
+        for t_dias, nombre_c in datos["eventos"]:
+            ejes.axvline(x=t_dias, color='white', linestyle='--', alpha=0.3)
+            ejes.text(t_dias, ejes.get_ylim()[1]*0.9, f"{nombre_c}'s Transformation",
+                      rotation=90, ha='right', va='top', alpha=0.7, fontsize=8)
+
+        ejes.legend(loc='upper left', frameon=True, framealpha=0.7)
+
+        # Añadir marca de agua / mensaje promocional
+        figura.text(0.5, 0.02,
+                    "#MayTheFlowBeWithYou - ElementalStrikers evolving on @flow_blockchain",
+                    ha="center", fontsize=10, alpha=0.7)
+
+        figura.tight_layout()
+        figura.savefig(datos["ruta"], dpi=datos["dpi"], bbox_inches='tight')
+        plt.close(figura)
+    return datos["ruta"]
+
+
+class RenderizadorGraficos:
+    """Pool de procesos que renderiza trabajos de gráfico en segundo plano."""
+
+    def __init__(self, n_workers: Optional[int] = None):
+        self._pool = ProcessPoolExecutor(max_workers=n_workers)
+        self._pendientes: List[Future] = []
+
+    def enviar(self, datos: Dict) -> Future:
+        futuro = self._pool.submit(renderizar_grafico_ep, datos)
+        self._pendientes.append(futuro)
+        return futuro
+
+    def esperar(self) -> List[str]:
+        """Bloquea hasta que terminen todos los trabajos enviados; devuelve sus rutas (propaga errores)."""
+        pendientes, self._pendientes = self._pendientes, []
+        return [futuro.result() for futuro in pendientes]
+
+    def cerrar(self):
+        self._pool.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.cerrar()
+
+
+_renderizador_por_defecto: Optional[RenderizadorGraficos] = None
+
+
+def renderizador_por_defecto() -> RenderizadorGraficos:
+    """Renderizador compartido, creado al primer uso y cerrado (esperando sus trabajos) al salir."""
+    global _renderizador_por_defecto
+    if _renderizador_por_defecto is None:
+        _renderizador_por_defecto = RenderizadorGraficos()
+        atexit.register(_renderizador_por_defecto.cerrar)
+    return _renderizador_por_defecto
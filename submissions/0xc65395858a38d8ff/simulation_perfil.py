@@ -0,0 +1,180 @@
+"""Perfilado por fases del bucle de simulación: temporizadores, contadores e histogramas de duración.
+
+Al activarse, el perfilador sustituye los métodos y funciones de cada fase (FASES_PERFIL) por envolturas
+que miden cada llamada con time.perf_counter_ns, y se suscribe al bus para contar eventos por tipo. Al
+desactivarse restaura los originales: apagado no hay ni una comprobación extra en el código de la
+simulación. Los tiempos son inclusivos (actualizar_estado_hasta incluye sus evolucion_timestep).
+
+Uso:
+    with perfilando() as perfil:
+        sim.run_simulation("perfil", 60 * 3.5, 15, generate_graph=False)
+    print(perfil.informe())
+    perfil.guardar_json("perfil.json")
+
+Las fases se parchean en el módulo `simulation` importado; activar el perfilador antes de la llamada
+a medir (no afecta a un simulation.py ejecutado como __main__).
+"""
+import contextlib
+import functools
+import json
+import time
+from typing import Callable, Dict, List, Tuple
+
+import simulation as sim
+from simulation import Ambiente, Criatura
+from simulation_eventos import BusEventos, bus_eventos
+from simulation_hashing import cache_tablas_hash
+from simulation_registro import RegistroSeriesTemporales
+
+# fase -> (objeto que la contiene, atributo). El orden es el del informe.
+FASES_PERFIL: Dict[str, Tuple[object, str]] = {
+    "run_simulation": (sim, "run_simulation"),
+    "actualizar_ambiente": (Ambiente, "actualizar_todas_las_criaturas"),
+    "actualizar_estado_hasta": (Criatura, "actualizar_estado_hasta"),
+    "evolucion_timestep": (Criatura, "_evolucion_un_timestep"),
+    "evolucion_tramo": (Criatura, "_evolucion_tramo"),
+    "tablas_hash": (sim, "filas_pseudo_rand_dia"),
+    "fin_dia": (Criatura, "_procesar_fin_dia_eventos"),
+    "reproduccion": (Ambiente, "intentar_reproduccion_ambiente"),
+    "homeostasis": (Criatura, "set_homeostasis_target"),
+    "bus_eventos": (BusEventos, "emitir"),
+    "registro_grafico": (RegistroSeriesTemporales, "registrar"),
+}
+CONTADORES_CACHE = ("aciertos", "fallos", "expulsiones", "filas_sueltas") # Atributos de cache_tablas_hash que se contabilizan
+CUBETAS_HISTOGRAMA = 64 # Cubeta k: duraciones en [2**(k-1), 2**k) ns
+
+
+def _contadores_cache() -> Tuple[int, ...]:
+    return tuple(getattr(cache_tablas_hash, nombre) for nombre in CONTADORES_CACHE)
+
+
+class EstadisticaFase:
+    __slots__ = ("llamadas", "total_ns", "max_ns", "histograma")
+
+    def __init__(self):
+        self.llamadas = 0
+        self.total_ns = 0
+        self.max_ns = 0
+        self.histograma = [0] * CUBETAS_HISTOGRAMA
+
+    def añadir(self, duracion_ns: int):
+        self.llamadas += 1
+        self.total_ns += duracion_ns
+        if duracion_ns > self.max_ns:
+            self.max_ns = duracion_ns
+        self.histograma[min(duracion_ns.bit_length(), CUBETAS_HISTOGRAMA - 1)] += 1
+
+    def percentil_ns(self, q: float) -> int:
+        """Cota superior del percentil q (0-1) según el histograma (límite superior de su cubeta)."""
+        objetivo = q * self.llamadas
+        acumulado = 0
+        for k, n in enumerate(self.histograma):
+            acumulado += n
+            if n and acumulado >= objetivo:
+                return min(2 ** k, self.max_ns)
+        return self.max_ns
+
+    def a_diccionario(self) -> Dict:
+        return {"llamadas": self.llamadas, "total_s": self.total_ns / 1e9, "max_s": self.max_ns / 1e9,
+                "media_s": self.total_ns / self.llamadas / 1e9 if self.llamadas else 0.0,
+                "p50_s": self.percentil_ns(0.5) / 1e9, "p99_s": self.percentil_ns(0.99) / 1e9,
+                "histograma_log2_ns": {k: n for k, n in enumerate(self.histograma) if n}}
+
+
+class PerfiladorSimulacion:
+    """Acumula tiempos por fase y contadores mientras está activo; activar()/desactivar() en caliente."""
+
+    def __init__(self, fases: Dict[str, Tuple[object, str]] = None):
+        self.fases = dict(FASES_PERFIL if fases is None else fases)
+        self.estadisticas: Dict[str, EstadisticaFase] = {fase: EstadisticaFase() for fase in self.fases}
+        self.contadores: Dict[str, int] = {}
+        self.activo = False
+        self._originales: List[Tuple[object, str, Callable]] = []
+        self._cache_al_activar = (0,) * len(CONTADORES_CACHE)
+
+    def _envolver(self, funcion: Callable, estadistica: EstadisticaFase) -> Callable:
+        reloj = time.perf_counter_ns
+        añadir = estadistica.añadir
+
+        @functools.wraps(funcion)
+        def envoltura(*args, **kwargs):
+            inicio = reloj()
+            try:
+                return funcion(*args, **kwargs)
+            finally:
+                añadir(reloj() - inicio)
+        return envoltura
+
+    def _contar_evento(self, tipo: str, campos: Dict):
+        self.contadores[f"evento.{tipo}"] = self.contadores.get(f"evento.{tipo}", 0) + 1
+
+    def contar(self, nombre: str, n: int = 1):
+        """Contador libre (p.ej. desde un observador). No hace nada con el perfilador apagado."""
+        if self.activo:
+            self.contadores[nombre] = self.contadores.get(nombre, 0) + n
+
+    def activar(self):
+        if self.activo:
+            return
+        for fase, (objeto, atributo) in self.fases.items():
+            original = getattr(objeto, atributo)
+            self._originales.append((objeto, atributo, objeto.__dict__[atributo]))
+            setattr(objeto, atributo, self._envolver(original, self.estadisticas[fase]))
+        bus_eventos.suscribir(self._contar_evento)
+        self._cache_al_activar = _contadores_cache()
+        self.activo = True
+
+    def desactivar(self):
+        if not self.activo:
+            return
+        for objeto, atributo, original in reversed(self._originales):
+            setattr(objeto, atributo, original)
+        self._originales = []
+        bus_eventos.desuscribir(self._contar_evento)
+        for nombre, antes, ahora in zip(CONTADORES_CACHE, self._cache_al_activar, _contadores_cache()):
+            self.contar(f"cache_tablas_hash.{nombre}", ahora - antes)
+        self.activo = False
+
+    def reiniciar(self):
+        activo = self.activo
+        self.desactivar() # Las envolturas apuntan a las estadísticas viejas
+        self.estadisticas = {fase: EstadisticaFase() for fase in self.fases}
+        self.contadores = {}
+        if activo:
+            self.activar()
+
+    def a_diccionario(self) -> Dict:
+        return {"fases": {fase: e.a_diccionario() for fase, e in self.estadisticas.items() if e.llamadas},
+                "contadores": dict(sorted(self.contadores.items()))}
+
+    def informe(self) -> str:
+        """Tabla de texto por fase (porcentaje sobre la fase más larga, normalmente run_simulation) y contadores."""
+        usadas = {fase: e for fase, e in self.estadisticas.items() if e.llamadas}
+        if not usadas:
+            return "Sin datos de perfil."
+        referencia = max(e.total_ns for e in usadas.values()) or 1
+        lineas = [f"{'fase':<24} {'llamadas':>10} {'total (s)':>10} {'%':>6} {'media (us)':>11} {'p99 (us)':>10}"]
+        for fase, e in usadas.items():
+            lineas.append(f"{fase:<24} {e.llamadas:>10} {e.total_ns / 1e9:>10.4f} {100 * e.total_ns / referencia:>6.1f} "
+                          f"{e.total_ns / e.llamadas / 1e3:>11.2f} {e.percentil_ns(0.99) / 1e3:>10.2f}")
+        for nombre, valor in sorted(self.contadores.items()):
+            lineas.append(f"{nombre:<40} {valor:>10}")
+        return "\n".join(lineas)
+
+    def guardar_json(self, ruta: str):
+        with open(ruta, "w") as archivo:
+            json.dump(self.a_diccionario(), archivo, indent=2)
+
+
+perfilador = PerfiladorSimulacion()
+
+
+@contextlib.contextmanager
+def perfilando(perfil: PerfiladorSimulacion = None):
+    """Activa un perfilador (nuevo si no se da) durante el bloque y lo devuelve."""
+    perfil = PerfiladorSimulacion() if perfil is None else perfil
+    perfil.activar()
+    try:
+        yield perfil
+    finally:
+        perfil.desactivar()
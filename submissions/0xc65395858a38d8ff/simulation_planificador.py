@@ -0,0 +1,202 @@
+"""Planificador de eventos discretos para un Ambiente (alternativa al bucle de intervalo fijo de run_simulation).
+
+En lugar de avanzar todas las criaturas cada `intervalo_actualizacion_seg`, se mantiene un heap con
+los próximos eventos y solo se avanza a las criaturas que un evento u observador necesita:
+
+- DIA: fin del día de semillas de una criatura (nuevas semillas, evento R4, envejecimiento).
+- MUERTE: el fin de día en el que la edad alcanza lifespan_total_dias (se calcula al programarlo).
+- REPRODUCCION: tras los fines de día, cuando alguna criatura puede haber entrado en ventana de reproducción.
+- HOMEOSTASIS: prompts programados (se reintentan si la criatura aún no existe o no tiene EP suficientes).
+- OBSERVACION: callbacks (gráficos, registro, UI) que necesitan el ambiente actualizado en un instante.
+
+El coste es proporcional al número de eventos, no al tiempo simulado dividido entre el intervalo.
+
+Diferencias con run_simulation:
+- Sin `ticks`, un prompt se aplica en su instante exacto (run_simulation lo aplica en el siguiente tick) y
+  se reintenta cada intervalo_reintento_homeostasis. Con ticks (los instantes de actualización de
+  run_simulation, ver instantes_tick) se entrega y reintenta en esos mismos ticks.
+- La reproducción se intenta en los fines de día y no en cada tick: los sorteos de `random` coinciden con
+  run_simulation solo mientras no nace ninguna cría (p.ej. con el ambiente lleno, como en el escenario
+  por defecto). Con nacimientos el resultado es otra muestra del mismo proceso, no la misma trayectoria.
+- run_simulation con ticks fuera de la rejilla de timesteps evoluciona timesteps de más en cada tick, así
+  que su propio resultado depende del intervalo; el planificador equivale al de intervalos sobre la rejilla.
+"""
+import bisect
+import heapq
+import itertools
+import math
+import random
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import simulation as sim
+from simulation import Ambiente, Criatura
+from simulation_eventos import EVENTO_CRIATURA_REMOVIDA, bus_eventos
+
+# Tipos de evento; el valor es la prioridad entre eventos del mismo instante (menor = antes). Los prompts van
+# antes que los fines de día porque un fin de día en t ya avanza la criatura un timestep más allá de t, y en
+# run_simulation un prompt en t se aplica antes de ese timestep
+EVENTO_PLAN_HOMEOSTASIS = 0
+EVENTO_PLAN_DIA = 1
+EVENTO_PLAN_MUERTE = 2
+EVENTO_PLAN_REPRODUCCION = 3
+EVENTO_PLAN_OBSERVACION = 4
+NOMBRES_EVENTOS_PLAN = {EVENTO_PLAN_DIA: "dia", EVENTO_PLAN_MUERTE: "muerte", EVENTO_PLAN_REPRODUCCION: "reproduccion",
+                        EVENTO_PLAN_HOMEOSTASIS: "homeostasis", EVENTO_PLAN_OBSERVACION: "observacion"}
+
+Observador = Callable[[Ambiente, float], None]
+
+
+def instantes_tick(duracion_total_sim_seg: float, intervalo_actualizacion_seg: float) -> List[float]:
+    """Instantes de actualización del bucle de run_simulation, acumulados en float igual que él."""
+    ticks = []
+    t = 0.0
+    while t < duracion_total_sim_seg:
+        t = min(t + intervalo_actualizacion_seg, duracion_total_sim_seg)
+        ticks.append(t)
+    return ticks
+
+
+class PlanificadorEventos:
+    """Cola de prioridad (t, prioridad, secuencia, tipo, datos) sobre un Ambiente."""
+
+    def __init__(self, ambiente: Ambiente, intervalo_reintento_homeostasis: float = None, ticks: Sequence[float] = None):
+        self.ambiente = ambiente
+        self.ticks = ticks # Si se dan, los prompts se entregan y reintentan en estos instantes (ver instantes_tick)
+        self.tiempo_actual = 0.0
+        self.intervalo_reintento_homeostasis = (sim.DIA_EN_SEGUNDOS_SIMULADOS / 4 if intervalo_reintento_homeostasis is None
+                                                else intervalo_reintento_homeostasis)
+        self._cola: List[Tuple[float, int, int, int, tuple]] = []
+        self._secuencia = itertools.count()
+        self._reproduccion_programada: set = set() # Instantes con un REPRODUCCION ya en la cola
+        self.eventos_procesados: Dict[str, int] = {nombre: 0 for nombre in NOMBRES_EVENTOS_PLAN.values()}
+        for criatura in ambiente.criaturas.values():
+            self.programar_fin_de_dia(criatura)
+
+    def __len__(self) -> int:
+        return len(self._cola)
+
+    def _programar(self, t: float, tipo: int, datos: tuple = ()):
+        heapq.heappush(self._cola, (t, tipo, next(self._secuencia), tipo, datos))
+
+    def programar_fin_de_dia(self, criatura: Criatura):
+        """Siguiente fin de día de la criatura: MUERTE si en él alcanza su esperanza de vida, DIA si no."""
+        if not criatura.esta_viva:
+            return
+        t_limite = criatura.last_seed_generation_timestamp + sim.DIA_EN_SEGUNDOS_SIMULADOS
+        muere = criatura.edad_dias_completos + 1 >= criatura.lifespan_total_dias
+        self._programar(t_limite, EVENTO_PLAN_MUERTE if muere else EVENTO_PLAN_DIA, (criatura.id,))
+
+    def programar_homeostasis(self, t: float, nombre_criatura: str, gen_nombre: str, valor: float, costo_ep: float = 5.0):
+        if self.ticks is not None:
+            i = bisect.bisect_left(self.ticks, t) # Primer tick >= t, como ColaPromptsHomeostasis.procesar_hasta
+            if i == len(self.ticks):
+                return # Después del último tick: run_simulation nunca lo aplicaría
+            t = self.ticks[i]
+        self._programar(t, EVENTO_PLAN_HOMEOSTASIS, (nombre_criatura, gen_nombre, valor, costo_ep))
+
+    def _reintentar_homeostasis(self, t: float, *prompt):
+        if self.ticks is None:
+            self.programar_homeostasis(t + self.intervalo_reintento_homeostasis, *prompt)
+        else:
+            i = bisect.bisect_right(self.ticks, t) # Siguiente tick
+            if i < len(self.ticks):
+                self._programar(self.ticks[i], EVENTO_PLAN_HOMEOSTASIS, prompt)
+
+    def programar_observacion(self, t: float, observador: Observador):
+        self._programar(t, EVENTO_PLAN_OBSERVACION, (observador,))
+
+    def programar_observaciones_periodicas(self, intervalo: float, t_fin: float, observador: Observador):
+        """Observación cada `intervalo` hasta t_fin (p.ej. para muestrear un gráfico como run_simulation)."""
+        for k in range(1, math.ceil(round(t_fin / intervalo, 6)) + 1):
+            self.programar_observacion(min(k * intervalo, t_fin), observador)
+
+    def _avanzar_criaturas(self, t: float):
+        """Lleva todas las criaturas vivas a t y retira las que mueran (como actualizar_todas_las_criaturas)."""
+        self.ambiente.actualizar_todas_las_criaturas(t)
+
+    def _retirar(self, c_id: str):
+        criatura = self.ambiente.criaturas.pop(c_id, None)
+        self.ambiente.dias_completados_para_reproduccion_check.pop(c_id, None)
+        if criatura is not None and bus_eventos.oyentes:
+            bus_eventos.emitir(EVENTO_CRIATURA_REMOVIDA, id_usuario=self.ambiente.id_usuario, id=c_id, nombre=criatura.nombre)
+
+    def _procesar_fin_de_dia(self, t: float, c_id: str):
+        criatura = self.ambiente.criaturas.get(c_id)
+        if criatura is None or not criatura.esta_viva:
+            return
+        # El día se cierra al procesar el primer timestep del día siguiente
+        timestep_duration = sim.DIA_EN_SEGUNDOS_SIMULADOS / sim.TIMESTEPS_POR_DIA_SIMULADO
+        criatura.actualizar_estado_hasta(round(t + timestep_duration, 4), self.ambiente.id_usuario)
+        if not criatura.esta_viva:
+            self._retirar(c_id)
+            return
+        self.ambiente.notificar_dia_completado(criatura)
+        self.programar_fin_de_dia(criatura)
+        t_reproduccion = criatura.last_evolution_processed_timestamp
+        if criatura.edad_dias_completos >= 1.0 and t_reproduccion not in self._reproduccion_programada:
+            self._reproduccion_programada.add(t_reproduccion)
+            self._programar(t_reproduccion, EVENTO_PLAN_REPRODUCCION)
+
+    def _procesar_reproduccion(self, t: float):
+        self._reproduccion_programada.discard(t)
+        self._avanzar_criaturas(t)
+        ids_antes = set(self.ambiente.criaturas)
+        self.ambiente.intentar_reproduccion_ambiente(t)
+        for c_id in self.ambiente.criaturas.keys() - ids_antes:
+            self.programar_fin_de_dia(self.ambiente.criaturas[c_id])
+
+    def _procesar_homeostasis(self, t: float, nombre_criatura: str, gen_nombre: str, valor: float, costo_ep: float):
+        if gen_nombre not in sim.GENES_VISIBLES_DEFAULT:
+            return # Nunca podría aplicarse
+        criatura = self.ambiente.buscar_criatura(nombre_criatura)
+        if criatura is None or not criatura.set_homeostasis_target(gen_nombre, valor, t, costo_ep):
+            self._reintentar_homeostasis(t, nombre_criatura, gen_nombre, valor, costo_ep)
+
+    def ejecutar_hasta(self, t_fin: float) -> Dict[str, int]:
+        """Procesa en orden todos los eventos con t <= t_fin. Devuelve el total procesado por tipo."""
+        while self._cola and self._cola[0][0] <= t_fin:
+            t, _, _, tipo, datos = heapq.heappop(self._cola)
+            self.tiempo_actual = t
+            self.eventos_procesados[NOMBRES_EVENTOS_PLAN[tipo]] += 1
+            if tipo in (EVENTO_PLAN_DIA, EVENTO_PLAN_MUERTE):
+                self._procesar_fin_de_dia(t, *datos)
+            elif tipo == EVENTO_PLAN_REPRODUCCION:
+                self._procesar_reproduccion(t)
+            elif tipo == EVENTO_PLAN_HOMEOSTASIS:
+                self._procesar_homeostasis(t, *datos)
+            elif tipo == EVENTO_PLAN_OBSERVACION:
+                self._avanzar_criaturas(t)
+                datos[0](self.ambiente, t)
+        self.tiempo_actual = max(self.tiempo_actual, t_fin)
+        return dict(self.eventos_procesados)
+
+    def proximo_evento(self) -> Optional[Tuple[float, str]]:
+        if not self._cola:
+            return None
+        return self._cola[0][0], NOMBRES_EVENTOS_PLAN[self._cola[0][3]]
+
+
+def run_simulation_por_eventos(id_usuario: str, duracion_total_sim_seg: float,
+                               eventos_programados: List[Tuple[float, str, str, float]] = (),
+                               intervalo_observacion_seg: float = None, observador: Observador = None,
+                               intervalo_actualizacion_seg: float = None) -> Ambiente:
+    """Como run_simulation, pero dirigido por eventos. Si se da un observador, se le llama cada
+    intervalo_observacion_seg con el ambiente actualizado; si no, las criaturas solo avanzan en sus eventos.
+
+    Con intervalo_actualizacion_seg, los prompts se entregan en los ticks de run_simulation con ese intervalo;
+    sin él, en su instante exacto. El estado final coincide con el de run_simulation con el mismo intervalo
+    solo si este cae sobre la rejilla de timesteps y no hay nacimientos (ver el docstring del módulo)."""
+    random.seed(42)
+    ambiente = Ambiente(id_usuario, 0.0)
+    for nombre in ["Sparky", "Blobby", "Zapper", "Wisp", "Glimmer"][:sim.MAX_CRIATURAS_POR_AMBIENTE]:
+        ambiente.crear_y_add_criatura_inicial(nombre, 0.0)
+
+    ticks = instantes_tick(duracion_total_sim_seg, intervalo_actualizacion_seg) if intervalo_actualizacion_seg else None
+    planificador = PlanificadorEventos(ambiente, ticks=ticks)
+    for t_evento, nombre_c, gen_e, val_e in eventos_programados:
+        planificador.programar_homeostasis(t_evento, nombre_c, gen_e, val_e)
+    if observador is not None and intervalo_observacion_seg:
+        planificador.programar_observaciones_periodicas(intervalo_observacion_seg, duracion_total_sim_seg, observador)
+    planificador.ejecutar_hasta(duracion_total_sim_seg)
+    ambiente.actualizar_todas_las_criaturas(duracion_total_sim_seg)
+    return ambiente
@@ -0,0 +1,135 @@
+"""Registro columnar de series temporales de la simulación.
+
+Cada llamada a `registrar` añade una fila por criatura (tiempo, índice de criatura, campos) a
+columnas NumPy preasignadas que crecen por duplicación. Las criaturas se identifican por id, así
+que las crías nacidas durante la simulación se registran igual que las iniciales, sin buscar por
+nombre en cada tick. Los campos pueden ser atributos de Criatura (p.ej. "puntos_evolucion") o
+nombres de genes visibles/ocultos.
+"""
+import operator
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+import numpy as np
+
+from simulation import Criatura, INDICE_GEN_OCULTO, INDICE_GEN_VISIBLE
+
+CAPACIDAD_INICIAL_REGISTRO = 1024 # Filas preasignadas; se duplica al llenarse
+
+
+def _extractor_campo(campo: str) -> Callable[[Criatura], float]:
+    if campo in INDICE_GEN_VISIBLE:
+        return lambda c: c.genes_visibles[campo]
+    if campo in INDICE_GEN_OCULTO:
+        return lambda c: c.genes_ocultos[campo]
+    return operator.attrgetter(campo)
+
+
+class RegistroSeriesTemporales:
+    """Series temporales de campos por criatura en formato largo: una fila por (muestra, criatura).
+
+    cada_n_ticks > 1 solo guarda una de cada n llamadas a registrar (muestreo configurable).
+    """
+
+    def __init__(self, campos: Sequence[str] = ("puntos_evolucion",), cada_n_ticks: int = 1,
+                 capacidad_inicial: int = CAPACIDAD_INICIAL_REGISTRO):
+        if cada_n_ticks < 1:
+            raise ValueError("cada_n_ticks debe ser >= 1")
+        self.campos: List[str] = list(campos)
+        self.cada_n_ticks = cada_n_ticks
+        self._extractores = [_extractor_campo(campo) for campo in self.campos]
+        self._ticks_vistos = 0
+        self.n_filas = 0
+        self._tiempo = np.empty(capacidad_inicial, dtype=np.float64)
+        self._criatura = np.empty(capacidad_inicial, dtype=np.int32)
+        self._valores = np.empty((len(self.campos), capacidad_inicial), dtype=np.float64)
+        self.ids: List[str] = [] # índice de criatura -> id
+        self.nombres: List[str] = []
+        self._indice_por_id: Dict[str, int] = {}
+
+    def _asegurar_capacidad(self, n_nuevas: int):
+        necesaria = self.n_filas + n_nuevas
+        capacidad = len(self._tiempo)
+        if necesaria <= capacidad:
+            return
+        while capacidad < necesaria:
+            capacidad *= 2
+        self._tiempo = np.resize(self._tiempo, capacidad)
+        self._criatura = np.resize(self._criatura, capacidad)
+        valores = np.empty((len(self.campos), capacidad), dtype=np.float64)
+        valores[:, :self.n_filas] = self._valores[:, :self.n_filas]
+        self._valores = valores
+
+    def _indice_criatura(self, criatura: Criatura) -> int:
+        indice = self._indice_por_id.get(criatura.id)
+        if indice is None:
+            indice = self._indice_por_id[criatura.id] = len(self.ids)
+            self.ids.append(criatura.id)
+            self.nombres.append(criatura.nombre)
+        return indice
+
+    def registrar(self, tiempo: float, criaturas: Iterable[Criatura]) -> bool:
+        """Añade una muestra de todas las criaturas dadas. Devuelve False si el muestreo la descartó."""
+        self._ticks_vistos += 1
+        if (self._ticks_vistos - 1) % self.cada_n_ticks:
+            return False
+        criaturas = list(criaturas)
+        n = len(criaturas)
+        self._asegurar_capacidad(n)
+        fin = self.n_filas + n
+        self._tiempo[self.n_filas:fin] = tiempo
+        self._criatura[self.n_filas:fin] = [self._indice_criatura(c) for c in criaturas]
+        for fila, extraer in enumerate(self._extractores):
+            self._valores[fila, self.n_filas:fin] = [extraer(c) for c in criaturas]
+        self.n_filas = fin
+        return True
+
+    def columnas(self) -> Dict[str, np.ndarray]:
+        """Vistas (sin copia) de las columnas registradas hasta ahora."""
+        columnas = {"tiempo": self._tiempo[:self.n_filas], "criatura": self._criatura[:self.n_filas]}
+        for fila, campo in enumerate(self.campos):
+            columnas[campo] = self._valores[fila, :self.n_filas]
+        return columnas
+
+    def serie(self, id_criatura: str, campo: str, max_puntos: int = None) -> Tuple[np.ndarray, np.ndarray]:
+        """(tiempos, valores) de una criatura. Con max_puntos se submuestrea tomando una de cada k filas."""
+        indice = self._indice_por_id[id_criatura]
+        filas = np.flatnonzero(self._criatura[:self.n_filas] == indice)
+        if max_puntos is not None and len(filas) > max_puntos:
+            filas = filas[::-(-len(filas) // max_puntos)]
+        return self._tiempo[filas], self._valores[self.campos.index(campo), filas]
+
+    def series(self, campo: str) -> Dict[str, Tuple[np.ndarray, np.ndarray]]:
+        """Todas las series de un campo de una pasada (orden estable por criatura): id -> (tiempos, valores)."""
+        criatura = self._criatura[:self.n_filas]
+        orden = np.argsort(criatura, kind="stable")
+        cortes = np.searchsorted(criatura[orden], np.arange(len(self.ids) + 1))
+        tiempos = self._tiempo[orden]
+        valores = self._valores[self.campos.index(campo), orden]
+        return {id_c: (tiempos[cortes[i]:cortes[i + 1]], valores[cortes[i]:cortes[i + 1]]) for i, id_c in enumerate(self.ids)}
+
+    def guardar_npz(self, ruta: str, comprimir: bool = True):
+        guardar = np.savez_compressed if comprimir else np.savez
+        guardar(ruta, campos=np.array(self.campos), ids=np.array(self.ids), nombres=np.array(self.nombres),
+                cada_n_ticks=self.cada_n_ticks, **self.columnas())
+
+    @classmethod
+    def cargar_npz(cls, ruta: str) -> "RegistroSeriesTemporales":
+        with np.load(ruta) as datos:
+            registro = cls(datos["campos"].tolist(), int(datos["cada_n_ticks"]), max(1, len(datos["tiempo"])))
+            registro.n_filas = len(datos["tiempo"])
+            registro._tiempo[:] = datos["tiempo"]
+            registro._criatura[:] = datos["criatura"]
+            for fila, campo in enumerate(registro.campos):
+                registro._valores[fila] = datos[campo]
+            registro.ids = datos["ids"].tolist()
+            registro.nombres = datos["nombres"].tolist()
+            registro._indice_por_id = {id_c: i for i, id_c in enumerate(registro.ids)}
+        return registro
+
+    def guardar_parquet(self, ruta: str):
+        """Exporta en formato largo a Parquet (requiere pyarrow, dependencia opcional)."""
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        columnas = self.columnas()
+        columnas["id_criatura"] = np.array(self.ids, dtype=object)[columnas["criatura"]]
+        pq.write_table(pa.table(columnas), ruta)
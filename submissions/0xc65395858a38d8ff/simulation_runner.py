@@ -0,0 +1,233 @@
+"""Runner multi-ambiente: reparte muchos Ambientes (uno por jugador) entre procesos.
+
+Cada proceso worker mantiene residentes los ambientes de su shard, los avanza hasta el
+timestamp pedido (actualización de criaturas + reproducción, como un tick de run_simulation)
+y devuelve solo un delta compacto. Cada ambiente usa su propio estado de `random`, derivado
+de (semilla_base, id_usuario), así que el resultado no depende del número de workers ni del reparto.
+Los workers reciben explícitamente las constantes de simulation del proceso principal
+(simulation_config.constantes_actuales), así que funcionan igual con cualquier método de arranque.
+"""
+import contextlib
+import multiprocessing as mp
+import random
+import time
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from simulation import Ambiente, Criatura, NOMBRES_GENES_OCULTOS, NOMBRES_GENES_VISIBLES
+from simulation_config import configuracion_simulacion, constantes_actuales
+from simulation_eventos import bus_eventos
+
+# Columnas de la matriz de valores de un delta: escalares de la criatura y luego sus genes
+CAMPOS_DELTA = (["puntos_evolucion", "edad_dias_completos", "edad_timesteps_evolutivos_total", "esta_viva",
+                 "last_evolution_processed_timestamp", "last_seed_generation_timestamp"]
+                + NOMBRES_GENES_VISIBLES + NOMBRES_GENES_OCULTOS)
+
+
+def estado_rng_inicial(semilla_base: int, id_usuario: str) -> tuple:
+    """Estado de random propio de un ambiente (random.Random(str) es estable entre procesos)."""
+    return random.Random(f"{semilla_base}-{id_usuario}").getstate()
+
+
+def avanzar_ambiente(ambiente: Ambiente, target_timestamp: float, estado_rng: tuple) -> tuple:
+    """Un tick de run_simulation para un ambiente, con su propio estado de random. Devuelve el nuevo estado."""
+    estado_global = random.getstate()
+    random.setstate(estado_rng)
+    try:
+        ambiente.actualizar_todas_las_criaturas(target_timestamp)
+        ambiente.intentar_reproduccion_ambiente(target_timestamp)
+        return random.getstate()
+    finally:
+        random.setstate(estado_global)
+
+
+def _avanzar_shard(ambientes: List[Ambiente], estados_rng: Dict[str, tuple], target_timestamp: float, silencioso: bool) -> dict:
+    """Avanza un shard y empaqueta lo que cambió en arrays: el delta de todo el shard en un solo mensaje."""
+    ids_criaturas: List[Tuple[str, str]] = []
+    filas: List[list] = []
+    semillas: List[List[int]] = []
+    nuevas: List[Tuple[str, Criatura]] = []
+    eliminadas: List[Tuple[str, str]] = []
+    reproduccion: List[Tuple[str, str, float]] = []
+
+    salida = bus_eventos.silenciado() if silencioso else contextlib.nullcontext()
+    with salida:
+        for ambiente in ambientes:
+            ids_antes = set(ambiente.criaturas)
+            checks_antes = dict(ambiente.dias_completados_para_reproduccion_check)
+            estados_rng[ambiente.id_usuario] = avanzar_ambiente(ambiente, target_timestamp, estados_rng[ambiente.id_usuario])
+
+            eliminadas.extend((ambiente.id_usuario, c_id) for c_id in ids_antes - set(ambiente.criaturas))
+            for c_id, criatura in ambiente.criaturas.items():
+                if c_id not in ids_antes:
+                    nuevas.append((ambiente.id_usuario, criatura))
+                    continue
+                ids_criaturas.append((ambiente.id_usuario, c_id))
+                filas.append([criatura.puntos_evolucion, criatura.edad_dias_completos, criatura.edad_timesteps_evolutivos_total,
+                              criatura.esta_viva, criatura.last_evolution_processed_timestamp, criatura.last_seed_generation_timestamp]
+                             + list(criatura.genes_visibles.values()) + list(criatura.genes_ocultos.values()))
+                semillas.append(criatura.current_daily_random_seeds)
+            for c_id, dia in ambiente.dias_completados_para_reproduccion_check.items():
+                if checks_antes.get(c_id) != dia:
+                    reproduccion.append((ambiente.id_usuario, c_id, dia))
+
+    return {
+        "ids": ids_criaturas,
+        "valores": np.array(filas, dtype=np.float64).reshape(len(filas), len(CAMPOS_DELTA)),
+        "semillas": np.array(semillas, dtype=np.uint64).reshape(len(semillas), 5),
+        "nuevas": nuevas,
+        "eliminadas": eliminadas,
+        "reproduccion": reproduccion,
+    }
+
+
+def aplicar_delta(ambientes_por_id: Dict[str, Ambiente], delta: dict):
+    """Aplica en las copias del proceso principal un delta devuelto por un worker."""
+    for (id_usuario, c_id), valores, semillas in zip(delta["ids"], delta["valores"].tolist(), delta["semillas"].tolist()):
+        criatura = ambientes_por_id[id_usuario].criaturas[c_id]
+        (criatura.puntos_evolucion, criatura.edad_dias_completos, edad_timesteps, viva,
+         criatura.last_evolution_processed_timestamp, criatura.last_seed_generation_timestamp) = valores[:6]
+        criatura.edad_timesteps_evolutivos_total = int(edad_timesteps)
+        criatura.esta_viva = bool(viva)
+        criatura.cargar_genes(valores[6:6 + len(NOMBRES_GENES_VISIBLES)], valores[6 + len(NOMBRES_GENES_VISIBLES):])
+        criatura.current_daily_random_seeds = semillas
+    for id_usuario, c_id in delta["eliminadas"]:
+        ambientes_por_id[id_usuario].criaturas.pop(c_id, None)
+        ambientes_por_id[id_usuario].dias_completados_para_reproduccion_check.pop(c_id, None)
+    for id_usuario, criatura in delta["nuevas"]:
+        ambientes_por_id[id_usuario].criaturas[criatura.id] = criatura
+    for id_usuario, c_id, dia in delta["reproduccion"]:
+        ambientes_por_id[id_usuario].dias_completados_para_reproduccion_check[c_id] = dia
+    for id_usuario in {id_usuario for id_usuario, _ in delta["nuevas"]}:
+        ambientes_por_id[id_usuario].invalidar_indices() # Crías insertadas sin add_criatura
+
+
+def _bucle_worker(conexion, ambientes: List[Ambiente], estados_rng: Dict[str, tuple], silencioso: bool,
+                  constantes: Dict[str, object]):
+    with configuracion_simulacion(**constantes):
+        while True:
+            orden, argumento = conexion.recv()
+            if orden == "avanzar":
+                conexion.send(_avanzar_shard(ambientes, estados_rng, argumento, silencioso))
+            elif orden == "estado":
+                conexion.send((ambientes, estados_rng))
+            elif orden == "cerrar":
+                conexion.close()
+                return
+
+
+class RunnerMultiAmbiente:
+    """Pool de procesos con los ambientes repartidos en shards residentes.
+
+    Con n_workers=0 todo se ejecuta en el proceso actual (mismo resultado, útil para depurar y comparar).
+    """
+
+    def __init__(self, ambientes: Sequence[Ambiente], n_workers: int = None, semilla_base: int = 42, silencioso: bool = True,
+                 estados_rng: Dict[str, tuple] = None):
+        self.ambientes_por_id: Dict[str, Ambiente] = {a.id_usuario: a for a in ambientes}
+        self.n_workers = mp.cpu_count() if n_workers is None else n_workers
+        self.silencioso = silencioso
+        self.estados_rng = {a.id_usuario: estado_rng_inicial(semilla_base, a.id_usuario) for a in ambientes}
+        if estados_rng is not None: # Reanudación desde checkpoint
+            self.estados_rng.update(estados_rng)
+        self._conexiones = []
+        self._procesos = []
+        if self.n_workers > 0:
+            constantes = constantes_actuales()
+            shards = [list(ambientes)[i::self.n_workers] for i in range(self.n_workers)]
+            for shard in shards:
+                extremo_padre, extremo_hijo = mp.Pipe()
+                proceso = mp.Process(target=_bucle_worker, daemon=True,
+                                     args=(extremo_hijo, shard, {a.id_usuario: self.estados_rng[a.id_usuario] for a in shard}, silencioso,
+                                           constantes))
+                proceso.start()
+                extremo_hijo.close()
+                self._conexiones.append(extremo_padre)
+                self._procesos.append(proceso)
+
+    def avanzar_hasta(self, target_timestamp: float) -> Dict[str, float]:
+        """Avanza todos los ambientes a target_timestamp. Devuelve métricas de rendimiento del paso."""
+        inicio = time.perf_counter()
+        if self.n_workers == 0:
+            deltas = [_avanzar_shard(list(self.ambientes_por_id.values()), self.estados_rng, target_timestamp, self.silencioso)]
+        else:
+            for conexion in self._conexiones:
+                conexion.send(("avanzar", target_timestamp))
+            deltas = [conexion.recv() for conexion in self._conexiones]
+            for delta in deltas:
+                aplicar_delta(self.ambientes_por_id, delta)
+        segundos = time.perf_counter() - inicio
+        n_ambientes = len(self.ambientes_por_id)
+        return {
+            "ambientes": n_ambientes,
+            "criaturas": sum(len(d["ids"]) + len(d["nuevas"]) for d in deltas),
+            "segundos": segundos,
+            "ambientes_por_segundo": n_ambientes / segundos if segundos > 0 else float("inf"),
+        }
+
+    def sincronizar_estado_completo(self):
+        """Trae de los workers los ambientes completos y sus estados de random (p.ej. para checkpoints)."""
+        for conexion in self._conexiones:
+            conexion.send(("estado", None))
+        for conexion in self._conexiones:
+            ambientes, estados_rng = conexion.recv()
+            for ambiente in ambientes:
+                self.ambientes_por_id[ambiente.id_usuario] = ambiente
+            self.estados_rng.update(estados_rng)
+
+    def guardar_checkpoint(self, ruta: str):
+        """Checkpoint de todos los ambientes con sus estados de random (ver simulation_checkpoint)."""
+        from simulation_checkpoint import guardar_checkpoint
+        self.sincronizar_estado_completo()
+        guardar_checkpoint(ruta, list(self.ambientes_por_id.values()), self.estados_rng)
+
+    @classmethod
+    def desde_checkpoint(cls, ruta: str, n_workers: int = None, silencioso: bool = True) -> "RunnerMultiAmbiente":
+        from simulation_checkpoint import cargar_checkpoint
+        ambientes, estados_rng = cargar_checkpoint(ruta, restaurar_rng_global=False)
+        return cls(ambientes, n_workers=n_workers, silencioso=silencioso, estados_rng=estados_rng)
+
+    def cerrar(self):
+        for conexion in self._conexiones:
+            conexion.send(("cerrar", None))
+        for proceso in self._procesos:
+            proceso.join()
+        self._conexiones, self._procesos = [], []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.cerrar()
+
+
+def crear_ambiente(id_usuario: str, current_sim_time: float = 0.0, semilla_base: int = 42) -> Ambiente:
+    """Ambiente con las criaturas iniciales, generado con un random propio (sin tocar el estado global)."""
+    nombres_iniciales = ["Sparky", "Blobby", "Zapper", "Wisp", "Glimmer"]
+    estado_global = random.getstate()
+    try:
+        random.seed(f"{semilla_base}-creacion-{id_usuario}")
+        ambiente = Ambiente(id_usuario, current_sim_time)
+        for nombre in nombres_iniciales[:ambiente.max_criaturas]:
+            ambiente.crear_y_add_criatura_inicial(nombre, current_sim_time)
+        return ambiente
+    finally:
+        random.setstate(estado_global)
+
+
+def crear_ambientes(n_ambientes: int, current_sim_time: float = 0.0, semilla_base: int = 42) -> List[Ambiente]:
+    """Ambientes de prueba con las criaturas iniciales, cada uno generado con su propio estado de random."""
+    with bus_eventos.silenciado():
+        return [crear_ambiente(f"jugador_{i:06d}", current_sim_time, semilla_base) for i in range(n_ambientes)]
+
+
+if __name__ == "__main__":
+    import simulation
+    ambientes = crear_ambientes(2000)
+    intervalo = simulation.DIA_EN_SEGUNDOS_SIMULADOS / 4
+    with RunnerMultiAmbiente(ambientes) as runner:
+        for paso in range(1, 9):
+            metricas = runner.avanzar_hasta(paso * intervalo)
+            print(f"t={paso * intervalo:.2f}s: {metricas['ambientes']} ambientes, {metricas['criaturas']} criaturas "
+                  f"en {metricas['segundos']:.2f}s ({metricas['ambientes_por_segundo']:.0f} ambientes/s)")
@@ -0,0 +1,312 @@
+"""Servicio HTTP (asyncio, solo biblioteca estándar) que sirve ambientes puestos al día bajo demanda.
+
+- Los ambientes calientes viven en memoria en un LRU de tamaño acotado. Al pedir uno, se avanza
+  perezosamente desde su último instante hasta "ahora" (reloj real * escala_tiempo), con los mismos
+  pasos de run_simulation (actualizar + reproducción cada intervalo_actualizacion_seg).
+- Los que salen del LRU se guardan como checkpoint binario (simulation_checkpoint), uno por ambiente,
+  con su estado de random propio, y se restauran al volver a pedirlos. Los que no existen se crean.
+- Las peticiones concurrentes del mismo ambiente se agrupan: una ráfaga provoca una sola puesta al día
+  y todas reciben la misma instantánea.
+- Todo el trabajo de simulación se hace en un único hilo aparte, en orden de llegada: el bucle de
+  asyncio sigue atendiendo conexiones y el estado global de random nunca se usa en paralelo.
+
+Rutas:
+    GET  /ambientes/{id_usuario}                      -> instantánea del ambiente
+    GET  /ambientes/{id_usuario}/criaturas/{id}       -> una criatura
+    POST /ambientes/{id_usuario}/homeostasis          -> {"criatura": nombre, "gen": ..., "valor": ..., "costo_ep": 5.0}
+    GET  /estado                                      -> estadísticas del servicio
+
+Uso:
+    python simulation_servicio.py --directorio ambientes/ --puerto 8080 --max-ambientes 10000
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import re
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Tuple
+
+import simulation as sim
+from simulation import Ambiente, Criatura
+from simulation_checkpoint import cargar_checkpoint, guardar_checkpoint
+from simulation_eventos import bus_eventos
+from simulation_runner import avanzar_ambiente, crear_ambiente, estado_rng_inicial
+
+MAX_AMBIENTES_EN_MEMORIA_DEFAULT = 1000
+EXTENSION_AMBIENTE = ".ckpt"
+ARCHIVO_METADATOS = "servicio.json"
+PATRON_ID_USUARIO = re.compile(r"^[A-Za-z0-9_-]{1,64}$") # También es el nombre de archivo en disco
+MAX_CUERPO_PETICION = 64 * 1024
+
+
+class ErrorPeticion(Exception):
+    def __init__(self, estado: int, mensaje: str):
+        super().__init__(mensaje)
+        self.estado = estado
+
+
+def describir_criatura(criatura: Criatura) -> Dict:
+    return {"id": criatura.id, "nombre": criatura.nombre, "esta_viva": criatura.esta_viva,
+            "edad_dias": criatura.edad_dias_completos, "puntos_evolucion": criatura.puntos_evolucion,
+            "genes_visibles": dict(criatura.genes_visibles), "objetivos_homeostasis": dict(criatura.homeostasis_targets)}
+
+
+def describir_ambiente(ambiente: Ambiente, t: float) -> Dict:
+    return {"id_usuario": ambiente.id_usuario, "t": t, "dias": t / sim.DIA_EN_SEGUNDOS_SIMULADOS,
+            "max_criaturas": ambiente.max_criaturas,
+            "criaturas": [describir_criatura(c) for c in ambiente.criaturas.values()]}
+
+
+class ServicioSimulacion:
+    """Ambientes bajo demanda: LRU en memoria, almacén en disco y puestas al día agrupadas por ambiente."""
+
+    def __init__(self, directorio: str, max_ambientes_en_memoria: int = MAX_AMBIENTES_EN_MEMORIA_DEFAULT,
+                 escala_tiempo: float = 1.0, intervalo_actualizacion_seg: float = None, semilla_base: int = 42,
+                 reloj: Callable[[], float] = time.time, silencioso: bool = True):
+        if max_ambientes_en_memoria < 1:
+            raise ValueError("max_ambientes_en_memoria debe ser >= 1")
+        self.directorio = directorio
+        self.max_ambientes_en_memoria = max_ambientes_en_memoria
+        self.escala_tiempo = escala_tiempo
+        self.intervalo_actualizacion_seg = (sim.DIA_EN_SEGUNDOS_SIMULADOS / 4 if intervalo_actualizacion_seg is None
+                                            else intervalo_actualizacion_seg)
+        self.semilla_base = semilla_base
+        self.reloj = reloj
+        self.silencioso = silencioso
+        os.makedirs(directorio, exist_ok=True)
+        self.origen_real = self._cargar_origen()
+
+        self._en_memoria: "OrderedDict[str, Ambiente]" = OrderedDict() # Del menos al más recientemente usado
+        self._t_ambiente: Dict[str, float] = {}
+        self._estados_rng: Dict[str, tuple] = {}
+        self._puestas_al_dia: Dict[str, asyncio.Future] = {}
+        self._desalojos: Dict[str, asyncio.Future] = {}
+        self._hilo = ThreadPoolExecutor(max_workers=1, thread_name_prefix="simulacion")
+        self.estadisticas = {"peticiones": 0, "agrupadas": 0, "aciertos_memoria": 0, "restaurados": 0,
+                             "creados": 0, "desalojados": 0, "pasos_simulados": 0}
+
+    def _cargar_origen(self) -> float:
+        """Instante real que corresponde a t=0 simulado; se guarda para que sobreviva a reinicios."""
+        ruta = os.path.join(self.directorio, ARCHIVO_METADATOS)
+        if os.path.exists(ruta):
+            with open(ruta) as archivo:
+                return json.load(archivo)["origen_real"]
+        origen = self.reloj()
+        with open(ruta, "w") as archivo:
+            json.dump({"origen_real": origen}, archivo)
+        return origen
+
+    def tiempo_simulado(self) -> float:
+        return round((self.reloj() - self.origen_real) * self.escala_tiempo, 4)
+
+    def _ruta(self, id_usuario: str) -> str:
+        return os.path.join(self.directorio, id_usuario + EXTENSION_AMBIENTE)
+
+    async def _en_hilo(self, funcion, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._hilo, funcion, *args)
+
+    # --- Trabajo en el hilo de simulación ---
+
+    def _cargar_o_crear(self, id_usuario: str, t: float) -> Tuple[Ambiente, float, tuple]:
+        ruta = self._ruta(id_usuario)
+        if os.path.exists(ruta):
+            ambientes, estados_rng = cargar_checkpoint(ruta, restaurar_rng_global=False)
+            ambiente = ambientes[0]
+            # Tras cada paso todas las criaturas que siguen en el ambiente quedan en el instante del paso
+            t_ambiente = max((c.last_evolution_processed_timestamp for c in ambiente.criaturas.values()), default=t)
+            self.estadisticas["restaurados"] += 1
+            return ambiente, t_ambiente, estados_rng[id_usuario]
+        with bus_eventos.silenciado() if self.silencioso else contextlib.nullcontext():
+            ambiente = crear_ambiente(id_usuario, t, self.semilla_base)
+        self.estadisticas["creados"] += 1
+        return ambiente, t, estado_rng_inicial(self.semilla_base, id_usuario)
+
+    def _avanzar(self, id_usuario: str, ambiente: Ambiente, t_destino: float) -> Dict:
+        """Pasos de run_simulation desde el último instante del ambiente hasta t_destino; devuelve la instantánea."""
+        t = self._t_ambiente[id_usuario]
+        with bus_eventos.silenciado() if self.silencioso else contextlib.nullcontext():
+            while t < t_destino:
+                t = min(round(t + self.intervalo_actualizacion_seg, 4), t_destino)
+                self._estados_rng[id_usuario] = avanzar_ambiente(ambiente, t, self._estados_rng[id_usuario])
+                self.estadisticas["pasos_simulados"] += 1
+        self._t_ambiente[id_usuario] = t
+        return describir_ambiente(ambiente, t)
+
+    def _guardar(self, id_usuario: str, ambiente: Ambiente, estado_rng: tuple):
+        ruta = self._ruta(id_usuario)
+        temporal = ruta + ".tmp"
+        guardar_checkpoint(temporal, [ambiente], {id_usuario: estado_rng})
+        os.replace(temporal, ruta) # Un corte a mitad de escritura no deja un checkpoint a medias
+
+    def _homeostasis(self, ambiente: Ambiente, t: float, nombre_criatura: str, gen: str, valor: float, costo_ep: float) -> Dict:
+        criatura = ambiente.buscar_criatura(nombre_criatura)
+        if criatura is None:
+            raise ErrorPeticion(404, f"No hay ninguna criatura viva llamada '{nombre_criatura}'")
+        with bus_eventos.silenciado() if self.silencioso else contextlib.nullcontext():
+            aplicada = criatura.set_homeostasis_target(gen, valor, t, costo_ep)
+        return {"aplicada": aplicada, "criatura": describir_criatura(criatura)}
+
+    # --- Coordinación (bucle de asyncio) ---
+
+    async def obtener_ambiente(self, id_usuario: str) -> Dict:
+        """Instantánea del ambiente puesto al día. Las peticiones simultáneas comparten una sola puesta al día."""
+        if not PATRON_ID_USUARIO.match(id_usuario):
+            raise ErrorPeticion(400, "id_usuario inválido")
+        self.estadisticas["peticiones"] += 1
+        tarea = self._puestas_al_dia.get(id_usuario)
+        if tarea is not None:
+            self.estadisticas["agrupadas"] += 1
+        else:
+            tarea = self._puestas_al_dia[id_usuario] = asyncio.ensure_future(self._poner_al_dia(id_usuario))
+            tarea.add_done_callback(lambda _: self._puestas_al_dia.pop(id_usuario, None))
+        return await asyncio.shield(tarea)
+
+    async def _poner_al_dia(self, id_usuario: str) -> Dict:
+        desalojo = self._desalojos.get(id_usuario)
+        if desalojo is not None:
+            await desalojo # Que termine de escribirse antes de leerlo
+        t_destino = self.tiempo_simulado()
+        ambiente = self._en_memoria.get(id_usuario)
+        if ambiente is None:
+            ambiente, self._t_ambiente[id_usuario], self._estados_rng[id_usuario] = await self._en_hilo(
+                self._cargar_o_crear, id_usuario, t_destino)
+            self._en_memoria[id_usuario] = ambiente
+        else:
+            self.estadisticas["aciertos_memoria"] += 1
+            self._en_memoria.move_to_end(id_usuario)
+        instantanea = await self._en_hilo(self._avanzar, id_usuario, ambiente, t_destino)
+        self._desalojar_sobrantes()
+        return instantanea
+
+    def _desalojar_sobrantes(self):
+        """Manda a disco los menos usados hasta volver al límite (nunca uno con una puesta al día en curso)."""
+        sobrantes = len(self._en_memoria) - self.max_ambientes_en_memoria
+        for id_usuario in [i for i in self._en_memoria if i not in self._puestas_al_dia][:max(0, sobrantes)]:
+            ambiente = self._en_memoria.pop(id_usuario)
+            self._t_ambiente.pop(id_usuario)
+            tarea = self._desalojos[id_usuario] = asyncio.ensure_future(
+                self._en_hilo(self._guardar, id_usuario, ambiente, self._estados_rng.pop(id_usuario)))
+            tarea.add_done_callback(lambda _, i=id_usuario: self._desalojos.pop(i, None))
+            self.estadisticas["desalojados"] += 1
+
+    async def obtener_criatura(self, id_usuario: str, id_criatura: str) -> Dict:
+        instantanea = await self.obtener_ambiente(id_usuario)
+        for criatura in instantanea["criaturas"]:
+            if criatura["id"] == id_criatura:
+                return criatura
+        raise ErrorPeticion(404, f"No hay ninguna criatura '{id_criatura}' en el ambiente")
+
+    async def aplicar_homeostasis(self, id_usuario: str, nombre_criatura: str, gen: str, valor: float,
+                                  costo_ep: float = 5.0) -> Dict:
+        """Pone el ambiente al día y fija el objetivo de homeostasis en ese instante."""
+        while True:
+            instantanea = await self.obtener_ambiente(id_usuario)
+            ambiente = self._en_memoria.get(id_usuario)
+            if ambiente is not None: # Si no, lo desalojó otra petición entretanto: se vuelve a traer
+                # Se encola sin ceder el bucle: un desalojo posterior se escribirá ya con el objetivo aplicado
+                return await self._en_hilo(self._homeostasis, ambiente, instantanea["t"], nombre_criatura, gen, valor, costo_ep)
+
+    async def cerrar(self):
+        """Espera lo pendiente y guarda en disco todos los ambientes en memoria."""
+        await asyncio.gather(*self._puestas_al_dia.values(), *self._desalojos.values(), return_exceptions=True)
+        while self._en_memoria:
+            id_usuario, ambiente = self._en_memoria.popitem(last=False)
+            await self._en_hilo(self._guardar, id_usuario, ambiente, self._estados_rng.pop(id_usuario))
+        self._hilo.shutdown(wait=True)
+
+    def estado(self) -> Dict:
+        return {**self.estadisticas, "en_memoria": len(self._en_memoria), "t": self.tiempo_simulado()}
+
+    # --- HTTP ---
+
+    async def _despachar(self, metodo: str, ruta: str, cuerpo: bytes) -> Dict:
+        partes = [p for p in ruta.split("?")[0].split("/") if p]
+        if metodo == "GET" and partes == ["estado"]:
+            return self.estado()
+        if len(partes) >= 2 and partes[0] == "ambientes":
+            id_usuario = partes[1]
+            if metodo == "GET" and len(partes) == 2:
+                return await self.obtener_ambiente(id_usuario)
+            if metodo == "GET" and len(partes) == 4 and partes[2] == "criaturas":
+                return await self.obtener_criatura(id_usuario, partes[3])
+            if metodo == "POST" and len(partes) == 3 and partes[2] == "homeostasis":
+                try:
+                    datos = json.loads(cuerpo or b"{}")
+                    return await self.aplicar_homeostasis(id_usuario, datos["criatura"], datos["gen"], float(datos["valor"]),
+                                                          float(datos.get("costo_ep", 5.0)))
+                except (ValueError, KeyError, TypeError) as error:
+                    raise ErrorPeticion(400, f"Cuerpo inválido: {error}")
+        raise ErrorPeticion(404, f"Ruta no encontrada: {metodo} {ruta}")
+
+    async def _atender(self, lector: asyncio.StreamReader, escritor: asyncio.StreamWriter):
+        try:
+            linea = (await lector.readline()).decode("latin-1").split()
+            cabeceras = {}
+            while (cabecera := await lector.readline()) not in (b"\r\n", b"\n", b""):
+                nombre, _, valor = cabecera.decode("latin-1").partition(":")
+                cabeceras[nombre.strip().lower()] = valor.strip()
+            try:
+                if len(linea) < 2:
+                    raise ErrorPeticion(400, "Petición mal formada")
+                try:
+                    longitud = int(cabeceras.get("content-length", 0))
+                except ValueError:
+                    raise ErrorPeticion(400, "Content-Length no válido") from None
+                if longitud < 0:
+                    raise ErrorPeticion(400, "Content-Length no válido")
+                if longitud > MAX_CUERPO_PETICION:
+                    raise ErrorPeticion(413, "Cuerpo demasiado grande")
+                cuerpo = await lector.readexactly(longitud) if longitud else b""
+                estado, respuesta = 200, await self._despachar(linea[0].upper(), linea[1], cuerpo)
+            except ErrorPeticion as error:
+                estado, respuesta = error.estado, {"error": str(error)}
+            await self._responder(escritor, estado, respuesta)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except Exception: # Un fallo inesperado no debe dejar la conexión colgada sin respuesta
+            with contextlib.suppress(Exception):
+                await self._responder(escritor, 500, {"error": "Error interno"})
+        finally:
+            escritor.close()
+
+    @staticmethod
+    async def _responder(escritor: asyncio.StreamWriter, estado: int, respuesta: Dict):
+        datos = json.dumps(respuesta).encode("utf-8")
+        escritor.write(f"HTTP/1.1 {estado} {_RAZONES.get(estado, '')}\r\nContent-Type: application/json\r\n"
+                       f"Content-Length: {len(datos)}\r\nConnection: close\r\n\r\n".encode("latin-1") + datos)
+        await escritor.drain()
+
+    async def servir(self, host: str = "127.0.0.1", puerto: int = 8080):
+        servidor = await asyncio.start_server(self._atender, host, puerto)
+        try:
+            async with servidor:
+                await servidor.serve_forever()
+        finally:
+            await self.cerrar()
+
+
+_RAZONES = {200: "OK", 400: "Bad Request", 404: "Not Found", 413: "Payload Too Large", 500: "Internal Server Error"}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--directorio", default="ambientes")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--puerto", type=int, default=8080)
+    parser.add_argument("--max-ambientes", type=int, default=MAX_AMBIENTES_EN_MEMORIA_DEFAULT)
+    parser.add_argument("--escala-tiempo", type=float, default=1.0, help="Segundos simulados por segundo real")
+    args = parser.parse_args()
+    servicio = ServicioSimulacion(args.directorio, args.max_ambientes, args.escala_tiempo)
+    print(f"Sirviendo ambientes de {args.directorio} en http://{args.host}:{args.puerto}")
+    try:
+        asyncio.run(servicio.servir(args.host, args.puerto))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,265 @@
+"""Motor de población vectorizado para simulation.py.
+
+Guarda todas las criaturas de uno o varios Ambientes como columnas NumPy (struct-of-arrays)
+y avanza la población completa timestep a timestep con operaciones en lote. Reproduce
+exactamente Criatura.actualizar_estado_hasta: mismo orden de operaciones en coma flotante,
+mismos hashes FNV y mismo consumo del generador `random` para las semillas diarias.
+"""
+from typing import Iterable, List, Sequence
+
+import numpy as np
+
+import simulation as sim
+from simulation_eventos import EVENTO_CRIATURA_REMOVIDA, EVENTO_MUERTE, bus_eventos
+from simulation_hashing import estado_prefijo, pseudo_rand
+from simulation import (Ambiente, Criatura, GENES_OCULTOS_DEFAULT, GENES_OCULTOS_ESTATICOS, GENES_VISIBLES_DEFAULT,
+                        NOMBRES_GENES_OCULTOS, NOMBRES_GENES_VISIBLES)
+
+IDX_POTENCIAL = NOMBRES_GENES_OCULTOS.index("potencialEvolutivo")
+IDX_TAMAÑO = NOMBRES_GENES_VISIBLES.index("tamañoBase")
+IDX_FORMA = NOMBRES_GENES_VISIBLES.index("formaPrincipal")
+IDX_APENDICES = NOMBRES_GENES_VISIBLES.index("numApendices")
+
+# Límites precalculados por gen (en el mismo orden que las columnas)
+MIN_VISIBLES = [GENES_VISIBLES_DEFAULT[g][0] for g in NOMBRES_GENES_VISIBLES]
+MAX_VISIBLES = [GENES_VISIBLES_DEFAULT[g][1] for g in NOMBRES_GENES_VISIBLES]
+ENTERO_VISIBLES = [isinstance(GENES_VISIBLES_DEFAULT[g][0], int) for g in NOMBRES_GENES_VISIBLES]
+MIN_OCULTOS = [GENES_OCULTOS_DEFAULT[g][0] for g in NOMBRES_GENES_OCULTOS]
+MAX_OCULTOS = [GENES_OCULTOS_DEFAULT[g][1] for g in NOMBRES_GENES_OCULTOS]
+
+
+def _redondear_4(valores: np.ndarray) -> np.ndarray:
+    """Equivalente exacto a round(x, 4) de Python elemento a elemento."""
+    redondeados = np.round(valores, 4)
+    # np.round escala por 1e4 y usa rint: solo puede diferir de round() cerca de un empate .5
+    escalados = valores * 1e4
+    dudosos = np.abs(escalados - np.floor(escalados) - 0.5) < 1e-6
+    if dudosos.any():
+        redondeados[dudosos] = [round(v, 4) for v in valores[dudosos].tolist()]
+    return redondeados
+
+
+class PoblacionVectorizada:
+    """Población de criaturas en columnas float64 (una por gen), avanzada en lote.
+
+    El orden de carga importa: avanzar_hasta consume las semillas diarias en el mismo orden
+    en que lo haría llamar a actualizar_estado_hasta criatura por criatura en ese orden.
+    """
+
+    def __init__(self, criaturas: Sequence[Criatura]):
+        self.criaturas: List[Criatura] = list(criaturas)
+        n = len(self.criaturas)
+        cs = self.criaturas
+
+        self.genes_visibles = np.array([[c.genes_visibles[g] for c in cs] for g in NOMBRES_GENES_VISIBLES], dtype=np.float64).reshape(len(NOMBRES_GENES_VISIBLES), n)
+        self.genes_ocultos = np.array([[c.genes_ocultos[g] for c in cs] for g in NOMBRES_GENES_OCULTOS], dtype=np.float64).reshape(len(NOMBRES_GENES_OCULTOS), n)
+        self.objetivos_homeostasis = np.array([[c.homeostasis_targets.get(g, 0.0) for c in cs] for g in NOMBRES_GENES_VISIBLES], dtype=np.float64).reshape(len(NOMBRES_GENES_VISIBLES), n)
+        self.tiene_objetivo = np.array([[g in c.homeostasis_targets for c in cs] for g in NOMBRES_GENES_VISIBLES], dtype=bool).reshape(len(NOMBRES_GENES_VISIBLES), n)
+
+        self.puntos_evolucion = np.array([c.puntos_evolucion for c in cs], dtype=np.float64)
+        self.edad_dias = np.array([c.edad_dias_completos for c in cs], dtype=np.float64)
+        self.edad_timesteps = np.array([c.edad_timesteps_evolutivos_total for c in cs], dtype=np.int64)
+        self.lifespan_total_dias = np.array([c.lifespan_total_dias for c in cs], dtype=np.float64)
+        self.viva = np.array([c.esta_viva for c in cs], dtype=bool)
+        self.t_procesado = np.array([c.last_evolution_processed_timestamp for c in cs], dtype=np.float64)
+        self.t_semillas = np.array([c.last_seed_generation_timestamp for c in cs], dtype=np.float64)
+        self.semillas = np.array([c.current_daily_random_seeds for c in cs], dtype=np.uint64).reshape(n, 5).T.copy()
+
+        # Derivados de las semillas, recalculados solo cuando cambian (una vez por día)
+        self.volatilidad = np.empty(n, dtype=np.float64)
+        self.boost_homeostasis = np.empty(n, dtype=np.float64)
+        self.estado_r1 = np.empty(n, dtype=np.uint64)
+        self.estado_r3 = np.empty(n, dtype=np.uint64)
+        self._refrescar_derivados_semillas(np.arange(n))
+
+    @classmethod
+    def desde_ambientes(cls, ambientes: Iterable[Ambiente]) -> "PoblacionVectorizada":
+        """Carga las criaturas de varios ambientes, en el orden en que los recorrería el bucle por criatura."""
+        return cls([c for ambiente in ambientes for c in ambiente.criaturas.values()])
+
+    def __len__(self) -> int:
+        return len(self.criaturas)
+
+    def _refrescar_derivados_semillas(self, sel: np.ndarray):
+        R0, R1, R2, R3 = self.semillas[0, sel], self.semillas[1, sel], self.semillas[2, sel], self.semillas[3, sel]
+        self.volatilidad[sel] = 0.5 + ((R0 % np.uint64(1000)).astype(np.float64) / 999.0)
+        self.boost_homeostasis[sel] = 0.8 + ((R2 % np.uint64(1000)).astype(np.float64) / 999.0) * 0.4
+        self.estado_r1[sel] = estado_prefijo(R1, sim.MODO_HASH_GENES)
+        self.estado_r3[sel] = estado_prefijo(R3, sim.MODO_HASH_GENES)
+
+    def _pseudo_rand(self, estados: np.ndarray, timesteps: np.ndarray, gene_idx: int) -> np.ndarray:
+        """simple_hash(f"{semilla}-{timestep_in_day}-{gene_idx}") % 10000 para toda la selección (según sim.MODO_HASH_GENES)."""
+        n_genes = len(NOMBRES_GENES_VISIBLES) + len(NOMBRES_GENES_OCULTOS)
+        return pseudo_rand(estados, timesteps, gene_idx, sim.TIMESTEPS_POR_DIA_SIMULADO, n_genes, sim.MODO_HASH_GENES).astype(np.float64)
+
+    def _evolucion_un_timestep(self, sel: np.ndarray):
+        """Equivalente en lote de Criatura._evolucion_un_timestep para las criaturas de `sel`."""
+        timesteps = self.edad_timesteps[sel] % sim.TIMESTEPS_POR_DIA_SIMULADO
+        potencial = self.genes_ocultos[IDX_POTENCIAL, sel]
+        volatilidad = self.volatilidad[sel]
+        boost = self.boost_homeostasis[sel]
+        estado_r1 = self.estado_r1[sel]
+        estado_r3 = self.estado_r3[sel]
+
+        # 1. Ganancia de EP
+        factor_edad = 1.0 + (self.edad_dias[sel] * 0.1)
+        ep_ganancia_base = potencial * sim.FACTOR_GANANCIA_EP_POR_TIMESTEP * 10.0
+        self.puntos_evolucion[sel] += ep_ganancia_base * factor_edad * volatilidad
+
+        # 2. Genes visibles (homeostasis y pasiva)
+        for gene_idx in range(len(NOMBRES_GENES_VISIBLES)):
+            factor_cambio_pasivo_norm = (self._pseudo_rand(estado_r1, timesteps, gene_idx) / 9999.0) - 0.5
+            efectividad_timestep_homeo = 0.8 + (self._pseudo_rand(estado_r3, timesteps, gene_idx) / 9999.0) * 0.4
+
+            actual = self.genes_visibles[gene_idx, sel]
+            diferencia = self.objetivos_homeostasis[gene_idx, sel] - actual
+            cambio_base = diferencia * sim.TASA_APRENDIZAJE_HOMEOSTASIS_BASE * potencial
+            cambio_homeo = cambio_base * efectividad_timestep_homeo * boost
+            cambio_pasivo = factor_cambio_pasivo_norm * sim.TASA_EVOLUCION_PASIVA_GEN_BASE * potencial * volatilidad
+            nuevo = actual + np.where(self.tiene_objetivo[gene_idx, sel], cambio_homeo, cambio_pasivo)
+            if ENTERO_VISIBLES[gene_idx]:
+                nuevo = np.round(nuevo) # Mismo redondeo al par que round()
+            self.genes_visibles[gene_idx, sel] = np.maximum(MIN_VISIBLES[gene_idx], np.minimum(nuevo, MAX_VISIBLES[gene_idx]))
+
+        # 3. Genes ocultos con influencias para combate
+        min_tb, max_tb = GENES_VISIBLES_DEFAULT["tamañoBase"]
+        tamaño = self.genes_visibles[IDX_TAMAÑO, sel]
+        norm_tamaño_base = (tamaño - min_tb) / (max_tb - min_tb) if (max_tb - min_tb) != 0 else np.full_like(tamaño, 0.5)
+        tend_tamaño_norm_factor = (norm_tamaño_base - 0.5) * 2
+
+        min_na, max_na = GENES_VISIBLES_DEFAULT["numApendices"]
+        apendices_actuales = self.genes_visibles[IDX_APENDICES, sel]
+        norm_num_apendices = (apendices_actuales - min_na) / (max_na - min_na) if (max_na - min_na) != 0 else np.full_like(apendices_actuales, 0.5)
+        forma_actual = self.genes_visibles[IDX_FORMA, sel]
+
+        offset_idx_oculto = len(NOMBRES_GENES_VISIBLES)
+        for gene_idx_oculto, gen_nombre_oculto in enumerate(NOMBRES_GENES_OCULTOS):
+            if gen_nombre_oculto in GENES_OCULTOS_ESTATICOS:
+                continue
+
+            factor_cambio_pasivo_norm_oculto = (self._pseudo_rand(estado_r1, timesteps, offset_idx_oculto + gene_idx_oculto) / 9999.0) - 0.5
+            cambio_total_oculto = factor_cambio_pasivo_norm_oculto * sim.TASA_EVOLUCION_PASIVA_GEN_BASE * potencial * volatilidad
+
+            modificador = sim.modificador_influencia_combate(gen_nombre_oculto, forma_actual, tend_tamaño_norm_factor, norm_num_apendices, apendices_actuales)
+            if modificador is not None:
+                cambio_total_oculto = cambio_total_oculto + modificador * sim.FACTOR_INFLUENCIA_VISUAL_SOBRE_COMBATE * potencial * volatilidad
+
+            nuevo = self.genes_ocultos[gene_idx_oculto, sel] + cambio_total_oculto
+            self.genes_ocultos[gene_idx_oculto, sel] = np.maximum(MIN_OCULTOS[gene_idx_oculto], np.minimum(nuevo, MAX_OCULTOS[gene_idx_oculto]))
+
+        self.edad_timesteps[sel] += 1
+
+    def _contar_cruces_de_dia(self, sel: np.ndarray, target_timestamp: float, dia: float, timestep_duration: float) -> np.ndarray:
+        """Recorre solo el reloj (sin genes) para saber cuántos días nuevos cruzará cada criatura antes de morir."""
+        actual = self.t_procesado[sel].copy()
+        t_semillas = self.t_semillas[sel].copy()
+        edad = self.edad_dias[sel].copy()
+        lifespan = self.lifespan_total_dias[sel]
+        cruces = np.zeros(sel.size, dtype=np.int64)
+
+        activas = np.arange(sel.size)
+        while activas.size:
+            cruza = actual[activas] >= t_semillas[activas] + dia
+            if cruza.any():
+                c = activas[cruza]
+                t_semillas[c] += dia
+                edad[c] += 1
+                cruces[c] += 1
+                activas = activas[~np.isin(activas, c[edad[c] >= lifespan[c]])]
+            actual[activas] = _redondear_4(actual[activas] + timestep_duration)
+            activas = activas[actual[activas] < target_timestamp]
+        return cruces
+
+    def _procesar_fin_dia_eventos(self, sel: np.ndarray):
+        R4_semilla_evento = self.semillas[4, sel]
+        ep_modifier_factor = ((R4_semilla_evento % np.uint64(1000)).astype(np.float64) / 999.0) - 0.5
+        ep = self.puntos_evolucion[sel]
+        ep = ep + ep * 0.01 * ep_modifier_factor
+        self.puntos_evolucion[sel] = np.maximum(0.1, ep)
+
+    def avanzar_hasta(self, target_timestamp: float) -> np.ndarray:
+        """Avanza toda la población hasta target_timestamp. Devuelve la máscara de criaturas vivas."""
+        dia = sim.DIA_EN_SEGUNDOS_SIMULADOS
+        timestep_duration = dia / sim.TIMESTEPS_POR_DIA_SIMULADO
+
+        sel = np.nonzero(self.viva & (target_timestamp > self.t_procesado))[0]
+        if sel.size == 0:
+            return self.viva
+
+        # Las semillas se piden por criatura y en orden de carga, como en el bucle original.
+        # Solo hace falta recorrer el reloj si alguna criatura puede cruzar un día en este avance.
+        semillas_pendientes = np.empty((0, 5), dtype=np.uint64)
+        siguiente_semilla = np.zeros(len(self), dtype=np.int64)
+        if np.any(self.t_semillas[sel] + dia < target_timestamp):
+            cruces = self._contar_cruces_de_dia(sel, target_timestamp, dia, timestep_duration)
+            dias_actuales = self.edad_dias[sel].astype(np.int64).tolist() # El día de semillas coincide con la edad en días
+            nuevas = [self.criaturas[i]._generate_new_daily_seeds(dia_actual + j + 1)
+                      for i, k, dia_actual in zip(sel.tolist(), cruces.tolist(), dias_actuales) for j in range(k)]
+            if nuevas:
+                semillas_pendientes = np.array(nuevas, dtype=np.uint64)
+            siguiente_semilla[sel] = np.cumsum(cruces) - cruces
+
+        actual = self.t_procesado.copy()
+        activas = sel
+        while activas.size:
+            cruza = actual[activas] >= self.t_semillas[activas] + dia
+            if cruza.any():
+                c = activas[cruza]
+                self.t_semillas[c] += dia
+                self.semillas[:, c] = semillas_pendientes[siguiente_semilla[c]].T
+                siguiente_semilla[c] += 1
+                self._refrescar_derivados_semillas(c)
+                self._procesar_fin_dia_eventos(c)
+
+                self.edad_dias[c] += 1
+                muertas = c[self.edad_dias[c] >= self.lifespan_total_dias[c]]
+                if muertas.size:
+                    self.viva[muertas] = False
+                    if bus_eventos.oyentes:
+                        for i in muertas.tolist():
+                            bus_eventos.emitir(EVENTO_MUERTE, id=self.criaturas[i].id, nombre=self.criaturas[i].nombre,
+                                               edad_dias=float(self.edad_dias[i]), lifespan_dias=float(self.lifespan_total_dias[i]))
+                    activas = activas[self.viva[activas]]
+                    if activas.size == 0:
+                        break
+
+            self._evolucion_un_timestep(activas)
+            actual[activas] = _redondear_4(actual[activas] + timestep_duration)
+            activas = activas[actual[activas] < target_timestamp]
+
+        self.t_procesado[sel] = np.minimum(actual[sel], target_timestamp)
+        return self.viva
+
+    def volcar_a_criaturas(self):
+        """Escribe el estado de las columnas de vuelta en los objetos Criatura."""
+        for i, c in enumerate(self.criaturas):
+            c.cargar_genes(self.genes_visibles[:, i].tolist(), self.genes_ocultos[:, i].tolist())
+            c.puntos_evolucion = float(self.puntos_evolucion[i])
+            c.edad_dias_completos = float(self.edad_dias[i])
+            c.edad_timesteps_evolutivos_total = int(self.edad_timesteps[i])
+            c.esta_viva = bool(self.viva[i])
+            c.last_evolution_processed_timestamp = float(self.t_procesado[i])
+            c.last_seed_generation_timestamp = float(self.t_semillas[i])
+            c.current_daily_random_seeds = [int(s) for s in self.semillas[:, i]]
+
+
+def actualizar_ambientes_vectorizado(ambientes: Sequence[Ambiente], current_sim_time: float) -> PoblacionVectorizada:
+    """Equivalente a llamar actualizar_todas_las_criaturas en cada ambiente, avanzando todas las criaturas en lote."""
+    poblacion = PoblacionVectorizada.desde_ambientes(ambientes)
+    edades_antes = poblacion.edad_dias.copy()
+    poblacion.avanzar_hasta(current_sim_time)
+    poblacion.volcar_a_criaturas()
+    # Criaturas que completaron algún día: pueden haberse vuelto elegibles para reproducción
+    cambiadas = np.nonzero(poblacion.viva & (poblacion.edad_dias != edades_antes))[0]
+    if cambiadas.size:
+        limites = np.cumsum([len(ambiente.criaturas) for ambiente in ambientes])
+        for i, a in zip(cambiadas.tolist(), np.searchsorted(limites, cambiadas, side="right").tolist()):
+            ambientes[a].notificar_dia_completado(poblacion.criaturas[i])
+    for ambiente in ambientes:
+        for c_id in [c_id for c_id, c in ambiente.criaturas.items() if not c.esta_viva]:
+            if bus_eventos.oyentes:
+                bus_eventos.emitir(EVENTO_CRIATURA_REMOVIDA, id_usuario=ambiente.id_usuario, id=c_id, nombre=ambiente.criaturas[c_id].nombre)
+            del ambiente.criaturas[c_id]
+            if c_id in ambiente.dias_completados_para_reproduccion_check:
+                del ambiente.dias_completados_para_reproduccion_check[c_id]
+    return poblacion
@@ -0,0 +1,56 @@
+"""Pruebas de la agregación de simulation_ensemble (python -m pytest test_simulation_ensemble.py)."""
+import random
+
+import numpy as np
+
+import simulation as sim
+from simulation_ensemble import ResultadoEnsemble, _ObservadorReplica
+
+
+def _replica(semilla: int, extinta: bool) -> dict:
+    """Tres observaciones de un ambiente de 3 criaturas; si extinta, mueren todas antes de la última."""
+    random.seed(semilla)
+    ambiente = sim.Ambiente(f"prueba-{semilla}", 0.0)
+    for i in range(3):
+        ambiente.add_criatura(sim.Criatura(f"C{semilla}-{i}", birth_timestamp=0.0))
+    observador = _ObservadorReplica()
+    observador(ambiente, 0.0)
+    for c in ambiente.criaturas.values():
+        c._genes_visibles[0] += 0.1 * (semilla + 1)
+    observador(ambiente, sim.DIA_EN_SEGUNDOS_SIMULADOS)
+    if extinta:
+        for c in ambiente.criaturas.values():
+            c.esta_viva = False
+    observador(ambiente, 2 * sim.DIA_EN_SEGUNDOS_SIMULADOS)
+    return {"tiempos": np.array(observador.tiempos), "poblacion": np.array(observador.poblacion, dtype=np.float64),
+            "ep_medio": np.array(observador.ep_medio), "genes": np.array(observador.genes) - observador.genes[0],
+            "ep_final": np.array([c.puntos_evolucion for c in ambiente.get_criaturas_vivas()])}
+
+
+def test_replica_extinta_no_contamina_la_deriva():
+    replicas = [_replica(0, extinta=True), _replica(1, extinta=False), _replica(2, extinta=False)]
+    assert np.isnan(replicas[0]["genes"][-1]).all()
+    resultado = ResultadoEnsemble({}, replicas[0]["tiempos"], np.linspace(0.0, 1000.0, 11))
+    for replica in replicas:
+        resultado.añadir(replica)
+
+    resumen = resultado.resumen()
+    assert resultado.replicas == 3
+    assert np.isfinite(resumen["deriva_genes_media"]).all()
+    assert np.isfinite(resumen["deriva_genes_desviacion"]).all()
+    assert np.isfinite(resultado.genes.minimo).all() and np.isfinite(resultado.genes.maximo).all()
+    assert (resumen["deriva_genes_replicas"][:-1] == 3).all()
+    assert (resumen["deriva_genes_replicas"][-1] == 2).all()
+    supervivientes = np.array([r["genes"][-1] for r in replicas[1:]])
+    np.testing.assert_allclose(resumen["deriva_genes_media"][-1], supervivientes.mean(axis=0))
+    np.testing.assert_allclose(resumen["deriva_genes_desviacion"][-1], supervivientes.std(axis=0, ddof=1))
+    np.testing.assert_allclose(resumen["poblacion_media"], [3.0, 3.0, 2.0])
+
+
+def test_celda_sin_valores_da_nan():
+    resultado = ResultadoEnsemble({}, np.array([0.0, 1.0]), np.linspace(0.0, 1000.0, 11))
+    extinta = _replica(0, extinta=True)
+    extinta = {clave: valor[1:] if clave != "ep_final" else valor for clave, valor in extinta.items()}
+    resultado.añadir(extinta)
+    assert np.isnan(resultado.genes.media[-1]).all()
+    assert np.isfinite(resultado.genes.media[0]).all()
@@ -0,0 +1,52 @@
+"""Pruebas de simulation_planificador frente a run_simulation (python -m pytest test_simulation_planificador.py)."""
+import random
+
+import pytest
+
+import simulation as sim
+from simulation_config import sin_salida
+from simulation_planificador import PlanificadorEventos, instantes_tick, run_simulation_por_eventos
+
+
+def _eventos_por_defecto():
+    dia = sim.DIA_EN_SEGUNDOS_SIMULADOS
+    return [(dia * 0.5, "Sparky", "tamañoBase", 0.80), (dia * 0.7, "Blobby", "colorR", 0.90),
+            (dia * 1.5, "Sparky", "numApendices", 5.0), (dia * 2.2, "Zapper", "colorG", 0.2)]
+
+
+def _estado(ambiente: sim.Ambiente):
+    return sorted((c.nombre, c.esta_viva, c.puntos_evolucion, c.edad_timesteps_evolutivos_total,
+                   tuple(c.genes_visibles.values()), tuple(c.genes_ocultos.values()), dict(c.homeostasis_targets))
+                  for c in ambiente.criaturas.values())
+
+
+# Ticks sobre la rejilla de timesteps; con 3 por día el prompt de 0.7 días cae en el tick del fin del día 1
+@pytest.mark.parametrize("ticks_por_dia", [4, 3])
+def test_igual_que_run_simulation_con_los_mismos_ticks(ticks_por_dia):
+    duracion = sim.DIA_EN_SEGUNDOS_SIMULADOS * 3.5
+    intervalo = sim.DIA_EN_SEGUNDOS_SIMULADOS / ticks_por_dia
+    with sin_salida():
+        esperado = sim.run_simulation("prueba", duracion, intervalo, generate_graph=False)
+        obtenido = run_simulation_por_eventos("prueba", duracion, _eventos_por_defecto(),
+                                              intervalo_actualizacion_seg=intervalo)
+    assert _estado(obtenido) == _estado(esperado)
+
+
+def test_prompt_de_criatura_aun_inexistente_se_reintenta():
+    dia = sim.DIA_EN_SEGUNDOS_SIMULADOS
+    random.seed(7)
+    with sin_salida():
+        ambiente = sim.Ambiente("prueba", 0.0)
+        ambiente.crear_y_add_criatura_inicial("Sparky", 0.0)
+        planificador = PlanificadorEventos(ambiente, ticks=instantes_tick(dia, dia / 4))
+        planificador.programar_homeostasis(dia * 0.1, "Tardía", "colorR", 0.9)
+        planificador.ejecutar_hasta(dia * 0.3)
+        tardia = sim.Criatura("Tardía", birth_timestamp=dia * 0.3, ep_inicial=50.0)
+        ambiente.add_criatura(tardia)
+        planificador.ejecutar_hasta(dia)
+    assert dict(tardia.homeostasis_targets) == {"colorR": 0.9}
+
+
+def test_instantes_tick_como_el_bucle_de_run_simulation():
+    assert instantes_tick(10.0, 4.0) == [4.0, 8.0, 10.0]
+    assert instantes_tick(0.3, 0.1) == [0.1, 0.2, 0.3] # El último se recorta a la duración, como next_update_time